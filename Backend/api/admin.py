@@ -1,11 +1,32 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Grocery, Item, DailyIncome
+from .models import User, Grocery, Item, DailyIncome, ArchivedDailyIncome, GraphOutbox
 
 class CustomUserAdmin(UserAdmin):
     model = User
 
+class SoftDeleteAdmin(admin.ModelAdmin):
+    # Admins also manage soft-deleted rows, which `objects` hides
+    list_filter = ('is_deleted',)
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        return queryset.order_by(*ordering) if ordering else queryset
+
+class GroceryAdmin(SoftDeleteAdmin):
+    pass
+
+class ItemAdmin(SoftDeleteAdmin):
+    # __str__ shows the grocery name, so join it instead of one query per row
+    list_select_related = ('grocery',)
+
+class DailyIncomeAdmin(SoftDeleteAdmin):
+    list_select_related = ('grocery',)
+
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(Grocery)
-admin.site.register(Item)
-admin.site.register(DailyIncome)
\ No newline at end of file
+admin.site.register(Grocery, GroceryAdmin)
+admin.site.register(Item, ItemAdmin)
+admin.site.register(DailyIncome, DailyIncomeAdmin)
+admin.site.register(ArchivedDailyIncome)
+admin.site.register(GraphOutbox)
\ No newline at end of file
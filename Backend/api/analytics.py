@@ -0,0 +1,183 @@
+"""
+DailyIncome analytics backed by the IncomeRollup table.
+
+Rollups hold one row per grocery and week/month/year. They are recomputed in
+SQL for just the buckets touched by a write, so reports read a few hundred
+pre-aggregated rows instead of scanning every income.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, FloatField, Max, OuterRef, Q, Subquery, Sum, Value, When, Window,
+)
+from django.db.models.expressions import ValueRange
+from django.db.models.functions import Cast, Least, NullIf, TruncMonth, TruncWeek, TruncYear
+from django.utils.dateparse import parse_date
+
+from .models import DailyIncome, Grocery, IncomeRollup
+
+TRUNCATE = {'week': TruncWeek, 'month': TruncMonth, 'year': TruncYear}
+
+
+def period_bounds(period, day):
+    """The first and last day of the `period` bucket containing `day`."""
+    if period == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == 'month':
+        start = day.replace(day=1)
+        following = (start + timedelta(days=32)).replace(day=1)
+        return start, following - timedelta(days=1)
+    start = day.replace(month=1, day=1)
+    return start, start.replace(month=12, day=31)
+
+
+def shift_periods(period, start, count):
+    """The start of the bucket `count` periods away from the bucket starting at `start`."""
+    if period == 'week':
+        return start + timedelta(weeks=count)
+    if period == 'month':
+        months = start.year * 12 + start.month - 1 + count
+        return start.replace(year=months // 12, month=months % 12 + 1)
+    return start.replace(year=start.year + count)
+
+
+def period_index(period, start):
+    """A number that grows by one from each `period` bucket to the next."""
+    if period == 'week':
+        # Bucket starts are Mondays, seven ordinals apart
+        return start.toordinal() // 7
+    if period == 'month':
+        return start.year * 12 + start.month - 1
+    return start.year
+
+
+def _rollup(period, row):
+    return IncomeRollup(period=period, period_index=period_index(period, row['period_start']), **row)
+
+
+def _aggregate(period, incomes):
+    return (
+        incomes.annotate(period_start=TRUNCATE[period]('date'))
+        .values('grocery_id', 'period_start')
+        .annotate(total=Sum('amount'), days=Count('id'))
+        .order_by()
+    )
+
+
+def refresh_income_rollups(keys):
+    """
+    Recomputes the rollups of the buckets containing the (grocery_id, date)
+    `keys`. One delete and one aggregate query per period.
+    """
+    # Instances created with string dates still carry them unparsed
+    keys = {
+        (grocery_id, parse_date(day) if isinstance(day, str) else day)
+        for grocery_id, day in keys if grocery_id is not None and day is not None
+    }
+    if not keys:
+        return
+
+    # Per grocery, recompute every bucket between the first and last touched
+    # one: a single range per grocery keeps the SQL small for large batches
+    spans = {}
+    for grocery_id, day in keys:
+        low, high = spans.get(grocery_id, (day, day))
+        spans[grocery_id] = (min(low, day), max(high, day))
+
+    with transaction.atomic():
+        # Writers to the same grocery take turns rewriting its buckets; each then
+        # sees the incomes the previous one committed. NO KEY UPDATE does not
+        # wait on the key-share locks income inserts take on their grocery.
+        list(
+            Grocery.all_objects.select_for_update(no_key=True).filter(pk__in=spans) # type: ignore
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        for period in TRUNCATE:
+            ranges, stale = Q(), Q()
+            for grocery_id, (low, high) in spans.items():
+                first_start, last_end = period_bounds(period, low)[0], period_bounds(period, high)[1]
+                ranges |= Q(grocery_id=grocery_id, date__range=(first_start, last_end))
+                stale |= Q(grocery_id=grocery_id, period_start__range=(first_start, last_end))
+            # Rewrite the touched buckets; empty ones simply disappear
+            IncomeRollup.objects.filter(stale, period=period).delete() # type: ignore
+            IncomeRollup.objects.bulk_create([ # type: ignore
+                _rollup(period, row)
+                for row in _aggregate(period, DailyIncome.objects.filter(ranges)) # type: ignore
+            ])
+
+
+def rebuild_income_rollups(grocery_ids=None, batch_size=5000):
+    """
+    Recomputes all rollups (of `grocery_ids` only, when given) from scratch.
+    """
+    incomes = DailyIncome.objects.all() # type: ignore
+    rollups = IncomeRollup.objects.all() # type: ignore
+    if grocery_ids is not None:
+        incomes = incomes.filter(grocery_id__in=grocery_ids)
+        rollups = rollups.filter(grocery_id__in=grocery_ids)
+
+    created = 0
+    with transaction.atomic():
+        rollups.delete()
+        for period in TRUNCATE:
+            batch = []
+            for row in _aggregate(period, incomes).iterator(chunk_size=batch_size):
+                batch.append(_rollup(period, row))
+                if len(batch) >= batch_size:
+                    created += len(IncomeRollup.objects.bulk_create(batch)) # type: ignore
+                    batch = []
+            created += len(IncomeRollup.objects.bulk_create(batch)) # type: ignore
+    return created
+
+
+def income_analytics(rollups, period, window=3, date_from=None, date_to=None):
+    """
+    Annotates the `period` rollups with the average per income day, a moving
+    average of the last `window` periods and the growth over the previous
+    period, all with SQL window functions per grocery. The frames range over
+    `period_index`, so they span calendar periods: one without income adds 0
+    instead of being skipped, and periods before a grocery's first income are
+    left out. Returns the queryset ordered by grocery and period.
+    """
+    money = DecimalField(max_digits=16, decimal_places=2)
+    per_grocery = {
+        'partition_by': [F('grocery_id')],
+        'order_by': F('period_index').asc(),
+    }
+    queryset = rollups.filter(period=period).annotate(
+        first_index=Subquery(
+            IncomeRollup.objects.filter(grocery_id=OuterRef('grocery_id'), period=period) # type: ignore
+            .order_by('period_index').values('period_index')[:1]
+        ),
+    )
+    # The total of this period and the one before it, 0 for a period without income
+    previous_total = Case(
+        When(period_index__gt=F('first_index'), then=Window(Sum('total'), frame=ValueRange(start=-1, end=0), **per_grocery) - F('total')),
+        output_field=money,
+    )
+    queryset = queryset.annotate(
+        average=ExpressionWrapper(F('total') / NullIf(F('days'), 0), output_field=money),
+        moving_average=ExpressionWrapper(
+            Window(Sum('total'), frame=ValueRange(start=-(window - 1), end=0), **per_grocery)
+            / Least(Value(window), F('period_index') - F('first_index') + 1),
+            output_field=money,
+        ),
+        previous_total=previous_total,
+        # A ratio, so computed in floating point like any other rate
+        growth=ExpressionWrapper(
+            Cast(F('total') - previous_total, FloatField()) / NullIf(previous_total, 0), output_field=FloatField()
+        ),
+    )
+    if date_to:
+        queryset = queryset.filter(period_start__lte=date_to)
+    if date_from:
+        # The `window` periods before date_from feed the window functions, so
+        # they are read, and only dropped by a filter on a window expression,
+        # which Django applies after the windows are computed
+        first = period_bounds(period, date_from)[0]
+        queryset = queryset.filter(period_start__gte=shift_periods(period, first, -window)).annotate(
+            shown_start=Window(Max('period_start'), partition_by=[F('id')]),
+        ).filter(shown_start__gte=first)
+    return queryset.order_by('grocery_id', 'period_start')
@@ -5,4 +5,5 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'  # type: ignore
     name = 'api'
     def ready(self):
-        import api.signals
\ No newline at end of file
+        import api.signals
+        import api.tasks
@@ -0,0 +1,66 @@
+"""
+Moves soft-deleted DailyIncome rows out of the live table.
+
+Deleted incomes no longer feed the API or the rollups, but they keep growing
+the table and its indexes. `archive_deleted_incomes` copies them into
+ArchivedDailyIncome and removes them from DailyIncome in batches, each in its
+own transaction, so the working set stays the live rows only.
+
+Archived rows are not final: restoring a deleted grocery moves the incomes its
+deletion hid back with `unarchive_incomes` (see api/cascade.py).
+"""
+from django.db import connection, transaction
+from django.db.models import BooleanField, DateTimeField, Exists, OuterRef, Value
+from django.utils import timezone
+
+from .models import ArchivedDailyIncome, DailyIncome
+
+ARCHIVED_FIELDS = ('id', 'amount', 'date', 'grocery_id', 'created_at', 'updated_at')
+
+
+def archive_deleted_incomes(deleted_before, batch_size=5000):
+    """
+    Archives incomes soft-deleted (last updated) before `deleted_before`.
+    Returns the number of rows moved.
+    """
+    table = connection.ops.quote_name(DailyIncome._meta.db_table)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                DailyIncome.all_objects.select_for_update(skip_locked=True)  # type: ignore
+                .filter(is_deleted=True, updated_at__lt=deleted_before)
+                .order_by('id')
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                return moved
+            now = timezone.now()
+            ArchivedDailyIncome.objects.bulk_create([ArchivedDailyIncome(archived_at=now, **row) for row in rows])  # type: ignore
+            # Plain DELETE: the rows are already out of the rollups, so the
+            # per-row post_delete receivers would only cost queries
+            ids = [row['id'] for row in rows]
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+        moved += len(rows)
+
+
+def unarchive_incomes(archived, restored_at):
+    """
+    Moves the ArchivedDailyIncome rows of the queryset `archived` back into
+    DailyIncome as live incomes, keeping their ids and creation times, with
+    one INSERT ... SELECT and one DELETE. Returns the number of rows moved.
+    Must run in a transaction.
+    """
+    table = connection.ops.quote_name(DailyIncome._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(name) for name in (*ARCHIVED_FIELDS, 'is_deleted'))
+    rows = archived.annotate(
+        restored_at=Value(restored_at, DateTimeField()), live=Value(False, BooleanField()),
+    ).order_by().values_list(*ARCHIVED_FIELDS[:-1], 'restored_at', 'live')
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+        moved = cursor.rowcount
+    # Ids are shared with DailyIncome, so the archived rows now live are the moved ones
+    ArchivedDailyIncome.objects.filter(Exists(DailyIncome.all_objects.filter(pk=OuterRef('pk')))).delete()  # type: ignore
+    return moved
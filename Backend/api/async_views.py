@@ -0,0 +1,182 @@
+"""
+Async list and retrieve endpoints for groceries, items and daily incomes, and
+the server-sent events stream of their changes.
+
+DRF dispatches synchronously, so these are plain Django async views that
+reuse the DRF viewsets for everything except I/O: querysets, filters,
+permissions, pagination and serializers behave exactly as on the regular
+routes. Under an ASGI server a request waiting on the database or the cache
+no longer holds a worker thread. The database is read through Django's async
+ORM (``afirst``) or, for the cursor paginator that only accepts querysets,
+through ``sync_to_async`` the same way the async ORM does it.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+from .authentication import AsyncJWTAuthentication
+from .caching import NOT_MODIFIED, cache_headers, get_cache_scope, lookup_cached_response, store_cached_response
+from .changes import release_connections
+from .database import replica_reads
+from .encoding import dumps
+from .fastpath import FastReadMixin
+
+
+def _read_page(view, queryset):
+    page = view.paginate_queryset(queryset)
+    return list(queryset) if page is None else page
+
+
+class AsyncReadView(View):
+    """
+    Serves list (no `pk`) and retrieve of `viewset_class` asynchronously.
+    """
+    viewset_class = None
+    http_method_names = ['get', 'head', 'options']
+    authenticator = AsyncJWTAuthentication()
+
+    async def get(self, request, pk=None):
+        view, error = await self.initialize_viewset(request, 'list' if pk is None else 'retrieve', pk)
+        if error is not None:
+            return error
+        api_request = view.request
+        try:
+            namespace = getattr(view, 'cache_namespace', None)
+            if namespace is None:
+                data, plain = await self.read(view, pk)
+                return self.render(data, plain)
+
+            key, etag, data = await sync_to_async(lookup_cached_response)(
+                namespace, get_cache_scope(api_request.user), request.get_full_path(), request.headers.get('If-None-Match')
+            )
+            if data is NOT_MODIFIED:
+                return cache_headers(HttpResponse(status=304), etag)
+            if data is not None:
+                return cache_headers(self.render(data), etag)
+            # Fills come from the primary, see api/caching.py
+            with replica_reads(False):
+                data, plain = await self.read(view, pk)
+            await sync_to_async(store_cached_response)(key, data)
+            return cache_headers(self.render(data, plain), etag)
+        except (APIException, Http404) as exc:
+            return self.error_response(exc, api_request, view)
+
+    async def initialize_viewset(self, request, action, pk=None):
+        """
+        Authenticates `request` and returns (viewset, None) with its permissions
+        and rate limit checked, or (None, error response).
+        """
+        try:
+            result = await self.authenticator.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated()
+        except APIException as exc:
+            return None, self.error_response(exc, request)
+
+        api_request = Request(request)
+        api_request.user, api_request.auth = result
+        view = self.viewset_class(
+            request=api_request, args=(), kwargs={} if pk is None else {'pk': pk}, action=action, format_kwarg=None,
+        )
+        try:
+            view.check_permissions(api_request)
+            # The rate limiter's counters live in a cache, possibly over the network
+            await sync_to_async(view.check_throttles)(api_request)
+        except APIException as exc:
+            return None, self.error_response(exc, api_request, view)
+        return view, None
+
+    async def read(self, view, pk):
+        """Returns the response data and whether it only holds plain values."""
+        queryset = view.filter_queryset(view.get_queryset())
+        if pk is not None:
+            instance = await queryset.filter(pk=pk).afirst()
+            if instance is None:
+                raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+            view.check_object_permissions(view.request, instance)
+            return view.get_serializer(instance).data, False
+
+        encoder = None
+        if settings.FAST_READ_PATH and isinstance(view, FastReadMixin):
+            encoder = view.get_row_encoder()
+        if encoder is not None:
+            page = await sync_to_async(_read_page)(view, view.get_fast_rows(queryset, encoder))
+            results, plain = [encoder(row) for row in page], True
+        else:
+            page = await sync_to_async(_read_page)(view, queryset)
+            results, plain = view.get_serializer(page, many=True).data, False
+        if view.paginator is None:
+            return results, plain
+        return view.get_paginated_response(results).data, plain
+
+    def render(self, data, plain=False, status=200):
+        body = dumps(data) if plain else JSONRenderer().render(data)
+        return HttpResponse(body, status=status, content_type='application/json')
+
+    def error_response(self, exc, request, view=None):
+        # Same bodies and status codes as the DRF routes
+        response = exception_handler(exc, {'view': view, 'request': request})
+        rendered = self.render(response.data, status=response.status_code)
+        for header, value in response.items():
+            if header.lower() != 'content-type':
+                rendered[header] = value
+        if response.status_code == 401:
+            rendered['WWW-Authenticate'] = self.authenticator.authenticate_header(request)
+        return rendered
+
+
+class ChangeStreamView(AsyncReadView):
+    """
+    Server-sent events with the changes of `viewset_class` (see
+    api/changes.py), for dashboards. Each ``changes`` event carries one page of
+    rows as ``data`` and the cursor after it as ``id``. The stream ends after
+    CHANGE_STREAM_SECONDS; clients reconnect with ``Last-Event-ID`` (or
+    ``?since=``) and resume where they were.
+    """
+    async def get(self, request):
+        view, error = await self.initialize_viewset(request, 'changes')
+        if error is not None:
+            return error
+        since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+        try:
+            # Invalid cursors and page sizes fail here, before the stream starts
+            page = await sync_to_async(self.read_changes)(view, since)
+        except APIException as exc:
+            return self.error_response(exc, view.request, view)
+
+        response = StreamingHttpResponse(self.events(view, page), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keeps nginx from buffering the events
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def read_changes(self, view, since):
+        try:
+            return view.read_changes(since)
+        finally:
+            # The stream is idle between polls, so it does not keep a connection
+            release_connections()
+
+    async def events(self, view, page):
+        deadline = time.monotonic() + settings.CHANGE_STREAM_SECONDS
+        yield f'retry: {int(settings.CHANGE_STREAM_INTERVAL * 1000)}\n\n'.encode()
+        while True:
+            results, cursor, has_more = page
+            if results:
+                yield b'id: %s\nevent: changes\ndata: %s\n\n' % (cursor.encode(), dumps(results))
+            else:
+                # A comment, so proxies do not close an idle stream
+                yield b': keep-alive\n\n'
+            if time.monotonic() >= deadline:
+                return
+            if not has_more:
+                await asyncio.sleep(settings.CHANGE_STREAM_INTERVAL)
+            page = await sync_to_async(self.read_changes)(view, cursor)
@@ -0,0 +1,81 @@
+"""
+JWT authentication with a cached user and grocery scope.
+
+Every authenticated request used to load its user, and supplier writes then
+looked up the grocery they manage. CachedJWTAuthentication keeps both in the
+cache for AUTH_CACHE_TIMEOUT seconds: the user comes back with
+``grocery_ids``, the ids of the live groceries they manage, which
+permissions and views read through ``get_grocery_scope``. Saving or deleting
+a user or one of their groceries drops the entry.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import Grocery
+
+
+def _user_key(user_id):
+    return f'api:auth:user:{user_id}'
+
+
+def invalidate_cached_users(user_ids):
+    """Drops the cached users, now and again once the transaction commits."""
+    keys = [_user_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication reading the user and their grocery scope from the
+    cache. The active and revoked-token checks still run on every request.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = _user_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            user = self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            grocery_ids = frozenset(Grocery.objects.filter(responsible_person=user).values_list('pk', flat=True)) # type: ignore
+            cache.set(key, (user, grocery_ids), settings.AUTH_CACHE_TIMEOUT)
+        else:
+            user, grocery_ids = cached
+        user.grocery_ids = grocery_ids
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication for async views. Only the user lookup can touch
+    the database, so it is the only step moved off the event loop.
+    """
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await sync_to_async(self.get_user)(validated_token), validated_token
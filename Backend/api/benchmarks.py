@@ -0,0 +1,359 @@
+"""
+In-process benchmark of the API endpoints (see `manage.py benchmark_api`).
+
+Each scenario is one request shape against one route of api/urls.py, sent
+through the full Django stack with the test client, so routing, middleware,
+authentication, permissions, queries and rendering are all measured without
+network noise. Clients run in threads, each with its own database connection.
+"""
+import itertools
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .caching import expire_cached_responses
+from .graph import MAX_RELATED_DEPTH
+from .cascade import restore_groceries, soft_delete_groceries
+from .models import DailyIncome, Grocery, Item, User
+from .stats import refresh_grocery_stats
+
+# Dates for created incomes start far from any seeded history
+_income_dates = itertools.count()
+_usernames = itertools.count()
+
+
+def _next_income_date():
+    return (date(2100, 1, 1) + timedelta(days=next(_income_dates))).isoformat()
+
+
+# Routes of api/urls.py without a scenario, and why
+EXCLUDED_ROUTES = {
+    'api-root': 'a static list of links',
+    'grocery-bulk-destroy': 'its job would delete the benchmarked grocery',
+    'dailyincome-bulk': 'creating the same days twice conflicts; income-bulk-upsert writes the same rows',
+    'job-detail': 'a primary-key read of the rows job-list pages through',
+    'grocery-change-stream': 'stays open for CHANGE_STREAM_SECONDS; its reads are timed by grocery-changes',
+    'item-change-stream': 'stays open for CHANGE_STREAM_SECONDS; its reads are timed by item-changes',
+    'dailyincome-change-stream': 'stays open for CHANGE_STREAM_SECONDS; its reads are timed by income-changes',
+}
+
+
+def build_scenarios(fixtures):
+    """
+    (name, role, method, path, payload factory, content type) for every route
+    not in EXCLUDED_ROUTES. `fixtures` holds the ids the paths point at.
+    """
+    grocery, item, income = fixtures['grocery'], fixtures['item'], fixtures['income']
+    supplier = fixtures['supplier'].pk
+    return [
+        ('grocery-list', 'admin', 'get', reverse('grocery-list'), None, None),
+        ('grocery-list-expanded', 'admin', 'get', reverse('grocery-list') + '?expand=items,incomes&page_size=10', None, None),
+        ('grocery-detail', 'supplier', 'get', reverse('grocery-detail', args=[grocery]), None, None),
+        ('grocery-changes', 'admin', 'get', reverse('grocery-changes'), None, None),
+        # The grocery is live, so the queued jobs restore nothing
+        ('grocery-restore', 'admin', 'post', reverse('grocery-restore', args=[grocery]), None, None),
+        ('grocery-bulk-restore', 'admin', 'post', reverse('grocery-bulk-restore'), lambda: {'ids': [grocery]}, None),
+        ('item-list', 'supplier', 'get', reverse('item-list'), None, None),
+        ('item-search', 'admin', 'get', reverse('item-list') + '?search=milk&price_max=100', None, None),
+        ('item-detail', 'supplier', 'get', reverse('item-detail', args=[item]), None, None),
+        ('item-changes', 'supplier', 'get', reverse('item-changes'), None, None),
+        ('item-create', 'supplier', 'post', reverse('item-list'),
+         lambda: {'name': 'Bench', 'item_type': 'Misc', 'location_in_grocery': 'Z1', 'price': '1.00', 'grocery': grocery}, None),
+        ('item-update', 'supplier', 'patch', reverse('item-detail', args=[item]), lambda: {'price': '2.00'}, None),
+        ('item-bulk-create', 'supplier', 'post', reverse('item-bulk'),
+         lambda: [{'name': f'Bulk {n}', 'item_type': 'Misc', 'location_in_grocery': 'Z2', 'price': '1.00'} for n in range(100)], None),
+        ('item-export', 'supplier', 'get', reverse('item-export') + '?output=ndjson', None, None),
+        ('income-list', 'supplier', 'get', reverse('dailyincome-list'), None, None),
+        ('income-detail', 'supplier', 'get', reverse('dailyincome-detail', args=[income]), None, None),
+        ('income-changes', 'supplier', 'get', reverse('dailyincome-changes'), None, None),
+        ('income-create', 'supplier', 'post', reverse('dailyincome-list'), lambda: {'amount': '10.00', 'date': _next_income_date()}, None),
+        ('income-bulk-upsert', 'supplier', 'post', reverse('dailyincome-bulk-upsert'),
+         lambda: [{'amount': '5.00', 'date': (date(2099, 1, 1) + timedelta(days=n)).isoformat()} for n in range(100)], None),
+        ('income-export', 'supplier', 'get', reverse('dailyincome-export') + '?output=csv', None, None),
+        ('income-import', 'supplier', 'post', reverse('import', args=['incomes']),
+         lambda: 'date,amount\n' + ''.join(f'{(date(2098, 1, 1) + timedelta(days=n)).isoformat()},3.00\n' for n in range(100)),
+         'text/csv'),
+        ('income-analytics', 'supplier', 'get', reverse('income-analytics') + '?period=month&window=3', None, None),
+        ('create-supplier', 'admin', 'post', reverse('create-supplier'),
+         lambda: {'username': f'bench-{time.time_ns()}-{next(_usernames)}', 'email': 'bench@example.com', 'password': 'benchpass'}, None),
+        ('cache-stats', 'admin', 'get', reverse('cache-stats'), None, None),
+        ('job-list', 'admin', 'get', reverse('job-list') + '?status=failed', None, None),
+        ('graph-supplier-groceries', 'supplier', 'get', reverse('graph-supplier-groceries', args=[supplier]), None, None),
+        ('graph-shared-suppliers', 'supplier', 'get', reverse('graph-shared-suppliers', args=[grocery]), None, None),
+        ('graph-related-groceries', 'supplier', 'get',
+         reverse('graph-related-groceries', args=[grocery]) + f'?depth={MAX_RELATED_DEPTH}', None, None),
+        ('async-grocery-list', 'admin', 'get', reverse('async-grocery-list'), None, None),
+        ('async-grocery-detail', 'supplier', 'get', reverse('async-grocery-detail', args=[grocery]), None, None),
+        ('async-item-list', 'supplier', 'get', reverse('async-item-list'), None, None),
+        ('async-item-detail', 'supplier', 'get', reverse('async-item-detail', args=[item]), None, None),
+        ('async-income-list', 'supplier', 'get', reverse('async-dailyincome-list'), None, None),
+        ('async-income-detail', 'supplier', 'get', reverse('async-dailyincome-detail', args=[income]), None, None),
+    ]
+
+
+def default_fixtures():
+    """The admin, a supplier with a grocery and an item and an income of that grocery to benchmark with."""
+    admin = User.objects.filter(is_staff=True).order_by('pk').first()  # type: ignore
+    grocery = Grocery.objects.filter(responsible_person__isnull=False).order_by('pk').first()  # type: ignore
+    item = Item.objects.filter(grocery=grocery).order_by('pk').first()  # type: ignore
+    income = DailyIncome.objects.filter(grocery=grocery).order_by('pk').first()  # type: ignore
+    if admin is None or grocery is None or item is None or income is None:
+        raise LookupError('Seed the database first: an admin user and a grocery with items and incomes are needed.')
+    return {
+        'admin': admin, 'supplier': grocery.responsible_person, 'grocery': grocery.pk, 'item': item.pk, 'income': income.pk,
+    }
+
+
+def _server_name():
+    # The test client's default host is only allowed inside the test runner
+    host = next((host for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    return host.lstrip('.')
+
+
+def percentile(samples, fraction):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[round(fraction * 100) - 1]
+
+
+def _send(client, method, path, payload, content_type, cold):
+    if cold:
+        expire_cached_responses()
+    data = payload() if payload else None
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        if content_type:
+            response = getattr(client, method)(path, data, content_type=content_type)
+        else:
+            response = getattr(client, method)(path, data, format='json')
+        # Streaming responses only do their work while being consumed
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - started
+    return elapsed, len(queries), response.status_code
+
+
+def run_scenario(scenario, fixtures, requests=100, concurrency=1, cold=False, close_connections=False):
+    """
+    Sends `requests` requests from `concurrency` clients; returns the summary
+    dict. `close_connections` ends each request like Django's request_finished
+    handler does, which the test client skips.
+    """
+    name, role, method, path, payload, content_type = scenario
+    user = fixtures[role]
+    token = AccessToken.for_user(user)
+    results = []
+    lock = threading.Lock()
+
+    def client_loop(count):
+        client = APIClient(SERVER_NAME=_server_name())
+        client.force_authenticate(user=user)
+        # The async routes are plain Django views and only read the token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        try:
+            for _ in range(count):
+                result = _send(client, method, path, payload, content_type, cold)
+                # Inside a transaction (e.g. in tests) the connection must stay
+                if close_connections and not connection.in_atomic_block:
+                    close_old_connections()
+                with lock:
+                    results.append(result)
+        finally:
+            if concurrency > 1:
+                close_old_connections()
+                connection.close()
+
+    shares = [requests // concurrency + (1 if n < requests % concurrency else 0) for n in range(concurrency)]
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    # One user sends every request, so the rate limits would reject most of them
+    with override_settings(THROTTLE_BUDGETS={}):
+        if concurrency == 1:
+            client_loop(requests)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(client_loop, shares))
+    wall = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+    query_counts = [count for _, count, _ in results]
+    return {
+        'scenario': name,
+        'requests': len(results),
+        'errors': sum(1 for _, _, code in results if code >= 400),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'throughput_rps': round(len(results) / wall, 1) if wall else 0.0,
+        'queries': max(query_counts),
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def run_benchmarks(requests=100, concurrency=1, only=None, cold=False, fixtures=None):
+    fixtures = fixtures or default_fixtures()
+    scenarios = [scenario for scenario in build_scenarios(fixtures) if not only or scenario[0] in only]
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        return [run_scenario(scenario, fixtures, requests, concurrency, cold) for scenario in scenarios]
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def compare_fast_path(fixtures=None, requests=20, page_size=500):
+    """
+    Times the item and income lists with FAST_READ_PATH off and on, and checks
+    both produce the same bytes. Cached responses are expired before every request.
+    """
+    fixtures = fixtures or default_fixtures()
+    client = APIClient(SERVER_NAME=_server_name())
+    client.force_authenticate(user=fixtures['admin'])
+    results = []
+    for name in ('item-list', 'dailyincome-list'):
+        path = f'{reverse(name)}?page_size={page_size}'
+        medians, bodies = {}, {}
+        for enabled in (False, True):
+            samples = []
+            with override_settings(FAST_READ_PATH=enabled):
+                for _ in range(requests):
+                    expire_cached_responses()
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    samples.append((time.perf_counter() - started) * 1000)
+            medians[enabled] = statistics.median(samples)
+            bodies[enabled] = response.content
+        results.append({
+            'scenario': name,
+            'rows': page_size,
+            'serializer_p50_ms': round(medians[False], 2),
+            'fast_p50_ms': round(medians[True], 2),
+            'speedup': round(medians[False] / medians[True], 2) if medians[True] else None,
+            'identical': bodies[False] == bodies[True],
+        })
+    return results
+
+
+def compare_connection_modes(fixtures=None, requests=200, concurrency=8, scenario='item-detail'):
+    """
+    Runs `scenario` (uncached) with a new connection per request, with
+    persistent connections and, on PostgreSQL with psycopg 3, with a
+    connection pool, and reports the latency and throughput of each.
+    """
+    fixtures = fixtures or default_fixtures()
+    chosen = next((row for row in build_scenarios(fixtures) if row[0] == scenario), None)
+    if chosen is None:
+        raise LookupError(f'Unknown scenario {scenario}.')
+
+    modes = [('per-request', 0, None), ('persistent', 600, None)]
+    if connection.vendor == 'postgresql':
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        if is_psycopg3:
+            modes.append(('pool', 0, {'min_size': concurrency, 'max_size': concurrency}))
+
+    # Every thread's connection reads this same settings dict when it connects
+    database = connection.settings_dict
+    original = {'CONN_MAX_AGE': database['CONN_MAX_AGE'], 'OPTIONS': database['OPTIONS']}
+    results = []
+    try:
+        for mode, max_age, pool in modes:
+            if not connection.in_atomic_block:
+                connection.close()
+            options = {key: value for key, value in original['OPTIONS'].items() if key != 'pool'}
+            if pool:
+                options['pool'] = pool
+            database.update(CONN_MAX_AGE=max_age, OPTIONS=options)
+            try:
+                row = run_scenario(chosen, fixtures, requests, concurrency, cold=True, close_connections=True)
+            finally:
+                if pool:
+                    connection.close_pool()
+            results.append({'mode': mode, **{key: row[key] for key in ('requests', 'errors', 'p50_ms', 'p95_ms', 'throughput_rps')}})
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+        database.update(original)
+    return results
+
+
+def benchmark_cascade(items=1_000_000, days=365):
+    """
+    Seeds one grocery with `items` items and `days` daily incomes, then times
+    its cascading soft-delete and restore (api/cascade.py). The branch is
+    removed again afterwards.
+    """
+    batch_size = settings.BULK_BATCH_SIZE
+    today = date.today()
+    with transaction.atomic():
+        grocery = Grocery.objects.create(name='Cascade benchmark', location='Benchmark')  # type: ignore
+        for start in range(0, items, batch_size):
+            Item.objects.bulk_create([  # type: ignore
+                Item(name=f'Item {n}', item_type='Misc', location_in_grocery='B1', price='1.00', grocery=grocery)
+                for n in range(start, min(start + batch_size, items))
+            ])
+        DailyIncome.objects.bulk_create(  # type: ignore
+            [DailyIncome(grocery=grocery, amount='10.00', date=today - timedelta(days=n)) for n in range(days)],
+            batch_size=batch_size,
+        )
+        refresh_grocery_stats([grocery.pk])
+
+    results = []
+    try:
+        for name, operation in (('soft-delete', soft_delete_groceries), ('restore', restore_groceries)):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                counts = operation([grocery.pk])
+                elapsed = time.perf_counter() - started
+            results.append({'operation': name, **counts, 'queries': len(queries), 'ms': round(elapsed * 1000, 1)})
+    finally:
+        # Plain DELETEs: the collector would load and signal every row
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in (Item, DailyIncome):
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} WHERE grocery_id = %s', [grocery.pk])
+            grocery.delete()
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Regressions against a stored run: p95 slower by more than `tolerance`,
+    more queries per request, or new errors. Returns a list of messages.
+    """
+    previous = {row['scenario']: row for row in baseline}
+    regressions = []
+    for row in results:
+        old = previous.get(row['scenario'])
+        if old is None:
+            continue
+        if row['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{row['scenario']}: p95 {old['p95_ms']}ms -> {row['p95_ms']}ms")
+        if row['queries'] > old['queries']:
+            regressions.append(f"{row['scenario']}: queries {old['queries']} -> {row['queries']}")
+        if row['errors'] > old['errors']:
+            regressions.append(f"{row['scenario']}: errors {old['errors']} -> {row['errors']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as stream:
+        return json.load(stream)['results']
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as stream:
+        json.dump({'results': results}, stream, indent=2)
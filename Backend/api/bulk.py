@@ -0,0 +1,359 @@
+"""
+List-payload write endpoints for the Item and DailyIncome ViewSets.
+
+The whole payload is validated in one pass, the rows' groceries are resolved
+in one query, and rows are written with bulk_create/bulk_update in chunks
+inside one transaction. If any row is invalid nothing is written and the response lists
+the errors by row index.
+"""
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+
+from .models import Grocery, DailyIncome
+from .permissions import get_grocery_scope
+from .signals import bulk_changed
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def change_key(instance):
+    """The (grocery_id, date) pair `bulk_changed` receivers are told about."""
+    return (instance.grocery_id, getattr(instance, 'date', None))
+
+
+def queryset_change_keys(queryset):
+    """The `bulk_changed` keys of every row in `queryset`, read in one query."""
+    if queryset.model is DailyIncome:
+        return set(queryset.values_list('grocery_id', 'date'))
+    return {(grocery_id, None) for grocery_id in queryset.values_list('grocery_id', flat=True).distinct()}
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def resolve_row_groceries(rows, grocery=None, scope=None):
+    """
+    Returns one Grocery per row plus a list of per-row error dicts, with a single
+    query for the whole batch. With `grocery` every row goes there. With `scope`
+    (a supplier's grocery ids) rows may only name groceries in it, and rows that
+    name none go to the only one.
+    """
+    errors = [{} for _ in rows]
+    requested = [row.get('grocery') if isinstance(row, dict) else None for row in rows]
+
+    if grocery is not None:
+        for index, value in enumerate(requested):
+            if value not in (None, '') and _as_int(value) != grocery.pk:
+                errors[index]['grocery'] = ["You can only write to your assigned grocery."]
+        return [grocery] * len(rows), errors
+
+    if scope is not None:
+        default = next(iter(scope)) if len(scope) == 1 else None
+        for index, value in enumerate(requested):
+            if value in (None, ''):
+                if default is None:
+                    errors[index]['grocery'] = ['You manage several groceries, choose one.']
+                requested[index] = default
+            elif _as_int(value) not in scope:
+                errors[index]['grocery'] = ["You can only write to your assigned grocery."]
+
+    ids = {_as_int(value) for value in requested} - {None}
+    found = Grocery.objects.in_bulk(ids) # type: ignore
+    groceries = []
+    for index, value in enumerate(requested):
+        row_grocery = found.get(_as_int(value))
+        if row_grocery is None and not errors[index]:
+            if value in (None, ''):
+                errors[index]['grocery'] = ['This field is required.']
+            else:
+                errors[index]['grocery'] = [f'Invalid pk "{value}" - object does not exist.']
+        groceries.append(row_grocery)
+    return groceries, errors
+
+
+def validate_rows(serializer_class, rows, errors, context=None, partial=False):
+    """
+    Validates every row with one serializer instance (as ListSerializer does),
+    merging row errors into `errors`. Returns the validated attrs per row,
+    None where the row failed.
+    """
+    child = serializer_class(many=True, partial=partial, context=context or {}).child
+    validated = []
+    for index, row in enumerate(rows):
+        try:
+            validated.append(child.run_validation(row))
+        except ValidationError as exc:
+            errors[index].update(serializers.as_serializer_error(exc))
+            validated.append(None)
+    return validated
+
+
+def upsert_daily_incomes(incomes):
+    """
+    Writes unsaved DailyIncome instances keyed on (grocery, date): missing (or
+    soft-deleted) days are created, live days get the new amount.
+    Returns (created, updated) counts. Keys must be unique within `incomes`.
+    """
+    created = 0
+    with transaction.atomic():
+        for chunk in _chunks(incomes, settings.BULK_BATCH_SIZE):
+            created += sum(inserted for _, inserted in write_daily_incomes(chunk, on_conflict='update'))
+        bulk_changed.send(sender=DailyIncome, keys={(income.grocery_id, income.date) for income in incomes})
+    return created, len(incomes) - created
+
+
+def write_daily_incomes(incomes, on_conflict='nothing'):
+    """
+    Inserts unsaved DailyIncome instances with a single
+    ``INSERT ... ON CONFLICT`` statement on the unique_live_income_per_day
+    index, so concurrent writers of the same day never race into an
+    IntegrityError. A live day that already exists is left alone
+    (`on_conflict` 'nothing') or gets the new amount ('update'). Returns
+    (income, created) for every written row, with its id and timestamps set;
+    skipped rows are left out. Sends no signals; callers send bulk_changed.
+    """
+    if on_conflict not in ('nothing', 'update'):
+        raise ValueError(f'Unknown on_conflict {on_conflict!r}.')
+    if not incomes:
+        return []
+    meta = DailyIncome._meta
+    connection = connections[router.db_for_write(DailyIncome)]
+    qn = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in ('grocery', 'date', 'amount', 'created_at', 'updated_at', 'is_deleted')]
+    grocery, date, amount, created_at, updated_at, is_deleted = (qn(field.column) for field in fields)
+
+    now = timezone.now()
+    params = []
+    for income in incomes:
+        values = (income.grocery_id, income.date, income.amount, now, now, False)
+        params.extend(field.get_db_prep_save(value, connection) for field, value in zip(fields, values))
+
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    if on_conflict == 'update':
+        action = f'DO UPDATE SET {amount} = EXCLUDED.{amount}, {updated_at} = EXCLUDED.{updated_at}'
+    else:
+        action = 'DO NOTHING'
+    sql = (
+        f'INSERT INTO {qn(meta.db_table)} ({", ".join(qn(field.column) for field in fields)}) '
+        f'VALUES {", ".join([row] * len(incomes))} '
+        f'ON CONFLICT ({grocery}, {date}) WHERE NOT {is_deleted} {action} '
+        # Only a fresh insert has both timestamps equal
+        f'RETURNING {qn(meta.pk.column)}, {grocery}, {date}, {created_at} = {updated_at}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        returned = cursor.fetchall()
+
+    # Matched on the key, DO NOTHING skips the conflicting rows
+    by_key = {(income.grocery_id, str(income.date)): income for income in incomes}
+    written = []
+    for pk, grocery_id, day, inserted in returned:
+        income = by_key[(grocery_id, str(day))]
+        income.pk = pk
+        income.updated_at = now
+        if inserted:
+            income.created_at = now
+        income._state.adding = False
+        income._state.db = connection.alias
+        written.append((income, bool(inserted)))
+    return written
+
+
+def find_duplicate_income_keys(incomes, errors):
+    """Flags rows repeating a (grocery, date) pair seen earlier in the payload."""
+    seen = set()
+    for index, income in enumerate(incomes):
+        key = (income.grocery_id, income.date)
+        if key in seen:
+            errors[index]['date'] = ['This date appears more than once for the same grocery.']
+        seen.add(key)
+
+
+class BulkWriteMixin:
+    """
+    Adds ``<prefix>/bulk/`` to a ModelViewSet:
+    POST creates rows, PATCH updates rows by ``id``, DELETE soft-deletes ``{"ids": [...]}``.
+    """
+    # Serializer used to validate rows; the grocery is resolved by the view, not per row
+    bulk_serializer_class = None
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        if request.method == 'POST':
+            return self.bulk_create(request)
+        if request.method == 'PATCH':
+            return self.bulk_update(request)
+        return self.bulk_destroy(request)
+
+    # --- Helpers ---
+
+    @property
+    def bulk_model(self):
+        return self.bulk_serializer_class.Meta.model
+
+    def get_bulk_rows(self, request):
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'detail': 'Expected a list of rows.'})
+        if len(rows) > settings.BULK_MAX_ROWS:
+            raise ValidationError({'detail': f'At most {settings.BULK_MAX_ROWS} rows are allowed per request.'})
+        return rows
+
+    def resolve_bulk_groceries(self, rows):
+        """
+        Admins name a grocery per row; suppliers may only name their own and
+        default to it when they manage just one.
+        """
+        if self.request.user.is_staff:
+            return resolve_row_groceries(rows)
+        scope = get_grocery_scope(self.request)
+        if not scope:
+            raise PermissionDenied("You are not assigned to any grocery.")
+        return resolve_row_groceries(rows, scope=scope)
+
+    def validate_bulk_rows(self, rows, errors, partial=False):
+        return validate_rows(self.bulk_serializer_class, rows, errors, self.get_serializer_context(), partial)
+
+    def bulk_error_response(self, errors):
+        return Response(
+            {'errors': [{'index': index, 'errors': row_errors} for index, row_errors in enumerate(errors) if row_errors]},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    def check_bulk_create(self, instances, errors):
+        """Hook for model-specific checks across the whole payload."""
+
+    def save_bulk_instances(self, instances, errors):
+        """
+        Inserts the checked `instances` and returns the saved ones. Rows that
+        cannot be written are flagged in `errors`, which rolls the batch back.
+        """
+        return self.bulk_model.objects.bulk_create(instances, batch_size=settings.BULK_BATCH_SIZE)
+
+    # --- Actions ---
+
+    def bulk_create(self, request):
+        rows = self.get_bulk_rows(request)
+        groceries, errors = self.resolve_bulk_groceries(rows)
+        validated = self.validate_bulk_rows(rows, errors)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        instances = [self.bulk_model(grocery=grocery, **attrs) for grocery, attrs in zip(groceries, validated)]
+        self.check_bulk_create(instances, errors)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        with transaction.atomic():
+            created = self.save_bulk_instances(instances, errors)
+            if any(errors):
+                # All rows or none
+                transaction.set_rollback(True)
+            else:
+                bulk_changed.send(sender=self.bulk_model, keys={change_key(obj) for obj in created})
+        if any(errors):
+            return self.bulk_error_response(errors)
+        return Response({'created': len(created), 'ids': [obj.pk for obj in created]}, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        rows = self.get_bulk_rows(request)
+        errors = [{} for _ in rows]
+        ids = [_as_int(row.get('id')) if isinstance(row, dict) else None for row in rows]
+        # Scoped queryset: suppliers only ever see (and update) their own rows
+        instances = self.get_queryset().in_bulk({pk for pk in ids if pk is not None})
+        for index, pk in enumerate(ids):
+            if pk is None:
+                errors[index]['id'] = ['This field is required.']
+            elif pk not in instances:
+                errors[index]['id'] = ['Not found.']
+
+        validated = self.validate_bulk_rows(rows, errors, partial=True)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        now = timezone.now()
+        fields = {'updated_at'}
+        changed = []
+        keys = set()
+        for pk, attrs in zip(ids, validated):
+            instance = instances[pk]
+            keys.add(change_key(instance))
+            for name, value in attrs.items():
+                setattr(instance, name, value)
+            instance.updated_at = now
+            fields.update(attrs)
+            changed.append(instance)
+            keys.add(change_key(instance))
+
+        try:
+            with transaction.atomic():
+                self.bulk_model.objects.bulk_update(changed, sorted(fields), batch_size=settings.BULK_BATCH_SIZE)
+                bulk_changed.send(sender=self.bulk_model, keys=keys)
+        except IntegrityError:
+            return Response({'detail': 'The rows conflict with existing data.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'updated': len(changed)})
+
+    def bulk_destroy(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or any(_as_int(pk) is None for pk in ids):
+            raise ValidationError({'ids': ['Expected a list of ids.']})
+        ids = sorted({_as_int(pk) for pk in ids})
+
+        deleted = 0
+        with transaction.atomic():
+            for chunk in _chunks(ids, settings.BULK_BATCH_SIZE):
+                rows = self.get_queryset().filter(pk__in=chunk)
+                keys = queryset_change_keys(rows)
+                deleted += rows.soft_delete()
+                bulk_changed.send(sender=self.bulk_model, keys=keys)
+        return Response({'deleted': deleted})
+
+
+class DailyIncomeBulkMixin(BulkWriteMixin):
+    """
+    Bulk writes for DailyIncome, plus ``bulk-upsert/`` keyed on (grocery, date).
+    """
+    def check_bulk_create(self, instances, errors):
+        find_duplicate_income_keys(instances, errors)
+
+    def save_bulk_instances(self, instances, errors):
+        # ON CONFLICT DO NOTHING: days already stored, even by a concurrent
+        # request, are missing from the RETURNING rows instead of raising
+        written = set()
+        for chunk in _chunks(instances, settings.BULK_BATCH_SIZE):
+            written.update(id(income) for income, _ in write_daily_incomes(chunk))
+        for index, income in enumerate(instances):
+            if id(income) not in written:
+                errors[index]['date'] = ['Income for this date already exists.']
+        return [income for income in instances if id(income) in written]
+
+    @action(detail=False, methods=['post'], url_path='bulk-upsert')
+    def bulk_upsert(self, request):
+        """
+        Creates the missing days and overwrites the amount of the existing ones.
+        """
+        rows = self.get_bulk_rows(request)
+        groceries, errors = self.resolve_bulk_groceries(rows)
+        validated = self.validate_bulk_rows(rows, errors)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        incomes = [DailyIncome(grocery=grocery, **attrs) for grocery, attrs in zip(groceries, validated)]
+        find_duplicate_income_keys(incomes, errors)
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        created, updated = upsert_daily_incomes(incomes)
+        return Response({'created': created, 'updated': updated})
@@ -0,0 +1,150 @@
+"""
+Response cache for the read-heavy grocery and item endpoints.
+
+Cached list/retrieve payloads are keyed on a version number per namespace
+('groceries', 'items'), the caller's scope (staff or one supplier) and the
+full request path. Writes bump the versions of every namespace that renders
+the changed model, so stale entries are never read again and simply expire.
+The key also serves as the ETag: the same version, scope and path always
+render the same body, so If-None-Match is answered before the cache is read.
+
+Misses are rendered from the primary even on replica-routed requests: the
+version is bumped once the write commits on the primary, and a lagging replica
+read stored under the new version would be served long after the lag is over.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .database import replica_reads
+
+# Namespaces whose responses render each model
+INVALIDATES = {
+    'Grocery': ('groceries', 'items'),  # items are scoped by their grocery's owner
+    'Item': ('groceries', 'items'),  # nested items and item_count
+    'DailyIncome': ('groceries',),  # nested incomes, income_count, latest_income
+}
+STATS_KEYS = {'hits': 'api:cache:hits', 'misses': 'api:cache:misses'}
+
+
+def _version_key(namespace):
+    return f'api:cache:version:{namespace}'
+
+
+def get_cache_version(namespace):
+    # Start from the clock so an evicted version never reuses old numbers
+    return cache.get_or_set(_version_key(namespace), lambda: int(time.time() * 1000), timeout=None)
+
+
+def bump_cache_versions(namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            get_cache_version(namespace)
+
+
+def expire_cached_responses():
+    """Bumps every namespace, leaving the rest of the cache (versions, auth) alone."""
+    bump_cache_versions({namespace for namespaces in INVALIDATES.values() for namespace in namespaces})
+
+
+def invalidate_model(model):
+    """Bumps the namespaces rendering `model`."""
+    namespaces = INVALIDATES.get(model.__name__, ())
+    bump_cache_versions(namespaces)
+    # Bump again after commit: a read between the first bump and the commit
+    # may have cached the old rows under the new version
+    transaction.on_commit(lambda: bump_cache_versions(namespaces))
+
+
+def _count(outcome):
+    try:
+        cache.incr(STATS_KEYS[outcome])
+    except ValueError:
+        cache.add(STATS_KEYS[outcome], 0, timeout=None)
+        cache.incr(STATS_KEYS[outcome])
+
+
+def get_cache_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    return {outcome: values.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def _etag_matches(if_none_match, etag):
+    header = if_none_match or ''
+    return header.strip() == '*' or etag in {value.strip() for value in header.split(',')}
+
+
+# Returned by lookup_cached_response when the client already has the response
+NOT_MODIFIED = object()
+
+
+def lookup_cached_response(namespace, scope, path, if_none_match=None):
+    """
+    Returns (key, etag, data) for a read of `path`. `data` is NOT_MODIFIED when
+    `if_none_match` carries the etag, the cached payload on a hit, else None.
+    """
+    version = get_cache_version(namespace)
+    digest = hashlib.md5(f'{namespace}:{version}:{scope}:{path}'.encode(), usedforsecurity=False).hexdigest()
+    etag = f'"{digest}"'
+    key = f'api:cache:response:{digest}'
+
+    if _etag_matches(if_none_match, etag):
+        _count('hits')
+        return key, etag, NOT_MODIFIED
+    data = cache.get(key)
+    _count('misses' if data is None else 'hits')
+    return key, etag, data
+
+
+def store_cached_response(key, data):
+    cache.set(key, data, settings.API_CACHE_TIMEOUT)
+
+
+def cache_headers(response, etag):
+    response['ETag'] = etag
+    # Per-user data: browsers may keep it but must revalidate every time
+    response['Cache-Control'] = 'private, no-cache'
+    response['Vary'] = 'Authorization'
+    return response
+
+
+def get_cache_scope(user):
+    return 'staff' if user.is_staff else f'user:{user.pk}'
+
+
+class CachedResponseMixin:
+    """
+    Caches the 200 responses of list and retrieve under ``cache_namespace``.
+    Permissions still run first; the object permission of retrieve is
+    covered by the scope and by the owner's grocery bumping the version.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key, etag, data = lookup_cached_response(
+            self.cache_namespace, get_cache_scope(request.user), request.get_full_path(), request.headers.get('If-None-Match')
+        )
+        if data is NOT_MODIFIED:
+            return cache_headers(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        if data is not None:
+            return cache_headers(Response(data), etag)
+
+        with replica_reads(False):
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            store_cached_response(key, response.data)
+            cache_headers(response, etag)
+        return response
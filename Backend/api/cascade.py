@@ -0,0 +1,89 @@
+"""
+Cascading soft-delete and restore of groceries.
+
+Deleting a grocery also hides its live items and incomes. Each operation runs
+one UPDATE per table in a single transaction, however many rows a branch
+holds, and then sends `bulk_changed` so the derived data (graph outbox,
+rollups, stats, caches) follows like after any other bulk write.
+
+Children keep the grocery's deletion timestamp as their `updated_at`, which is
+how a restore tells the rows the cascade hid apart from the ones deleted on
+their own before: only the former come back, including hidden incomes that
+`archive_incomes` has since moved to ArchivedDailyIncome.
+"""
+from django.db import transaction
+from django.db.models import Exists, F, Max, Min, OuterRef
+from django.utils import timezone
+
+from .archive import unarchive_incomes
+from .models import ArchivedDailyIncome, DailyIncome, Grocery, Item
+from .signals import bulk_changed
+
+
+def _income_keys(incomes):
+    """`bulk_changed` keys spanning the dates of `incomes`, two per grocery."""
+    keys = set()
+    for row in incomes.values('grocery_id').annotate(low=Min('date'), high=Max('date')).order_by():
+        keys.update({(row['grocery_id'], row['low']), (row['grocery_id'], row['high'])})
+    return keys
+
+
+def _send_changes(grocery_ids, income_keys):
+    keys = {(grocery_id, None) for grocery_id in grocery_ids}
+    bulk_changed.send(sender=Grocery, keys=keys)
+    bulk_changed.send(sender=Item, keys=keys)
+    if income_keys:
+        bulk_changed.send(sender=DailyIncome, keys=income_keys)
+
+
+def soft_delete_groceries(grocery_ids):
+    """
+    Soft-deletes the live groceries among `grocery_ids` with their live items
+    and incomes. Returns the number of rows deleted per model.
+    """
+    with transaction.atomic():
+        ids = list(
+            Grocery.objects.select_for_update().filter(pk__in=grocery_ids).order_by('pk').values_list('pk', flat=True)  # type: ignore
+        )
+        if not ids:
+            return {'groceries': 0, 'items': 0, 'incomes': 0}
+        now = timezone.now()
+        incomes = DailyIncome.objects.filter(grocery_id__in=ids)  # type: ignore
+        income_keys = _income_keys(incomes)
+        counts = {
+            'items': Item.objects.filter(grocery_id__in=ids).update(is_deleted=True, updated_at=now),  # type: ignore
+            'incomes': incomes.update(is_deleted=True, updated_at=now),
+            'groceries': Grocery.objects.filter(pk__in=ids).update(is_deleted=True, updated_at=now),  # type: ignore
+        }
+        _send_changes(ids, income_keys)
+    return counts
+
+
+def restore_groceries(grocery_ids):
+    """
+    Restores the deleted groceries among `grocery_ids` and the items and
+    incomes their deletion hid, archived or not. An income whose day was
+    entered again in the meantime stays deleted. Returns the number of rows
+    restored per model.
+    """
+    with transaction.atomic():
+        ids = list(
+            Grocery.all_objects.select_for_update()  # type: ignore
+            .filter(pk__in=grocery_ids, is_deleted=True).order_by('pk').values_list('pk', flat=True)
+        )
+        if not ids:
+            return {'groceries': 0, 'items': 0, 'incomes': 0}
+        now = timezone.now()
+        # Children first: they are matched on the grocery's deletion timestamp
+        hidden = {'grocery_id__in': ids, 'updated_at': F('grocery__updated_at')}
+        entered_again = Exists(DailyIncome.objects.filter(grocery_id=OuterRef('grocery_id'), date=OuterRef('date')))  # type: ignore
+        incomes = DailyIncome.all_objects.filter(**hidden, is_deleted=True).exclude(entered_again)  # type: ignore
+        archived = ArchivedDailyIncome.objects.filter(**hidden).exclude(entered_again)  # type: ignore
+        income_keys = _income_keys(incomes) | _income_keys(archived)
+        counts = {
+            'items': Item.all_objects.filter(**hidden, is_deleted=True).update(is_deleted=False, updated_at=now),  # type: ignore
+            'incomes': incomes.update(is_deleted=False, updated_at=now) + unarchive_incomes(archived, now),
+            'groceries': Grocery.all_objects.filter(pk__in=ids).update(is_deleted=False, updated_at=now),  # type: ignore
+        }
+        _send_changes(ids, income_keys)
+    return counts
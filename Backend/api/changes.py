@@ -0,0 +1,114 @@
+"""
+Delta sync for groceries, items and daily incomes.
+
+``GET /api/<resource>/changes/?since=<cursor>`` returns the rows created,
+updated or soft-deleted after the cursor, oldest first and with
+``is_deleted``, plus the cursor to send next time. Rows are ordered by
+(updated_at, id) and read through the index on those columns, so a poll
+that finds nothing costs one index probe instead of a full list.
+
+updated_at is set when a row is written, not when its transaction commits,
+so a slow transaction can commit a row older than one a client has already
+seen. The feed only returns rows that are CHANGE_FEED_LAG_SECONDS old, which
+keeps the cursor monotonic as long as writes (and replicas) catch up within
+that window.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .fastpath import RowEncoder
+
+
+def encode_cursor(updated_at, pk):
+    return urlsafe_b64encode(f'{updated_at.isoformat()}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """The (updated_at, id) position of a cursor; ValidationError when malformed."""
+    try:
+        updated_at, pk = urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode().split('|')
+        updated_at, pk = datetime.fromisoformat(updated_at), int(pk)
+    except ValueError:
+        raise ValidationError({'since': ['Invalid cursor.']})
+    if timezone.is_naive(updated_at):
+        raise ValidationError({'since': ['Invalid cursor.']})
+    return updated_at, pk
+
+
+def read_changes(queryset, columns, position=None, limit=500):
+    """
+    Up to `limit` ``.values(*columns)`` rows of `queryset` changed after
+    `position`, oldest first. Returns (rows, cursor after the last row or
+    None, whether more rows are ready).
+    """
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_LAG_SECONDS)
+    queryset = queryset.filter(updated_at__lte=horizon)
+    if position is not None:
+        updated_at, pk = position
+        # The plain range on updated_at lets the planner scan the index from the cursor
+        queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk), updated_at__gte=updated_at)
+    rows = list(queryset.order_by('updated_at', 'pk').values(*dict.fromkeys([*columns, 'updated_at', 'id']))[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = encode_cursor(rows[-1]['updated_at'], rows[-1]['id']) if rows else None
+    return rows, cursor, has_more
+
+
+def release_connections():
+    """
+    Lets a long-lived request give its database connections back (to the
+    pool with DB_POOL) between reads. Connections inside a transaction are kept.
+    """
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close_if_unusable_or_obsolete()
+
+
+class ChangeFeedMixin:
+    """
+    Adds ``changes/`` to a ModelViewSet. Rows are rendered by
+    `change_serializer_class` (plain model columns only); suppliers only see
+    the rows whose `owner_lookup` is them.
+    """
+    change_serializer_class = None
+    owner_lookup = 'grocery__responsible_person'
+
+    def get_change_queryset(self):
+        # Soft-deleted rows included: clients need to drop them
+        queryset = self.change_serializer_class.Meta.model.all_objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(**{self.owner_lookup: self.request.user})
+        return queryset
+
+    def get_change_page_size(self):
+        value = self.request.query_params.get('page_size')
+        if value is None:
+            return settings.CHANGE_FEED_PAGE_SIZE
+        try:
+            size = int(value)
+        except ValueError:
+            raise ValidationError({'page_size': ['A valid integer is required.']})
+        return min(max(size, 1), settings.CHANGE_FEED_MAX_PAGE_SIZE)
+
+    def read_changes(self, since=None):
+        """Returns (rendered rows, next cursor, has_more) for the `since` cursor."""
+        position = decode_cursor(since) if since else None
+        encoder = RowEncoder(self.change_serializer_class(context=self.get_serializer_context()))
+        rows, cursor, has_more = read_changes(self.get_change_queryset(), encoder.attnames, position, self.get_change_page_size())
+        # An empty page keeps the client where it was
+        return [encoder(row) for row in rows], cursor or since, has_more
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        results, cursor, has_more = self.read_changes(request.query_params.get('since'))
+        response = Response({'results': results, 'next': cursor, 'has_more': has_more})
+        response.plain_json = True
+        return response
@@ -0,0 +1,76 @@
+"""
+Read-replica routing and connection pool statistics.
+
+ReplicaRoutingMiddleware marks safe requests (GET, HEAD, OPTIONS) and
+ReplicaRouter sends their reads to one of settings.DATABASE_REPLICAS; writes
+and the reads of unsafe requests stay on the primary. A client that just
+wrote keeps reading from the primary for REPLICA_PIN_SECONDS, so replication
+lag never hides its own changes. Without replicas configured every query
+goes to 'default' as before.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+_read_from_replica = ContextVar('api_read_from_replica', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def replica_pin_key(request):
+    """Cache key pinning the client of `request` to the primary, None if anonymous."""
+    credentials = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return 'api:db:pin:' + hashlib.md5(credentials.encode(), usedforsecurity=False).hexdigest()
+
+
+class ReplicaRouter:
+    """
+    Reads inside ``replica_reads()`` go to a random replica; everything else
+    is left to the default database.
+    """
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _read_from_replica.get():
+            return None
+        # Related objects are read from where their instance came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def pool_stats():
+    """
+    psycopg pool statistics per database alias with pooling enabled (see
+    ``psycopg_pool.ConnectionPool.get_stats``).
+    """
+    stats = {}
+    for alias in connections:
+        # Only the PostgreSQL backend has pools, and only with OPTIONS['pool']
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
@@ -0,0 +1,43 @@
+"""
+JSON encoding and value formatting shared by the fast read path and exports.
+Values are formatted the way the DRF serializer fields format them.
+"""
+import json
+
+from django.utils import timezone
+
+try:
+    import orjson
+except ImportError:  # pinned in requirements.txt, but only a speed-up
+    orjson = None
+
+
+def format_datetime(value):
+    if value is None:
+        return None
+    value = timezone.localtime(value) if timezone.is_aware(value) else value
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def format_date(value):
+    return None if value is None else value.isoformat()
+
+
+def format_decimal(value):
+    return '' if value is None else f'{value:f}'
+
+
+def dumps(data, escape_line_separators=True):
+    """
+    Compact UTF-8 JSON of plain data (dicts, lists, str, int, bool, None),
+    byte for byte what JSONRenderer would return for it.
+    """
+    if orjson is not None:
+        encoded = orjson.dumps(data)
+    else:
+        encoded = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+    if escape_line_separators:
+        # JSONRenderer escapes these so the output is also valid JavaScript
+        encoded = encoded.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return encoded
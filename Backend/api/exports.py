@@ -0,0 +1,152 @@
+"""
+Streaming CSV/NDJSON exports for the Item and DailyIncome ViewSets.
+
+Rows are read with a server-side cursor (`.values_list().iterator()`) and
+formatted with per-column functions picked once per export, so memory stays
+constant and no serializer is instantiated per row. Values are formatted the
+same way the API serializers format them.
+
+Under ASGI the body must be an async iterator: Django would otherwise drain a
+sync one into a list before sending anything. There every chunk is fetched
+with ``sync_to_async`` on the request's thread, which keeps the cursor open.
+"""
+import csv
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from .encoding import dumps, format_date, format_datetime, format_decimal
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def column_formatter(field):
+    """The function turning a database value of `field` into its API representation."""
+    internal_type = field.get_internal_type()
+    if internal_type == 'DateTimeField':
+        return format_datetime
+    if internal_type == 'DateField':
+        return format_date
+    if internal_type == 'DecimalField':
+        return format_decimal
+    return None
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back each line instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(names, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(names)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def iter_ndjson(names, rows):
+    for row in rows:
+        yield dumps(dict(zip(names, row)), escape_line_separators=False).decode() + '\n'
+
+
+def buffered(lines, size=500):
+    """Joins lines into larger chunks so the server does not flush every row."""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+async def aiter_chunks(chunks):
+    """Yields the chunks of the sync generator `chunks`, each computed in a thread."""
+    try:
+        while (chunk := await sync_to_async(next)(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # A client hanging up early must still release the cursor
+        await sync_to_async(chunks.close)()
+
+
+def stream_export(queryset, columns, fmt, filename, asynchronous=False):
+    """
+    Returns a StreamingHttpResponse with `columns` of every row in `queryset`.
+    `columns` are model field names; foreign keys are exported as their id.
+    `asynchronous` streams an async iterator, for requests served over ASGI.
+    """
+    model = queryset.model
+    fields = [model._meta.get_field(name) for name in columns]
+    attnames = [field.attname for field in fields]
+    formatters = [column_formatter(field) for field in fields]
+
+    def rows():
+        for row in queryset.values_list(*attnames).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+            yield [value if formatter is None else formatter(value) for formatter, value in zip(formatters, row)]
+
+    lines = iter_csv(columns, rows()) if fmt == 'csv' else iter_ndjson(columns, rows())
+    chunks = buffered(lines)
+    response = StreamingHttpResponse(aiter_chunks(chunks) if asynchronous else chunks, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def _parse_date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValidationError({name: ['Enter a valid date (YYYY-MM-DD).']})
+    return parsed
+
+
+class ExportMixin:
+    """
+    Adds ``<prefix>/export/?output=csv|ndjson`` to a ViewSet, with optional
+    ``grocery``, ``date_from`` and ``date_to`` filters. Rows are scoped by
+    the ViewSet's get_queryset, so suppliers only export their own grocery.
+    """
+    export_columns = ()
+    # Field the date filters apply to; DateTimeFields are compared by calendar day
+    export_date_field = 'created_at'
+    export_ordering = ('id',)
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        fmt = request.query_params.get('output', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            raise ValidationError({'output': [f'Choose one of: {", ".join(EXPORT_FORMATS)}.']})
+
+        queryset = self.get_queryset().order_by(*self.export_ordering)
+        grocery = request.query_params.get('grocery')
+        if grocery:
+            if not grocery.isdigit():
+                raise ValidationError({'grocery': ['A valid integer is required.']})
+            queryset = queryset.filter(grocery_id=int(grocery))
+
+        date_from = _parse_date_param(request.query_params, 'date_from')
+        date_to = _parse_date_param(request.query_params, 'date_to')
+        is_datetime = queryset.model._meta.get_field(self.export_date_field).get_internal_type() == 'DateTimeField'
+        if date_from:
+            start = timezone.make_aware(datetime.combine(date_from, time.min)) if is_datetime else date_from
+            queryset = queryset.filter(**{f'{self.export_date_field}__gte': start})
+        if date_to:
+            end = timezone.make_aware(datetime.combine(date_to, time.max)) if is_datetime else date_to
+            queryset = queryset.filter(**{f'{self.export_date_field}__lte': end})
+
+        asynchronous = isinstance(request._request, ASGIRequest)
+        return stream_export(queryset, self.export_columns, fmt, self.basename, asynchronous)
@@ -0,0 +1,131 @@
+"""
+Fast read path for list endpoints of plain ModelSerializers.
+
+Instead of building model instances and calling every serializer field per
+row, FastReadMixin reads the page with ``.values()`` and maps each row with a
+row encoder compiled once per request from the serializer's fields. The
+response is then encoded with orjson (in requirements.txt; the json module
+stands in when it is missing, see api/encoding.py). The bytes are the
+same as what the serializers and DRF's JSONRenderer produce; fields the
+encoder does not know are formatted by the serializer field itself, and
+serializers with computed or nested fields keep the regular path.
+"""
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import relations, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from .encoding import dumps, format_date, format_datetime
+
+# Values that pass through unchanged, as DRF returns them
+_PASSTHROUGH = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+
+
+def _decimal_formatter(field):
+    if field.normalize_output or field.localize or not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING):
+        return field.to_representation
+    if field.decimal_places is None:
+        return lambda value: f'{value:f}'
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+    return lambda value: f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+
+
+def _formatter(field):
+    """A function formatting a database value like `field` does, None for no-op."""
+    if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_formatter(field)
+    if isinstance(field, serializers.DateTimeField):
+        iso = getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+        return format_datetime if iso and not hasattr(field, 'timezone') else field.to_representation
+    if isinstance(field, serializers.DateField):
+        iso = getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601
+        return format_date if iso else field.to_representation
+    if type(field) in _PASSTHROUGH:
+        return None
+    return field.to_representation
+
+
+class RowEncoder:
+    """
+    Turns ``.values()`` rows into the dicts `serializer` would render.
+    `attnames` are the columns to select.
+    """
+    def __init__(self, serializer):
+        model = serializer.Meta.model
+        self.columns = []
+        for field in serializer._readable_fields:
+            if field.source == '*' or '.' in field.source or isinstance(field, serializers.BaseSerializer):
+                raise ValueError(f'{field.field_name} is not a plain model column.')
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise ValueError(f'{field.field_name} is not a model field.')
+            if not model_field.concrete or model_field.many_to_many:
+                raise ValueError(f'{field.field_name} is not a plain model column.')
+            self.columns.append((field.field_name, model_field.attname, _formatter(field)))
+        self.attnames = [attname for _, attname, _ in self.columns]
+
+    def __call__(self, row):
+        encoded = {}
+        for name, attname, formatter in self.columns:
+            value = row[attname]
+            # DRF renders None as None whatever the field type
+            encoded[name] = value if formatter is None or value is None else formatter(value)
+        return encoded
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes responses marked ``plain_json`` (built from
+    plain values by FastReadMixin) with `dumps`. Everything else, and indented
+    output, goes through JSONRenderer unchanged.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if (
+            data is None or not getattr(response, 'plain_json', False)
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastReadMixin:
+    """
+    Serves ``list`` through RowEncoder when the serializer (after ``?fields=``
+    trimming) only has plain model columns. FAST_READ_PATH=false turns it off.
+    """
+    def get_row_encoder(self):
+        try:
+            return RowEncoder(self.get_serializer())
+        except ValueError:
+            return None
+
+    def get_fast_rows(self, queryset, encoder):
+        # The cursor paginator reads the ordering columns from each row
+        ordering = [term.lstrip('-') for term in queryset.query.order_by]
+        return queryset.values(*dict.fromkeys([*encoder.attnames, *ordering]))
+
+    def list(self, request, *args, **kwargs):
+        encoder = self.get_row_encoder() if settings.FAST_READ_PATH else None
+        if encoder is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = self.get_fast_rows(self.filter_queryset(self.get_queryset()), encoder)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            response = self.get_paginated_response([encoder(row) for row in page])
+        else:
+            response = Response([encoder(row) for row in rows])
+        response.plain_json = True
+        return response
@@ -0,0 +1,122 @@
+"""
+Query-parameter filtering, ordering and full-text search for the list endpoints.
+
+Views declare what they accept:
+- ``query_filters``: query param -> (ORM lookup, value type)
+- ``ordering_fields`` / ``ordering``: as for DRF's OrderingFilter
+- ``search_fields``: text columns matched by ``?search=``
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections
+from django.db.models import BooleanField, F, Func, Q
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+def _parse_int(value):
+    if not value.isdigit():
+        raise ValueError('A valid integer is required.')
+    return int(value)
+
+
+def _parse_decimal(value):
+    try:
+        parsed = Decimal(value)
+    except InvalidOperation:
+        raise ValueError('A valid number is required.')
+    if not parsed.is_finite():
+        raise ValueError('A valid number is required.')
+    return parsed
+
+
+def _parse_date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError('Enter a valid date (YYYY-MM-DD).')
+    return parsed
+
+
+PARSERS = {
+    'int': _parse_int,
+    'decimal': _parse_decimal,
+    'date': _parse_date,
+    'str': str,
+}
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Applies ``view.query_filters``. Lookups ending in ``__in`` take a
+    comma-separated list, e.g. ``?item_type=Dairy,Bakery``.
+    """
+    def filter_queryset(self, request, queryset, view):
+        conditions = {}
+        errors = {}
+        for param, (lookup, kind) in getattr(view, 'query_filters', {}).items():
+            value = request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                if lookup.endswith('__in'):
+                    conditions[lookup] = [PARSERS[kind](part.strip()) for part in value.split(',') if part.strip()]
+                else:
+                    conditions[lookup] = PARSERS[kind](value)
+            except ValueError as exc:
+                errors[param] = [str(exc)]
+        if errors:
+            raise ValidationError(errors)
+        return queryset.filter(**conditions)
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    OrderingFilter that appends the primary key, so rows with equal values
+    keep a fixed order and the cursor pagination never skips or repeats them.
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if not any(term.lstrip('-') in ('id', 'pk') for term in ordering):
+            ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+        return tuple(ordering)
+
+
+class FullTextMatch(Func):
+    """
+    ``to_tsvector('simple', a || ' ' || b ...) @@ websearch_to_tsquery('simple', term)``.
+    The document is written exactly like the expression of the GIN index in
+    migration 0008, which PostgreSQL needs to use the index.
+    """
+    arg_joiner = " || ' ' || "
+    output_field = BooleanField()
+
+    def __init__(self, fields, term):
+        super().__init__(*(F(name) for name in fields))
+        self.term = term
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, params = super().as_sql(compiler, connection, template='%(expressions)s')
+        sql = f"to_tsvector('simple'::regconfig, {document}) @@ websearch_to_tsquery('simple'::regconfig, %s)"
+        return sql, (*params, self.term)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    ``?search=`` over ``view.search_fields``: indexed full-text search on
+    PostgreSQL, a case-insensitive substring match elsewhere.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        fields = getattr(view, 'search_fields', ())
+        if not term or not fields:
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            return queryset.filter(FullTextMatch(fields, term))
+
+        match = Q()
+        for word in term.split():
+            match &= Q(*(Q(**{f'{name}__icontains': word}) for name in fields), _connector=Q.OR)
+        return queryset.filter(match)
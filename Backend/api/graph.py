@@ -0,0 +1,368 @@
+"""
+Graph backends used to mirror groceries and their suppliers into Neo4j.
+
+Every write is a single parameterised Cypher statement per batch (UNWIND), keyed
+by Postgres primary keys, so re-applying the same batch is idempotent. Reads
+are single Cypher queries returning projected rows, and `query_graph` keeps
+their results in process memory until the outbox worker applies the next batch.
+`InMemoryGraphBackend` implements the same interface without a Neo4j server and
+is what the tests use.
+
+Graph access is synchronous: writes only happen in the outbox worker, never
+in a request, and the graph reads are plain sync views that Django runs in
+its thread pool under ASGI.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .caching import bump_cache_versions, get_cache_version
+from .instrumentation import timed
+
+# Grocery-to-grocery steps (through a supplier or an item type) a related query may take
+MAX_RELATED_DEPTH = 3
+# Rows a related query returns at most, nearest first
+MAX_RELATED_RESULTS = 100
+
+
+UPSERT_GROCERIES = """
+UNWIND $rows AS row
+MERGE (g:GroceryNode {pg_id: row.id})
+  ON CREATE SET g.uid = replace(randomUUID(), '-', '')
+SET g.name = row.name, g.location = row.location
+WITH g, row
+OPTIONAL MATCH (g)-[old:STOCKS]->(t:ItemTypeNode)
+  WHERE NOT t.name IN row.item_types
+DELETE old
+WITH DISTINCT g, row
+FOREACH (type IN row.item_types |
+  MERGE (t:ItemTypeNode {name: type})
+  MERGE (g)-[:STOCKS]->(t))
+WITH g, row
+OPTIONAL MATCH (g)-[old:MANAGED_BY]->(s:SupplierNode)
+  WHERE row.supplier IS NULL OR s.pg_id IS NULL OR s.pg_id <> row.supplier.id
+DELETE old
+WITH DISTINCT g, row
+OPTIONAL MATCH (s:SupplierNode)-[old:MANAGES]->(g)
+  WHERE row.supplier IS NULL OR s.pg_id IS NULL OR s.pg_id <> row.supplier.id
+DELETE old
+WITH DISTINCT g, row
+WHERE row.supplier IS NOT NULL
+MERGE (s:SupplierNode {pg_id: row.supplier.id})
+  ON CREATE SET s.uid = replace(randomUUID(), '-', '')
+SET s.username = row.supplier.username, s.email = row.supplier.email
+MERGE (g)-[:MANAGED_BY]->(s)
+MERGE (s)-[:MANAGES]->(g)
+"""
+
+DELETE_GROCERIES = """
+UNWIND $ids AS id
+MATCH (g:GroceryNode {pg_id: id})
+DETACH DELETE g
+"""
+
+# Every grocery node as the row that wrote it; more than one supplier means
+# the edges are inconsistent
+GROCERY_SNAPSHOT = """
+MATCH (g:GroceryNode)
+WHERE g.pg_id IS NOT NULL
+OPTIONAL MATCH (g)-[:MANAGED_BY]->(s:SupplierNode)
+WITH g, collect(DISTINCT s) AS suppliers
+OPTIONAL MATCH (g)-[:STOCKS]->(t:ItemTypeNode)
+RETURN g.pg_id AS id, g.name AS name, g.location AS location,
+  [s IN suppliers | {id: s.pg_id, username: s.username, email: s.email}] AS suppliers,
+  collect(DISTINCT t.name) AS item_types
+"""
+
+# Nodes left by the old name-keyed sync, then nodes nothing points to anymore
+PRUNE_LEGACY_GROCERIES = """
+MATCH (g:GroceryNode)
+WHERE g.pg_id IS NULL
+DETACH DELETE g
+RETURN count(g) AS deleted
+"""
+
+PRUNE_UNLINKED_NODES = """
+MATCH (n)
+WHERE (n:SupplierNode OR n:ItemTypeNode) AND NOT (n)--()
+DELETE n
+RETURN count(n) AS deleted
+"""
+
+MANAGED_GROCERIES = """
+MATCH (:SupplierNode {pg_id: $supplier_id})-[:MANAGES]->(g:GroceryNode)
+RETURN g.pg_id AS id, g.name AS name, g.location AS location
+ORDER BY id
+"""
+
+SUPPLIERS_SHARING_ITEM_TYPES = """
+MATCH (g:GroceryNode {pg_id: $grocery_id})-[:STOCKS]->(t:ItemTypeNode)<-[:STOCKS]-(other:GroceryNode)
+  -[:MANAGED_BY]->(s:SupplierNode)
+WHERE other <> g
+RETURN s.pg_id AS id, s.username AS username, collect(DISTINCT t.name) AS item_types
+ORDER BY id
+"""
+
+# Groceries reachable in one step: those sharing a supplier or an item type.
+# The search is breadth-first with one RELATED_STEP per level, each expanding
+# only the DISTINCT groceries first reached on the level before, so the work
+# grows with the groceries seen rather than with the paths between them.
+# Levels cannot be parameters, so the steps are repeated `depth` times.
+RELATED_START = """
+MATCH (g:GroceryNode {pg_id: $grocery_id})
+WITH [g] AS seen, [g] AS frontier, [] AS found
+"""
+
+RELATED_STEP = """
+CALL {
+  WITH seen, frontier
+  UNWIND frontier AS f
+  MATCH (f)-[:MANAGED_BY|STOCKS]->()<-[:MANAGED_BY|STOCKS]-(n:GroceryNode)
+  WHERE NOT n IN seen
+  RETURN collect(DISTINCT n) AS next
+}
+WITH seen + next AS seen, next AS frontier, found + [n IN next | {node: n, distance: %d}] AS found
+"""
+
+RELATED_END = """
+UNWIND found AS hit
+RETURN hit.node.pg_id AS id, hit.node.name AS name, hit.node.location AS location, hit.distance AS distance
+ORDER BY distance, id
+LIMIT $limit
+"""
+
+
+def related_groceries_query(depth):
+    return RELATED_START + ''.join(RELATED_STEP % distance for distance in range(1, depth + 1)) + RELATED_END
+
+
+def grocery_row(grocery, item_types=()):
+    """
+    The graph representation of a Grocery (with `responsible_person` loaded)
+    stocking the `item_types`.
+    """
+    person = grocery.responsible_person
+    supplier = None
+    if person is not None:
+        # Empty emails would collide on the unique index, store them as missing
+        supplier = {'id': person.pk, 'username': person.username, 'email': person.email or None}
+    return {
+        'id': grocery.pk, 'name': grocery.name, 'location': grocery.location,
+        'supplier': supplier, 'item_types': list(item_types),
+    }
+
+
+class Neo4jGraphBackend:
+    """
+    Writes through neomodel's connection (configured in core/settings.py).
+    """
+    def run(self, query, params):
+        from neomodel.sync_.core import db
+        with timed('bolt'):
+            return db.cypher_query(query, params)
+
+    def upsert_groceries(self, rows):
+        if rows:
+            self.run(UPSERT_GROCERIES, {'rows': rows})
+
+    def delete_groceries(self, ids):
+        if ids:
+            self.run(DELETE_GROCERIES, {'ids': list(ids)})
+
+    def rows(self, query, params):
+        results, columns = self.run(query, params)
+        return [dict(zip(columns, row)) for row in results]
+
+    def grocery_snapshot(self):
+        snapshot = {}
+        for row in self.rows(GROCERY_SNAPSHOT, {}):
+            suppliers = row.pop('suppliers')
+            # An impossible supplier makes an inconsistent node differ from any row
+            row['supplier'] = suppliers[0] if len(suppliers) == 1 else (None if not suppliers else {'id': None})
+            row['item_types'] = sorted(row['item_types'])
+            snapshot[row['id']] = row
+        return snapshot
+
+    def prune_orphans(self):
+        legacy = self.rows(PRUNE_LEGACY_GROCERIES, {})[0]['deleted']
+        return legacy + self.rows(PRUNE_UNLINKED_NODES, {})[0]['deleted']
+
+    def managed_groceries(self, supplier_id):
+        return self.rows(MANAGED_GROCERIES, {'supplier_id': supplier_id})
+
+    def suppliers_sharing_item_types(self, grocery_id):
+        rows = self.rows(SUPPLIERS_SHARING_ITEM_TYPES, {'grocery_id': grocery_id})
+        for row in rows:
+            row['item_types'] = sorted(row['item_types'])
+        return rows
+
+    def related_groceries(self, grocery_id, depth, limit=MAX_RELATED_RESULTS):
+        return self.rows(related_groceries_query(depth), {'grocery_id': grocery_id, 'limit': limit})
+
+
+class InMemoryGraphBackend:
+    """
+    A local stand-in for Neo4j with the same write semantics as the Cypher above.
+    """
+    def __init__(self):
+        self.groceries = {}
+        self.suppliers = {}
+        # pg_id of grocery -> pg_id of supplier (MANAGED_BY / MANAGES pair)
+        self.managed_by = {}
+        # pg_id of grocery -> names of the item types it STOCKS
+        self.stocks = {}
+        self.statements = 0
+
+    def upsert_groceries(self, rows):
+        if not rows:
+            return
+        self.statements += 1
+        for row in rows:
+            self.groceries[row['id']] = {'name': row['name'], 'location': row['location']}
+            self.stocks[row['id']] = set(row['item_types'])
+            supplier = row['supplier']
+            if supplier is None:
+                self.managed_by.pop(row['id'], None)
+                continue
+            self.suppliers[supplier['id']] = {'username': supplier['username'], 'email': supplier['email']}
+            self.managed_by[row['id']] = supplier['id']
+
+    def delete_groceries(self, ids):
+        if not ids:
+            return
+        self.statements += 1
+        for grocery_id in ids:
+            self.groceries.pop(grocery_id, None)
+            self.managed_by.pop(grocery_id, None)
+            self.stocks.pop(grocery_id, None)
+
+    def grocery_snapshot(self):
+        snapshot = {}
+        for grocery_id, grocery in self.groceries.items():
+            supplier_id = self.managed_by.get(grocery_id)
+            snapshot[grocery_id] = {
+                'id': grocery_id, **grocery,
+                'supplier': None if supplier_id is None else {'id': supplier_id, **self.suppliers[supplier_id]},
+                'item_types': sorted(self.stocks.get(grocery_id, ())),
+            }
+        return snapshot
+
+    def prune_orphans(self):
+        unlinked = set(self.suppliers) - set(self.managed_by.values())
+        for supplier_id in unlinked:
+            del self.suppliers[supplier_id]
+        return len(unlinked)
+
+    def _grocery(self, grocery_id):
+        return {'id': grocery_id, **self.groceries[grocery_id]}
+
+    def managed_groceries(self, supplier_id):
+        return [
+            self._grocery(grocery_id) for grocery_id, manager in sorted(self.managed_by.items())
+            if manager == supplier_id
+        ]
+
+    def suppliers_sharing_item_types(self, grocery_id):
+        types = self.stocks.get(grocery_id, set())
+        shared = {}
+        for other, other_types in self.stocks.items():
+            if other != grocery_id and other in self.managed_by and types & other_types:
+                shared.setdefault(self.managed_by[other], set()).update(types & other_types)
+        return [
+            {'id': supplier_id, 'username': self.suppliers[supplier_id]['username'], 'item_types': sorted(shared[supplier_id])}
+            for supplier_id in sorted(shared)
+        ]
+
+    def related_groceries(self, grocery_id, depth, limit=MAX_RELATED_RESULTS):
+        if grocery_id not in self.groceries:
+            return []
+        # Breadth-first over groceries; the neighbours of a grocery are the
+        # ones sharing its supplier or one of its item types
+        by_supplier, by_type = {}, {}
+        for other, supplier_id in self.managed_by.items():
+            by_supplier.setdefault(supplier_id, set()).add(other)
+        for other, types in self.stocks.items():
+            for name in types:
+                by_type.setdefault(name, set()).add(other)
+        distances = {grocery_id: 0}
+        queue = deque([grocery_id])
+        while queue:
+            current = queue.popleft()
+            if distances[current] == depth:
+                continue
+            neighbours = set(by_supplier.get(self.managed_by.get(current), ()))
+            for name in self.stocks.get(current, ()):
+                neighbours |= by_type[name]
+            for other in neighbours:
+                if other not in distances:
+                    distances[other] = distances[current] + 1
+                    queue.append(other)
+        del distances[grocery_id]
+        return [
+            {**self._grocery(other), 'distance': distance}
+            for other, distance in sorted(distances.items(), key=lambda pair: (pair[1], pair[0]))[:limit]
+        ]
+
+
+_backends = {}
+
+
+def get_graph_backend():
+    """
+    Returns the backend named by settings.GRAPH_BACKEND (one instance per process).
+    """
+    path = settings.GRAPH_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
+
+
+class GraphQueryCache:
+    """
+    In-process LRU cache of graph read results. Entries are tagged with the
+    graph version kept in the Django cache, so an applied outbox batch makes
+    every process drop its entries at once.
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, fetch):
+        version = get_cache_version('graph')
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                return entry[1]
+        result = fetch()
+        with self.lock:
+            self.entries[key] = (version, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_query_cache = GraphQueryCache(settings.GRAPH_QUERY_CACHE_SIZE)
+
+
+def query_graph(name, **params):
+    """
+    Runs the read `name` (e.g. 'managed_groceries') of the configured backend,
+    answering repeated reads from the in-process cache. The rows are shared
+    between callers and must not be modified.
+    """
+    backend = get_graph_backend()
+    key = (name, *sorted(params.items()))
+    return _query_cache.get(key, lambda: getattr(backend, name)(**params))
+
+
+def invalidate_graph_queries():
+    bump_cache_versions(('graph',))
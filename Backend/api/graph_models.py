@@ -1,14 +1,25 @@
-from neomodel.properties import StringProperty, UniqueIdProperty
+from neomodel.properties import IntegerProperty, StringProperty, UniqueIdProperty
 from neomodel.sync_.core import StructuredNode
 from neomodel.sync_.relationship_manager import RelationshipTo
 
+# Nodes are keyed by the Postgres primary key (pg_id) so renames update the
+# existing node instead of creating a new one. They are written by api.graph.
+
 class GroceryNode(StructuredNode):
     uid = UniqueIdProperty()
-    name = StringProperty(unique_index=True, required=True)
+    pg_id = IntegerProperty(unique_index=True)
+    name = StringProperty(index=True, required=True)
+    location = StringProperty()
     managed_by = RelationshipTo('SupplierNode', 'MANAGED_BY')
+    stocks = RelationshipTo('ItemTypeNode', 'STOCKS')
 
 class SupplierNode(StructuredNode):
     uid = UniqueIdProperty()
+    pg_id = IntegerProperty(unique_index=True)
     username = StringProperty(unique_index=True, required=True)
     email = StringProperty(unique_index=True)
-    manages = RelationshipTo('GroceryNode', 'MANAGES')
\ No newline at end of file
+    manages = RelationshipTo('GroceryNode', 'MANAGES')
+
+class ItemTypeNode(StructuredNode):
+    # Shared by every grocery with a live item of this type
+    name = StringProperty(unique_index=True, required=True)
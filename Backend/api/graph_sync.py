@@ -0,0 +1,68 @@
+"""
+Full reconciliation of the Neo4j mirror with Postgres.
+
+The outbox (api/outbox.py) keeps the graph current change by change; this
+module repairs whatever it missed: rows written before the outbox existed,
+outbox rows that ran out of attempts and nodes left by the old name-keyed
+sync. Groceries are read in primary-key chunks and compared with one snapshot
+of the graph; nodes are written with the same batched UNWIND upsert as the
+outbox, so running it again is harmless.
+"""
+from .graph import grocery_row, invalidate_graph_queries
+from .models import Grocery, Item
+
+
+def grocery_rows(groceries):
+    """
+    The graph rows of `groceries` (with `responsible_person` loaded), reading
+    their item types in one query.
+    """
+    groceries = list(groceries)
+    item_types = {}
+    stocked = Item.objects.filter(grocery_id__in=[grocery.pk for grocery in groceries])  # type: ignore
+    for grocery_id, item_type in stocked.values_list('grocery_id', 'item_type').distinct().order_by():
+        item_types.setdefault(grocery_id, []).append(item_type)
+    return [grocery_row(grocery, sorted(item_types.get(grocery.pk, ()))) for grocery in groceries]
+
+
+def sync_graph(backend, full=False, batch_size=1000, dry_run=False):
+    """
+    Makes `backend` match the live groceries. Incremental runs only write the
+    groceries whose node is missing or differs; `full` rewrites every one.
+    Returns the counts of the diff and of what was written.
+    """
+    snapshot = backend.grocery_snapshot()
+    report = {'groceries': 0, 'missing': 0, 'changed': 0, 'orphaned': 0, 'written': 0, 'pruned': 0}
+
+    last_pk = 0
+    while True:
+        chunk = list(
+            Grocery.objects.filter(pk__gt=last_pk).select_related('responsible_person').order_by('pk')[:batch_size]  # type: ignore
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        writes = []
+        for row in grocery_rows(chunk):
+            node = snapshot.pop(row['id'], None)
+            if node is None:
+                report['missing'] += 1
+            elif node != row:
+                report['changed'] += 1
+            elif not full:
+                continue
+            writes.append(row)
+        report['groceries'] += len(chunk)
+        if writes and not dry_run:
+            backend.upsert_groceries(writes)
+            report['written'] += len(writes)
+
+    # What is left in the snapshot has no live grocery
+    orphans = sorted(snapshot)
+    report['orphaned'] = len(orphans)
+    if not dry_run:
+        for start in range(0, len(orphans), batch_size):
+            backend.delete_groceries(orphans[start:start + batch_size])
+        report['pruned'] = backend.prune_orphans()
+        invalidate_graph_queries()
+    return report
@@ -0,0 +1,81 @@
+"""
+Idempotency-Key support for create endpoints.
+
+A client retrying a POST (a till whose request timed out, a flaky network)
+sends the same ``Idempotency-Key`` header again. The first request claims the
+key in the same transaction as the write and stores its response there; a
+retry gets that response back with ``Idempotent-Replayed: true`` instead of
+writing twice. A retry arriving while the first request is still running
+waits on the key's unique index until it commits or rolls back. Reusing a key
+for a different request is a 422.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_fingerprint(request):
+    """Hash of the method, path and parsed body a key was used with."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def purge_idempotency_keys(hours=None):
+    """Deletes the keys older than `hours` (IDEMPOTENCY_KEY_TTL_HOURS). Returns how many."""
+    hours = settings.IDEMPOTENCY_KEY_TTL_HOURS if hours is None else hours
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - timedelta(hours=hours)).delete() # type: ignore
+    return deleted
+
+
+class IdempotentCreateMixin:
+    """
+    Makes ``create`` honour the Idempotency-Key header. Only successful
+    responses are stored; a failed request releases its key.
+    """
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: [f'Expected 1 to {MAX_KEY_LENGTH} characters.']})
+
+        fingerprint = request_fingerprint(request)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create( # type: ignore
+                        user=request.user, key=key, fingerprint=fingerprint, status_code=0, response={},
+                    )
+            except IntegrityError:
+                record = None
+            if record is not None:
+                response = super().create(request, *args, **kwargs)
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+                return response
+        return self.replay_idempotent_response(request, key, fingerprint)
+
+    def replay_idempotent_response(self, request, key, fingerprint):
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key).first() # type: ignore
+        if stored is None:
+            # The first request rolled back in between; the client may retry
+            return Response({'detail': 'A request with this Idempotency-Key is in progress.'}, status=status.HTTP_409_CONFLICT)
+        if stored.fingerprint != fingerprint:
+            return Response(
+                {'detail': 'This Idempotency-Key was used for a different request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(stored.response, status=stored.status_code, headers={'Idempotent-Replayed': 'true'})
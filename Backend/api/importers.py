@@ -0,0 +1,156 @@
+"""
+Streaming imports of item catalogues and income history (CSV or NDJSON).
+
+Rows flow through generators (decode -> parse -> chunk), so memory stays flat
+whatever the file size. Each chunk is validated with the API serializers and
+written with bulk_create in one transaction together with its
+ImportCheckpoint, which makes an interrupted import resumable. Large uploads
+are spooled to storage and imported by a job (`run_spooled_import`).
+"""
+import csv
+import itertools
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import resolve_row_groceries, upsert_daily_incomes, validate_rows
+from .jobs import PermanentJobError
+from .models import DailyIncome, Grocery, ImportCheckpoint, Item
+from .serializers import DailyIncomeSerializer, ItemBulkSerializer
+from .signals import bulk_changed
+
+FORMATS = ('csv', 'ndjson')
+KINDS = {'items': ItemBulkSerializer, 'incomes': DailyIncomeSerializer}
+# Only the first errors are kept so a bad file cannot grow memory either
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_lines(stream):
+    """
+    Decodes a binary stream line by line, keeping line endings for the csv module.
+    """
+    first = True
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+def parse_rows(lines, fmt):
+    """
+    Yields one dict per record. Undecodable NDJSON lines are yielded as-is so
+    validation reports them against their row number.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(lines):
+            # Surplus cells end up under the None key; they are not columns
+            row.pop(None, None)
+            yield row
+        return
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def chunked(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_chunk(kind, rows, grocery=None):
+    """
+    Validates and writes one chunk. Invalid rows are skipped.
+    Returns (rows written, per-row error dicts).
+    """
+    groceries, errors = resolve_row_groceries(rows, grocery)
+    validated = validate_rows(KINDS[kind], rows, errors)
+    valid = [(row_grocery, attrs) for row_grocery, attrs, row_errors in zip(groceries, validated, errors) if not row_errors]
+
+    if kind == 'items':
+        Item.objects.bulk_create([Item(grocery=row_grocery, **attrs) for row_grocery, attrs in valid], batch_size=settings.BULK_BATCH_SIZE) # type: ignore
+        bulk_changed.send(sender=Item, keys={(row_grocery.pk, None) for row_grocery, _ in valid})
+        return len(valid), errors
+
+    # A later row for the same day replaces an earlier one, like re-running the import would
+    incomes = {}
+    for row_grocery, attrs in valid:
+        incomes[(row_grocery.pk, attrs['date'])] = DailyIncome(grocery=row_grocery, **attrs)
+    upsert_daily_incomes(list(incomes.values()))
+    return len(valid), errors
+
+
+def run_import(stream, kind, fmt, checkpoint_key, grocery=None, chunk_size=None):
+    """
+    Imports `stream`, resuming after the rows already recorded under `checkpoint_key`.
+    Returns a summary dict with the checkpoint counters and the first row errors.
+    """
+    if kind not in KINDS:
+        raise ValueError(f'Unknown import kind "{kind}".')
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown import format "{fmt}".')
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(key=checkpoint_key, defaults={'kind': kind}) # type: ignore
+    if checkpoint.kind != kind:
+        raise ValueError(f'Checkpoint "{checkpoint_key}" belongs to a {checkpoint.kind} import.')
+
+    reported = []
+    if checkpoint.completed_at is None:
+        rows = itertools.islice(parse_rows(iter_lines(stream), fmt), checkpoint.rows_done, None)
+        for chunk in chunked(rows, chunk_size):
+            with transaction.atomic():
+                written, errors = write_chunk(kind, chunk, grocery)
+                for index, row_errors in enumerate(errors):
+                    if row_errors and len(reported) < MAX_REPORTED_ERRORS:
+                        messages = {field: [str(message) for message in field_errors] for field, field_errors in row_errors.items()}
+                        reported.append({'row': checkpoint.rows_done + index + 1, 'errors': messages})
+                checkpoint.rows_done += len(chunk)
+                checkpoint.rows_written += written
+                checkpoint.rows_failed += len(chunk) - written
+                checkpoint.save(update_fields=['rows_done', 'rows_written', 'rows_failed', 'updated_at'])
+        checkpoint.completed_at = timezone.now()
+        checkpoint.save(update_fields=['completed_at', 'updated_at'])
+
+    return {
+        'checkpoint': checkpoint.key,
+        'rows_done': checkpoint.rows_done,
+        'rows_written': checkpoint.rows_written,
+        'rows_failed': checkpoint.rows_failed,
+        'errors': reported,
+    }
+
+
+def run_spooled_import(name, kind, fmt, checkpoint_key, grocery_id=None):
+    """
+    Imports the upload stored as `name` in default_storage and deletes it once
+    done. A retried job resumes from the checkpoint; a bad file fails for good.
+    """
+    grocery = None
+    if grocery_id is not None:
+        grocery = Grocery.objects.filter(pk=grocery_id).first() # type: ignore
+        if grocery is None:
+            default_storage.delete(name)
+            raise PermanentJobError(f'Grocery {grocery_id} no longer exists.')
+    try:
+        with default_storage.open(name, 'rb') as stream:
+            result = run_import(stream, kind, fmt, checkpoint_key, grocery)
+    except ValueError as exc:
+        default_storage.delete(name)
+        raise PermanentJobError(str(exc)) from exc
+    default_storage.delete(name)
+    return result
@@ -0,0 +1,159 @@
+"""
+Per-request timing and Prometheus-style metrics.
+
+RequestMetricsMiddleware opens a RequestTimings for every request. Code that
+wants its time reported wraps it in ``timed('<phase>')``: SQL is wrapped by
+``sql_wrapper`` on every database connection, Bolt calls by the graph
+backend, serialization by the serializers and permission checks by
+IsAdminOrIsOwner. Outside a request ``timed`` costs one context variable read.
+The timings live in a context variable, so queries an async view runs
+through sync_to_async threads are still counted for its request.
+
+The registry lives in process memory, so each worker process exposes its own
+series; Prometheus sums them per instance as usual.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('api_request_timings', default=None)
+
+PHASES = ('sql', 'bolt', 'serialize', 'permissions')
+# Seconds; roughly the default Prometheus client buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'durations', 'counts', 'depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        # Nested calls (a serializer inside a serializer) are only counted once
+        self.depth = dict.fromkeys(PHASES, 0)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    timings = _current.get()
+    if timings is None or timings.depth[phase]:
+        yield
+        return
+    timings.depth[phase] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[phase] += time.perf_counter() - started
+        timings.counts[phase] += 1
+        timings.depth[phase] -= 1
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook timing every query of the request."""
+    with timed('sql'):
+        return execute(sql, params, many, context)
+
+
+def install_sql_wrapper(connection):
+    # Connection objects outlive reconnects, install the hook only once
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+def server_timing(timings, total):
+    parts = [
+        f'{phase};dur={timings.durations[phase] * 1000:.1f};desc="{timings.counts[phase]}"'
+        for phase in PHASES if timings.counts[phase]
+    ]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(DURATION_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Request counters and duration histograms, keyed by (route, method)."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.histograms = {}
+
+    def observe(self, route, method, status, total, timings):
+        with self.lock:
+            key = (route, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for phase, value in (('total', total), *timings.durations.items()):
+                if phase != 'total' and not timings.counts[phase]:
+                    continue
+                histogram = self.histograms.get((route, method, phase))
+                if histogram is None:
+                    histogram = self.histograms[(route, method, phase)] = Histogram()
+                histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.histograms.clear()
+
+    def render(self, extra=()):
+        """
+        The Prometheus text exposition format (version 0.0.4). `extra` holds
+        (name, type, help, value) series; value may be a list of (labels, value).
+        """
+        lines = [
+            '# HELP api_requests_total Requests handled, by route, method and status.',
+            '# TYPE api_requests_total counter',
+        ]
+        with self.lock:
+            for (route, method, status), value in sorted(self.requests.items()):
+                lines.append(f'api_requests_total{{route="{route}",method="{method}",status="{status}"}} {value}')
+            lines += [
+                '# HELP api_request_duration_seconds Time per request and phase (total, sql, bolt, serialize, permissions).',
+                '# TYPE api_request_duration_seconds histogram',
+            ]
+            for (route, method, phase), histogram in sorted(self.histograms.items()):
+                labels = f'route="{route}",method="{method}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip((*DURATION_BUCKETS, '+Inf'), histogram.buckets):
+                    cumulative += count
+                    lines.append(f'api_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'api_request_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'api_request_duration_seconds_count{{{labels}}} {histogram.count}')
+        for name, kind, help_text, value in extra:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            if isinstance(value, list):
+                lines += [f'{name}{{{labels}}} {sample}' for labels, sample in value]
+            else:
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
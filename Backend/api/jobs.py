@@ -0,0 +1,153 @@
+"""
+Database-backed job queue for work that should not run in a request.
+
+``enqueue(name, payload)`` inserts a Job row in the caller's transaction, so
+a job exists exactly when the change that needs it commits. Workers started
+by `manage.py run_workers --concurrency N` claim due jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED``, highest priority first, and run the
+function registered under the job's name with ``@job``. Failures are retried
+with exponential backoff until `max_attempts`, except a payload that does
+not fit the function's arguments or a PermanentJobError, which fail at once; a job left running by a
+worker that died is queued again after JOB_STALE_SECONDS, so job functions
+must be safe to run twice. Postgres is the only moving part: no broker.
+"""
+import inspect
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job functions by name, filled by @job (see api/tasks.py)
+JOBS = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a job function for a failure that retrying cannot fix."""
+
+
+def job(name):
+    """Registers the decorated function to run jobs called `name`."""
+    def register(func):
+        JOBS[name] = func
+        return func
+    return register
+
+
+def check_payload(name, payload):
+    """Raises ValueError unless `payload` binds to the arguments of job `name`."""
+    try:
+        inspect.signature(JOBS[name]).bind(**payload)
+    except TypeError as exc:
+        raise ValueError(f'Invalid payload for job {name!r}: {exc}.') from exc
+
+
+def enqueue(name, payload=None, priority=0, max_attempts=5, user=None, delay=0):
+    """
+    Queues `name` to run with `payload` as keyword arguments after `delay`
+    seconds. Call inside the transaction of the change that needs it.
+    """
+    if name not in JOBS:
+        raise ValueError(f'Unknown job {name!r}.')
+    payload = payload or {}
+    check_payload(name, payload)
+    return Job.objects.create( # type: ignore
+        name=name, payload=payload, priority=priority, max_attempts=max_attempts,
+        created_by=user, available_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim_job():
+    """Marks the next due job running and returns it, None when nothing is due."""
+    now = timezone.now()
+    with transaction.atomic():
+        # SKIP LOCKED: concurrent workers each take a different row instead of waiting
+        claimed = (
+            Job.objects.select_for_update(skip_locked=True) # type: ignore
+            .filter(status=Job.QUEUED, available_at__lte=now)
+            .order_by('-priority', 'available_at', 'id')
+            .first()
+        )
+        if claimed is None:
+            return None
+        claimed.status = Job.RUNNING
+        claimed.attempts += 1
+        claimed.started_at = now
+        claimed.save(update_fields=['status', 'attempts', 'started_at', 'updated_at'])
+    return claimed
+
+
+def run_job(claimed):
+    """Runs a claimed job and records its result, retry or failure."""
+    func = JOBS.get(claimed.name)
+    retry = True
+    try:
+        if func is None:
+            raise LookupError(f'No function is registered for job {claimed.name!r}.')
+        try:
+            inspect.signature(func).bind(**claimed.payload)
+        except TypeError:
+            # Bad arguments fail the same way on every attempt
+            retry = False
+            raise
+        result = func(**claimed.payload)
+    except Exception as exc:
+        logger.warning("Job %s (%s) failed on attempt %d: %s", claimed.pk, claimed.name, claimed.attempts, exc)
+        claimed.last_error = f'{type(exc).__name__}: {exc}'
+        if retry and not isinstance(exc, PermanentJobError) and claimed.attempts < claimed.max_attempts:
+            claimed.status = Job.QUEUED
+            claimed.available_at = timezone.now() + timedelta(
+                seconds=min(2 ** claimed.attempts, settings.JOB_MAX_BACKOFF_SECONDS)
+            )
+        else:
+            claimed.status = Job.FAILED
+            claimed.finished_at = timezone.now()
+    else:
+        claimed.status = Job.SUCCEEDED
+        claimed.result = result
+        claimed.last_error = ''
+        claimed.finished_at = timezone.now()
+    claimed.save(update_fields=['status', 'result', 'last_error', 'available_at', 'finished_at', 'updated_at'])
+    return claimed
+
+
+def requeue_stale_jobs():
+    """
+    Puts back the jobs left running longer than JOB_STALE_SECONDS (their
+    worker was killed), or fails them when out of attempts. Returns how many.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=now - timedelta(seconds=settings.JOB_STALE_SECONDS)) # type: ignore
+    error = 'Worker stopped while running the job.'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(status=Job.FAILED, last_error=error, finished_at=now, updated_at=now)
+    queued = stale.update(status=Job.QUEUED, last_error=error, available_at=now, updated_at=now)
+    return failed + queued
+
+
+def work(stop=None, burst=False, interval=None):
+    """
+    Runs jobs until `stop` (an Event) is set or, with `burst`, until none is
+    due. Returns the number of jobs run.
+    """
+    interval = settings.JOB_POLL_INTERVAL if interval is None else interval
+    ran = 0
+    while stop is None or not stop.is_set():
+        claimed = claim_job()
+        if claimed is None:
+            requeue_stale_jobs()
+            if burst:
+                return ran
+            if stop is not None:
+                stop.wait(interval)
+            continue
+        run_job(claimed)
+        ran += 1
+        # Like the end of a request: drop broken or expired connections
+        close_old_connections()
+    return ran
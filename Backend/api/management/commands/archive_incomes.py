@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archive_deleted_incomes
+
+
+class Command(BaseCommand):
+    help = 'Moves soft-deleted daily incomes into the ArchivedDailyIncome table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Only archive rows deleted at least this many days ago.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        deleted_before = timezone.now() - timedelta(days=options['days'])
+        moved = archive_deleted_incomes(deleted_before, options['batch_size'])
+        self.stdout.write(f'Archived {moved} incomes.')
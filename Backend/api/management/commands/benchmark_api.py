@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import (
+    benchmark_cascade, compare_connection_modes, compare_fast_path, compare_to_baseline, load_baseline, run_benchmarks, save_baseline,
+)
+
+COLUMNS = ('scenario', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries', 'peak_memory_kb')
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every API route in-process and reports latency percentiles, throughput, '
+        'queries per request and peak memory. Write scenarios add rows: run it against seeded data '
+        '(manage.py seed_data), not production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Concurrent clients (threads).')
+        parser.add_argument('--scenario', action='append', help='Only run this scenario (repeatable).')
+        parser.add_argument('--cold', action='store_true', help='Expire cached responses before every request.')
+        parser.add_argument('--baseline', help='JSON file of a previous run to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline (0.2 = 20%%).')
+        parser.add_argument('--save', help='Write the results to this JSON file, e.g. as the new baseline.')
+        parser.add_argument(
+            '--fast-path', action='store_true',
+            help='Instead, compare the list endpoints with the fast read path off and on (500-row pages).',
+        )
+        parser.add_argument(
+            '--connection-modes', action='store_true',
+            help='Instead, compare one scenario (item-detail, or the first --scenario) with a connection per request, '
+                 'persistent connections and a connection pool, using --requests and --concurrency.',
+        )
+        parser.add_argument(
+            '--cascade-items', type=int, metavar='N',
+            help='Instead, time the cascading soft-delete and restore of a grocery seeded with N items (e.g. 1000000).',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options['fast_path']:
+                results = compare_fast_path(requests=options['requests'])
+                self.write_table(list(results[0]), results)
+                return
+            if options['cascade_items']:
+                results = benchmark_cascade(options['cascade_items'])
+                self.write_table(list(results[0]), results)
+                return
+            if options['connection_modes']:
+                scenario = (options['scenario'] or ['item-detail'])[0]
+                results = compare_connection_modes(None, options['requests'], options['concurrency'], scenario)
+                self.write_table(list(results[0]), results)
+                return
+            results = run_benchmarks(options['requests'], options['concurrency'], options['scenario'], options['cold'])
+        except LookupError as exc:
+            raise CommandError(str(exc))
+        self.write_table(COLUMNS, results)
+
+        if options['save']:
+            save_baseline(options['save'], results)
+        if options['baseline']:
+            regressions = compare_to_baseline(results, load_baseline(options['baseline']), options['tolerance'])
+            for message in regressions:
+                self.stderr.write(f'REGRESSION {message}')
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def write_table(self, columns, rows):
+        widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+        self.stdout.write('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+        for row in rows:
+            self.stdout.write('  '.join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.graph import get_graph_backend
+from api.graph_sync import sync_graph
+
+
+class Command(BaseCommand):
+    help = 'Reconciles the Neo4j graph with Postgres: upserts missing or stale groceries and deletes orphaned nodes.'
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--incremental', action='store_true', help='Only write groceries whose node differs (default).')
+        mode.add_argument('--full', action='store_true', help='Rewrite every grocery node.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Groceries per query and per UNWIND statement.')
+        parser.add_argument('--dry-run', action='store_true', help='Report the differences without writing.')
+
+    def handle(self, *args, **options):
+        report = sync_graph(get_graph_backend(), options['full'], options['batch_size'], options['dry_run'])
+        self.stdout.write(
+            f'{report["groceries"]} groceries checked: {report["missing"]} missing, {report["changed"]} changed, '
+            f'{report["orphaned"]} orphaned nodes.'
+        )
+        if not options['dry_run']:
+            self.stdout.write(f'{report["written"]} groceries written, {report["pruned"]} unlinked nodes pruned.')
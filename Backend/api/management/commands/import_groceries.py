@@ -0,0 +1,53 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importers import FORMATS, KINDS, run_import
+from api.models import Grocery, ImportCheckpoint
+
+
+class Command(BaseCommand):
+    help = 'Streams a CSV/NDJSON file of items or daily incomes into the database, resuming from its checkpoint.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, or - for stdin.')
+        parser.add_argument('--kind', choices=sorted(KINDS), required=True)
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--grocery', type=int, help='Import every row into this grocery instead of the "grocery" column.')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction (defaults to IMPORT_CHUNK_SIZE).')
+        parser.add_argument('--checkpoint', help='Checkpoint key. Defaults to one derived from the kind and path.')
+        parser.add_argument('--restart', action='store_true', help='Discard the checkpoint and import from the first row.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError('Cannot tell the format from the file name, pass --format.')
+
+        grocery = None
+        if options['grocery'] is not None:
+            try:
+                grocery = Grocery.objects.get(pk=options['grocery']) # type: ignore
+            except Grocery.DoesNotExist: # type: ignore
+                raise CommandError(f'Grocery {options["grocery"]} does not exist.')
+
+        key = options['checkpoint'] or f'command:{options["kind"]}:{os.path.abspath(path)}'
+        if options['restart']:
+            ImportCheckpoint.objects.filter(key=key).delete() # type: ignore
+
+        try:
+            if path == '-':
+                result = run_import(sys.stdin.buffer, options['kind'], fmt, key, grocery, options['chunk_size'])
+            else:
+                with open(path, 'rb') as stream:
+                    result = run_import(stream, options['kind'], fmt, key, grocery, options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stderr.write(f'Row {error["row"]}: {error["errors"]}')
+        self.stdout.write(
+            f'{result["rows_done"]} rows read, {result["rows_written"]} written, '
+            f'{result["rows_failed"]} rejected (checkpoint "{result["checkpoint"]}").'
+        )
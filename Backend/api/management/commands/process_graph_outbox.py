@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.graph import get_graph_backend
+from api.outbox import drain_outbox, retry_dead_rows
+
+
+class Command(BaseCommand):
+    help = 'Applies pending GraphOutbox rows to Neo4j in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the outbox is empty.')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep between polls with --loop.')
+        parser.add_argument('--retry-dead', action='store_true', help='Reset the attempts of rows that ran out of retries first.')
+
+    def handle(self, *args, **options):
+        backend = get_graph_backend()
+        if options['retry_dead']:
+            self.stdout.write(f'Requeued {retry_dead_rows()} dead outbox rows.')
+        while True:
+            processed = drain_outbox(backend, options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} outbox rows.')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Deletes stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL_HOURS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys(options['hours'])
+        self.stdout.write(f'Purged {deleted} idempotency keys.')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import rebuild_income_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the IncomeRollup table from DailyIncome.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grocery', type=int, action='append', help='Only rebuild this grocery (repeatable).')
+
+    def handle(self, *args, **options):
+        created = rebuild_income_rollups(options['grocery'])
+        self.stdout.write(f'Wrote {created} rollup rows.')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.stats import reconcile_grocery_stats
+
+
+class Command(BaseCommand):
+    help = 'Recounts the GroceryStats of every grocery and repairs the rows that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report the missing and drifted rows.')
+
+    def handle(self, *args, **options):
+        report = reconcile_grocery_stats(options['batch_size'], options['dry_run'])
+        self.stdout.write(
+            f"Checked {report['groceries']} groceries: {report['missing']} missing, {report['drifted']} drifted"
+            + (' (dry run).' if options['dry_run'] else ', repaired.')
+        )
@@ -0,0 +1,74 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_main(stop, burst, interval):
+    """Entry point of a worker process (spawned, so Django is set up again)."""
+    import django
+    django.setup()
+    from api.jobs import work
+
+    # The parent handles Ctrl+C and SIGTERM and tells the workers through `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    work(stop, burst, interval)
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY, help='Worker processes.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due instead of polling.')
+        parser.add_argument('--interval', type=float, default=settings.JOB_POLL_INTERVAL, help='Seconds between polls when idle.')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] <= 1:
+            from api.jobs import work
+            stop = None if options['burst'] else self.stop_event(threading.Event)
+            ran = work(stop, options['burst'], options['interval'])
+            self.stdout.write(f'Ran {ran} jobs.')
+            return
+
+        context = multiprocessing.get_context('spawn')
+        stop = self.stop_event(context.Event)
+        # Children open their own connections
+        connections.close_all()
+        processes = []
+        for _ in range(options['concurrency']):
+            process = context.Process(target=_worker_main, args=(stop, options['burst'], options['interval']), daemon=True)
+            process.start()
+            processes.append(process)
+        self.stdout.write(f"Started {len(processes)} workers.")
+
+        while processes:
+            for index, process in enumerate(processes):
+                process.join(timeout=1)
+                if process.is_alive():
+                    continue
+                if stop.is_set() or options['burst']:
+                    processes[index] = None
+                    continue
+                # A worker that crashed is replaced; its job is requeued once stale
+                self.stderr.write(f'Worker {process.pid} exited with {process.exitcode}, restarting it.')
+                processes[index] = context.Process(
+                    target=_worker_main, args=(stop, options['burst'], options['interval']), daemon=True,
+                )
+                processes[index].start()
+            processes = [process for process in processes if process is not None]
+        self.stdout.write('Workers stopped.')
+
+    def stop_event(self, factory):
+        stop = factory()
+
+        def request_stop(signum, frame):
+            # Running jobs finish first
+            stop.set()
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+        return stop
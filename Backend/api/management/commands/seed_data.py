@@ -0,0 +1,99 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.analytics import rebuild_income_rollups
+from api.caching import invalidate_model
+from api.models import DailyIncome, Grocery, Item, User
+from api.outbox import enqueue_grocery_sync
+from api.stats import refresh_grocery_stats
+
+ITEM_TYPES = ('Dairy', 'Bakery', 'Produce', 'Meat', 'Frozen', 'Beverages', 'Snacks', 'Household')
+ITEM_NAMES = ('Milk', 'Bread', 'Apples', 'Chicken', 'Peas', 'Juice', 'Chips', 'Soap', 'Rice', 'Cheese', 'Eggs', 'Coffee')
+CITIES = ('Jeddah', 'Riyadh', 'Dammam', 'Mecca', 'Medina', 'Taif', 'Abha', 'Tabuk')
+
+
+class Command(BaseCommand):
+    help = 'Seeds synthetic suppliers, groceries, items and daily incomes for load tests and benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groceries', type=int, default=100, help='Groceries to create, each with its own supplier.')
+        parser.add_argument('--items', type=int, default=200, help='Items per grocery.')
+        parser.add_argument('--years', type=float, default=2, help='Years of daily incomes per grocery, up to today.')
+        parser.add_argument('--password', default='supplierpass', help='Password of every seeded supplier.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix of the seeded suppliers.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible datasets.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = settings.BULK_BATCH_SIZE
+        prefix = options['prefix']
+        start = User.objects.filter(username__startswith=f'{prefix}-supplier-').count()  # type: ignore
+        count = options['groceries']
+
+        # Hashing is deliberately slow, so every supplier shares one hash
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([  # type: ignore
+            User(username=f'{prefix}-supplier-{n}', email=f'{prefix}-supplier-{n}@example.com', password=password)
+            for n in range(start, start + count)
+        ], batch_size=batch_size)
+        group, _ = Group.objects.get_or_create(name='Suppliers')
+        group.user_set.add(*users)
+
+        groceries = Grocery.objects.bulk_create([  # type: ignore
+            Grocery(name=f'{rng.choice(CITIES)} Branch {n}', location=rng.choice(CITIES), responsible_person=user)
+            for n, user in enumerate(users, start)
+        ], batch_size=batch_size)
+        self.stdout.write(f'Created {len(users)} suppliers and {len(groceries)} groceries.')
+
+        items = self.write_batches(Item, (
+            Item(
+                name=f'{rng.choice(ITEM_NAMES)} {n}',
+                item_type=rng.choice(ITEM_TYPES),
+                location_in_grocery=f'{rng.choice("ABCDEFG")}{rng.randint(1, 20)}',
+                price=Decimal(rng.randint(50, 50000)) / 100,
+                grocery=grocery,
+            )
+            for grocery in groceries for n in range(options['items'])
+        ), batch_size)
+        self.stdout.write(f'Created {items} items.')
+
+        today = timezone.localdate()
+        days = int(options['years'] * 365)
+        incomes = self.write_batches(DailyIncome, (
+            DailyIncome(grocery=grocery, date=today - timedelta(days=day), amount=Decimal(rng.randint(10000, 2000000)) / 100)
+            for grocery in groceries for day in range(days)
+        ), batch_size)
+        self.stdout.write(f'Created {incomes} daily incomes.')
+
+        # bulk_create skips the signals, so bring the derived data up to date once
+        grocery_ids = [grocery.pk for grocery in groceries]
+        rebuild_income_rollups(grocery_ids)
+        for start in range(0, len(grocery_ids), batch_size):
+            refresh_grocery_stats(grocery_ids[start:start + batch_size])
+        enqueue_grocery_sync(grocery_ids)
+        for model in (Grocery, Item, DailyIncome):
+            invalidate_model(model)
+
+    def write_batches(self, model, instances, batch_size):
+        """bulk_create from a generator, one transaction per batch so memory stays flat."""
+        written = 0
+        batch = []
+        for instance in instances:
+            batch.append(instance)
+            if len(batch) >= batch_size:
+                written += self.flush(model, batch)
+                batch = []
+        return written + self.flush(model, batch)
+
+    def flush(self, model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        return len(batch)
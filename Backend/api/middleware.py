@@ -0,0 +1,115 @@
+import json
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+from .database import replica_pin_key, replica_reads
+from .instrumentation import end_request, registry, server_timing, start_request
+
+logger = logging.getLogger('api.requests')
+
+
+class RequestMetricsMiddleware:
+    """
+    Times every request, split into SQL, Bolt, serialization and permission
+    checks. Adds a Server-Timing header, feeds the /metrics histograms and
+    logs one JSON line per request on the `api.requests` logger.
+    Streaming bodies are produced after the response leaves, so only the
+    time to the first byte is recorded for them.
+    Runs natively under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = start_request()
+        try:
+            response = self.get_response(request)
+            total = timings.elapsed()
+        finally:
+            end_request(token)
+        return self.record(request, response, timings, total)
+
+    async def __acall__(self, request):
+        timings, token = start_request()
+        try:
+            response = await self.get_response(request)
+            total = timings.elapsed()
+        finally:
+            end_request(token)
+        return self.record(request, response, timings, total)
+
+    def record(self, request, response, timings, total):
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else 'unmatched'
+        registry.observe(route, request.method, response.status_code, total, timings)
+        response['Server-Timing'] = server_timing(timings, total)
+
+        if logger.isEnabledFor(logging.INFO):
+            record = {
+                'route': route,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 2),
+            }
+            for phase, value in timings.durations.items():
+                if timings.counts[phase]:
+                    record[f'{phase}_ms'] = round(value * 1000, 2)
+                    record[f'{phase}_count'] = timings.counts[phase]
+            logger.info(json.dumps(record))
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Reads of safe requests go to the read replicas (api/database.py), unless
+    the client wrote in the last REPLICA_PIN_SECONDS. Does nothing without
+    replicas configured.
+    """
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        pin = replica_pin_key(request)
+        if request.method not in self.safe_methods:
+            response = self.get_response(request)
+            if pin and response.status_code < 400:
+                cache.set(pin, True, settings.REPLICA_PIN_SECONDS)
+            return response
+        with replica_reads(not (pin and cache.get(pin))):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        pin = replica_pin_key(request)
+        if request.method not in self.safe_methods:
+            response = await self.get_response(request)
+            if pin and response.status_code < 400:
+                await cache.aset(pin, True, settings.REPLICA_PIN_SECONDS)
+            return response
+        pinned = pin and await cache.aget(pin)
+        with replica_reads(not pinned):
+            return await self.get_response(request)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_dailyincome_is_deleted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GraphOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grocery_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['available_at', 'id'], name='graph_outbox_pending_idx')],
+            },
+        ),
+    ]
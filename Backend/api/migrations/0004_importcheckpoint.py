@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_graph_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('kind', models.CharField(max_length=20)),
+                ('rows_done', models.PositiveBigIntegerField(default=0)),
+                ('rows_written', models.PositiveBigIntegerField(default=0)),
+                ('rows_failed', models.PositiveBigIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncomeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month'), ('year', 'Year')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('days', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('grocery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='income_rollups', to='api.grocery')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'period_start'], name='income_rollup_period_idx')],
+                'constraints': [models.UniqueConstraint(fields=('grocery', 'period', 'period_start'), name='unique_income_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_incomerollup'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailyincome',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='grocery',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['responsible_person'], name='grocery_live_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['grocery', 'item_type'], name='item_live_grocery_type_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyincome',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_deleted', False)), fields=('grocery', 'date'), name='unique_live_income_per_day'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_soft_delete_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedDailyIncome',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('date', models.DateField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('grocery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_incomes', to='api.grocery')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Must match api.filters.FullTextMatch, otherwise PostgreSQL ignores the index
+CREATE_INDEX = """
+CREATE INDEX IF NOT EXISTS item_search_idx ON api_item
+USING gin (to_tsvector('simple'::regconfig, name || ' ' || item_type || ' ' || location_in_grocery))
+WHERE NOT is_deleted
+"""
+DROP_INDEX = 'DROP INDEX IF EXISTS item_search_idx'
+
+
+def create_search_index(apps, schema_editor):
+    # GIN and tsvector are PostgreSQL-only; other databases fall back to LIKE
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_soft_delete_managers_income_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
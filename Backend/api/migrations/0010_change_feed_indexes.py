@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyincome',
+            index=models.Index(fields=['updated_at', 'id'], name='dailyincome_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grocery',
+            index=models.Index(fields=['updated_at', 'id'], name='grocery_changes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['updated_at', 'id'], name='item_changes_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 19:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_change_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroceryStats',
+            fields=[
+                ('grocery', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.grocery')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('catalogue_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('income_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('last_income_date', models.DateField(blank=True, null=True)),
+                ('last_income_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+def fill_period_index(apps, schema_editor):
+    from api.analytics import period_index
+    IncomeRollup = apps.get_model('api', 'IncomeRollup')
+    batch = []
+    for rollup in IncomeRollup.objects.only('period', 'period_start').iterator(chunk_size=5000):
+        rollup.period_index = period_index(rollup.period, rollup.period_start)
+        batch.append(rollup)
+        if len(batch) >= 5000:
+            IncomeRollup.objects.bulk_update(batch, ['period_index'])
+            batch = []
+    IncomeRollup.objects.bulk_update(batch, ['period_index'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incomerollup',
+            name='period_index',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_period_index, migrations.RunPython.noop),
+    ]
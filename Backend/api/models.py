@@ -2,14 +2,53 @@ from typing import Literal
 
 
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 
 class User(AbstractUser):
 
     pass
 
-class Grocery(models.Model):
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Marks every row deleted in one UPDATE. Like update(), this sends no
+        post_save signals; callers owning derived data send bulk_changed.
+        """
+        return self.update(is_deleted=True, updated_at=timezone.now())
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Only returns rows that are not soft-deleted."""
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+class SoftDeleteModel(models.Model):
+    """
+    `objects` hides soft-deleted rows, `all_objects` includes them. Subclasses
+    declare `is_deleted` and `updated_at`.
+    """
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # post_save receivers write derived rows (graph outbox, rollups, stats); keep them in one transaction
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
+    def soft_delete(self):
+        # A regular save, so post_save receivers (graph sync, rollups) still run
+        self.is_deleted = True
+        self.save(update_fields=['is_deleted', 'updated_at'])
+
+class Grocery(SoftDeleteModel):
     name = models.CharField(max_length=255)
     location = models.CharField(max_length=255)
     responsible_person = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='managed_groceries')
@@ -17,10 +56,31 @@ class Grocery(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)  # type: ignore
 
+    class Meta:
+        indexes = [
+            # Supplier scoping (responsible_person = user AND NOT is_deleted)
+            models.Index(fields=['responsible_person'], condition=models.Q(is_deleted=False), name='grocery_live_owner_idx'),
+            # Change feed (api/changes.py), deleted rows included
+            models.Index(fields=['updated_at', 'id'], name='grocery_changes_idx'),
+        ]
+
     def __str__(self) -> str:
         return str(self.name)
 
-class Item(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # A reassigned grocery also leaves its previous owner's cached scope stale
+        instance._loaded_owner = instance.__dict__.get('responsible_person_id')
+        return instance
+
+    def soft_delete(self):
+        # Also hides the branch's items and incomes, see api/cascade.py
+        from .cascade import soft_delete_groceries
+        soft_delete_groceries([self.pk])
+        self.is_deleted = True
+
+class Item(SoftDeleteModel):
     name = models.CharField(max_length=255)
     item_type = models.CharField(max_length=100)
     location_in_grocery = models.CharField(max_length=255, verbose_name="Item Location")
@@ -30,10 +90,26 @@ class Item(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_deleted = models.BooleanField(default=False)  # type: ignore
 
+    class Meta:
+        indexes = [
+            # Live items of a grocery, optionally by type (nested lists, counts, filters)
+            models.Index(fields=['grocery', 'item_type'], condition=models.Q(is_deleted=False), name='item_live_grocery_type_idx'),
+            models.Index(fields=['updated_at', 'id'], name='item_changes_idx'),
+        ]
+
     def __str__(self) -> str:
         return f"{self.name} in {self.grocery.name}"
 
-class DailyIncome(models.Model):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The graph stores the item types per grocery, remember the stored pair
+        instance._loaded_stock = (instance.__dict__.get('grocery_id'), instance.__dict__.get('item_type'))
+        # And the columns GroceryStats counts, applied as deltas on save
+        instance._loaded_stats = tuple(instance.__dict__.get(name) for name in ('grocery_id', 'price', 'is_deleted'))
+        return instance
+
+class DailyIncome(SoftDeleteModel):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     date = models.DateField()
     grocery = models.ForeignKey(Grocery, on_delete=models.CASCADE, related_name='incomes')
@@ -42,7 +118,182 @@ class DailyIncome(models.Model):
     is_deleted = models.BooleanField(default=False)  # type: ignore
 
     class Meta:
-        unique_together = ('grocery', 'date')
+        constraints = [
+            # Only one live income per day; soft-deleted days can be entered again.
+            # Its index also serves the live (grocery_id, date) lookups and ordering.
+            models.UniqueConstraint(fields=['grocery', 'date'], condition=models.Q(is_deleted=False), name='unique_live_income_per_day'),
+        ]
+        indexes = [models.Index(fields=['updated_at', 'id'], name='dailyincome_changes_idx')]
+
+    def __str__(self) -> str:
+        return f"Income for {self.grocery.name} on {self.date}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored (grocery, date) so a moved row also refreshes its old rollups
+        instance._loaded_key = (instance.__dict__.get('grocery_id'), instance.__dict__.get('date'))
+        # And the columns GroceryStats counts, applied as deltas on save
+        instance._loaded_stats = tuple(instance.__dict__.get(name) for name in ('grocery_id', 'date', 'amount', 'is_deleted'))
+        return instance
+
+
+class ArchivedDailyIncome(models.Model):
+    """
+    Soft-deleted DailyIncome rows moved out of the live table by
+    `manage.py archive_incomes`. Rows keep their original id.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    date = models.DateField()
+    grocery = models.ForeignKey(Grocery, on_delete=models.CASCADE, related_name='archived_incomes')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f"Archived income for grocery {self.grocery_id} on {self.date}"
+
+
+class GroceryStats(models.Model):
+    """
+    Counters of a grocery's live items and incomes for the grocery list,
+    refreshed on every write by api.stats.refresh_grocery_stats and repaired
+    by `manage.py reconcile_grocery_stats`.
+    """
+    grocery = models.OneToOneField(Grocery, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    item_count = models.PositiveIntegerField(default=0)  # type: ignore
+    # Sum of the live item prices
+    catalogue_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    income_count = models.PositiveIntegerField(default=0)  # type: ignore
+    income_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    last_income_date = models.DateField(null=True, blank=True)
+    last_income_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Stats of grocery {self.grocery_id}"
+
+
+class IncomeRollup(models.Model):
+    """
+    DailyIncome totals per grocery and week/month/year, kept up to date by
+    api.analytics.refresh_income_rollups whenever incomes change.
+    """
+    PERIOD_CHOICES = [('week', 'Week'), ('month', 'Month'), ('year', 'Year')]
+
+    grocery = models.ForeignKey(Grocery, on_delete=models.CASCADE, related_name='income_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    # Consecutive periods have consecutive indexes (see api.analytics.period_index)
+    period_index = models.IntegerField()
+    total = models.DecimalField(max_digits=16, decimal_places=2)
+    days = models.PositiveIntegerField()  # type: ignore
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['grocery', 'period', 'period_start'], name='unique_income_rollup'),
+        ]
+        indexes = [models.Index(fields=['period', 'period_start'], name='income_rollup_period_idx')]
+
+    def __str__(self) -> str:
+        return f"{self.period} of {self.period_start} for grocery {self.grocery_id}"
+
+class GraphOutbox(models.Model):
+    """
+    A Grocery whose graph node is out of date. Rows are written in the same
+    transaction as the change and drained by `manage.py process_graph_outbox`,
+    which reads the grocery's current state, so replaying a row is harmless.
+    """
+    # Not a ForeignKey: hard-deleted groceries must still reach the graph
+    grocery_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)  # type: ignore
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['available_at', 'id'], name='graph_outbox_pending_idx')]
+
+    def __str__(self) -> str:
+        return f"Graph sync for grocery {self.grocery_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a streaming import (see api/importers.py). `rows_done` is
+    committed together with each chunk, so a restarted import skips exactly
+    the rows that were already written.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    kind = models.CharField(max_length=20)
+    rows_done = models.PositiveBigIntegerField(default=0)  # type: ignore
+    rows_written = models.PositiveBigIntegerField(default=0)  # type: ignore
+    rows_failed = models.PositiveBigIntegerField(default=0)  # type: ignore
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"Import {self.key} ({self.rows_done} rows)"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response of a create sent with an ``Idempotency-Key`` header
+    (see api/idempotency.py). A retry with the same key gets it back instead of
+    writing again. Purged after IDEMPOTENCY_KEY_TTL by `manage.py purge_idempotency_keys`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()  # type: ignore
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        indexes = [models.Index(fields=['created_at'], name='idempotency_key_created_idx')]
+
+    def __str__(self) -> str:
+        return f"Idempotency key {self.key} of user {self.user_id}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work in the database job queue (see api/jobs.py),
+    run by `manage.py run_workers`. `name` selects the function registered
+    with ``@job`` and `payload` holds its keyword arguments.
+    """
+    QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)  # type: ignore
+    attempts = models.PositiveIntegerField(default=0)  # type: ignore
+    max_attempts = models.PositiveIntegerField(default=5)  # type: ignore
+    available_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Dequeue order of the waiting jobs; finished ones stay out of the index
+            models.Index(fields=['-priority', 'available_at', 'id'], condition=models.Q(status='queued'), name='job_queued_idx'),
+            models.Index(fields=['started_at'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
 
     def __str__(self) -> str:
-        return f"Income for {self.grocery.name} on {self.date}"
\ No newline at end of file
+        return f"Job {self.pk} {self.name} ({self.status})"
@@ -0,0 +1,100 @@
+"""
+Transactional outbox for the Neo4j mirror.
+
+Writes only record *which* grocery changed. The worker (`manage.py
+process_graph_outbox`) reloads those groceries, so updates, renames and
+soft-deletes all reduce to "make the node match Postgres".
+
+Rows that fail MAX_ATTEMPTS times are dead: the worker skips them, logs an
+error when they die and /metrics counts them. `process_graph_outbox
+--retry-dead` puts them back in the queue once Neo4j is healthy again.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .graph import invalidate_graph_queries
+from .graph_sync import grocery_rows
+from .models import Grocery, GraphOutbox
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 10
+MAX_BACKOFF_SECONDS = 300
+
+
+def enqueue_grocery_sync(grocery_ids):
+    """
+    Records that the given groceries must be re-synced. Call inside the
+    transaction that changes them.
+    """
+    GraphOutbox.objects.bulk_create([GraphOutbox(grocery_id=pk) for pk in set(grocery_ids)])  # type: ignore
+
+
+def process_outbox_batch(backend, batch_size=500):
+    """
+    Applies one batch of pending outbox rows to `backend`.
+    Returns the number of outbox rows consumed (0 when nothing is due).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # SKIP LOCKED lets several workers drain the table side by side
+        events = list(
+            GraphOutbox.objects.select_for_update(skip_locked=True)  # type: ignore
+            .filter(available_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        grocery_ids = {event.grocery_id for event in events}
+        groceries = Grocery.objects.filter(pk__in=grocery_ids).select_related('responsible_person')  # type: ignore
+        upserts = grocery_rows(groceries)
+        # Soft-deleted and hard-deleted groceries leave the graph
+        deletes = grocery_ids - {row['id'] for row in upserts}
+
+        try:
+            backend.upsert_groceries(upserts)
+            backend.delete_groceries(sorted(deletes))
+        except Exception as exc:
+            logger.warning("Graph sync failed for %d groceries: %s", len(grocery_ids), exc)
+            for event in events:
+                event.attempts += 1
+                event.last_error = str(exc)
+                event.available_at = now + timedelta(seconds=min(2 ** event.attempts, MAX_BACKOFF_SECONDS))
+            GraphOutbox.objects.bulk_update(events, ['attempts', 'last_error', 'available_at'])  # type: ignore
+            dead = sorted({event.grocery_id for event in events if event.attempts >= MAX_ATTEMPTS})
+            if dead:
+                logger.error(
+                    "Graph sync gave up on groceries %s after %d attempts; run process_graph_outbox --retry-dead to requeue them.",
+                    dead, MAX_ATTEMPTS,
+                )
+            return len(events)
+
+        GraphOutbox.objects.filter(pk__in=[event.pk for event in events]).delete()  # type: ignore
+    invalidate_graph_queries()
+    return len(events)
+
+
+def count_dead_rows():
+    """The number of outbox rows the worker gave up on."""
+    return GraphOutbox.objects.filter(attempts__gte=MAX_ATTEMPTS).count()  # type: ignore
+
+
+def retry_dead_rows():
+    """Makes the dead outbox rows due again with fresh attempts. Returns how many."""
+    return GraphOutbox.objects.filter(attempts__gte=MAX_ATTEMPTS).update(attempts=0, available_at=timezone.now())  # type: ignore
+
+
+def drain_outbox(backend, batch_size=500):
+    """
+    Processes batches until nothing is due. Returns the number of rows consumed.
+    """
+    total = 0
+    while True:
+        processed = process_outbox_batch(backend, batch_size)
+        if not processed:
+            return total
+        total += processed
@@ -0,0 +1,30 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key, newest rows first.
+    The cursor encodes the last seen id, so deep pages cost the same as the first one.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
+
+
+class DailyIncomeCursorPagination(IdCursorPagination):
+    """
+    Incomes are read as a timeline, so they are paged by date (newest first)
+    with the id as a tie-breaker.
+    """
+    ordering = ('-date', '-id')
+
+
+class IncomeAnalyticsCursorPagination(IdCursorPagination):
+    """
+    Analytics rows are read per grocery in period order. The cursor only
+    filters on the grocery, so the window functions still see every period.
+    """
+    page_size = 500
+    max_page_size = 5000
+    ordering = ('grocery_id', 'period_start')
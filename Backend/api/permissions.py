@@ -1,13 +1,48 @@
 from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from .instrumentation import timed
+
+
+def get_grocery_scope(request):
+    """
+    The ids of the live groceries request.user manages. CachedJWTAuthentication
+    resolves them with the user; for other authentication they are read once
+    per request.
+    """
+    from .models import Grocery
+    scope = getattr(request.user, 'grocery_ids', None)
+    if scope is None:
+        scope = getattr(request, '_grocery_scope', None)
+    if scope is None:
+        scope = request._grocery_scope = frozenset(
+            Grocery.objects.filter(responsible_person=request.user).values_list('pk', flat=True) # type: ignore
+        )
+    return scope
+
+
+def get_supplier_grocery_id(request):
+    """
+    The id of the one grocery a supplier writes to, from their grocery scope.
+    """
+    scope = get_grocery_scope(request)
+    if not scope:
+        raise PermissionDenied("You are not assigned to any grocery.")
+    if len(scope) > 1:
+        raise ValidationError({'grocery': ['You manage several groceries, choose one.']})
+    return next(iter(scope))
+
 
 class IsAdminOrIsOwner(permissions.BasePermission):
     """
     Allows access only to admin users or to the owner of the object.
     """
+    @timed('permissions')
     def has_permission(self, request, view):
         # يجب أن يكون المستخدم مسجل دخوله للسماح له بالمرور
         return request.user and request.user.is_authenticated
 
+    @timed('permissions')
     def has_object_permission(self, request, view, obj): # type: ignore
         # المدير العام (is_staff) مسموح له بكل شيء
         if request.user.is_staff:
@@ -20,10 +55,15 @@ class IsAdminOrIsOwner(permissions.BasePermission):
 
         # نتحقق من المالك بناءً على نوع الكائن (Object)
         # إذا كان الكائن هو بقالة
-        if hasattr(obj, 'responsible_person'):
-            return obj.responsible_person == request.user
+        # نقارن المعرفات مباشرة لتجنب استعلامات إضافية لجلب المستخدم
+        if hasattr(obj, 'responsible_person_id'):
+            return obj.responsible_person_id == request.user.pk
         # إذا كان الكائن هو منتج أو دخل يومي
+        # نستخدم قائمة البقالات المحسوبة مسبقاً عند المصادقة إن وجدت
+        scope = getattr(request.user, 'grocery_ids', None)
+        if scope is not None and hasattr(obj, 'grocery_id'):
+            return obj.grocery_id in scope
         if hasattr(obj, 'grocery'):
-            return obj.grocery.responsible_person == request.user
+            return obj.grocery.responsible_person_id == request.user.pk
 
         return False
\ No newline at end of file
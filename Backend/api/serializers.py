@@ -1,5 +1,61 @@
-from rest_framework import serializers
-from .models import User, Grocery, Item, DailyIncome
+from django.conf import settings
+from django.db import models
+from rest_framework import permissions, serializers
+from .instrumentation import timed
+from .jobs import JOBS, check_payload
+from .models import User, Grocery, Item, DailyIncome, Job
+
+
+def _split_query_param(value):
+    if value is None:
+        return None
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+def get_expanded_fields(request, serializer_class, default=()):
+    """
+    Returns which of ``serializer_class.Meta.expandable_fields`` the request asked for.
+    Views use this to decide what to prefetch, the serializer to decide what to render.
+    """
+    expandable = getattr(serializer_class.Meta, 'expandable_fields', ())
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return set(expandable)
+    expand = _split_query_param(request.query_params.get('expand'))
+    if expand is None:
+        expand = set(default)
+    return expand & set(expandable)
+
+
+# Formats summary amounts exactly like DailyIncomeSerializer.amount
+_income_amount_field = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class DynamicFieldsMixin:
+    """
+    Lets read requests trim the output with ``?fields=a,b`` and opt into the
+    heavy fields listed in ``Meta.expandable_fields`` with ``?expand=a,b``.
+    When ``expand`` is not given, ``default_expand`` from the context is used.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        # Writes always see the full field set so validation is unaffected
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return
+
+        expand = get_expanded_fields(request, type(self), self.context.get('default_expand', ()))
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                self.fields.pop(name, None)
+
+        fields = _split_query_param(request.query_params.get('fields'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+    @timed('serialize')
+    def to_representation(self, instance):
+        return super().to_representation(instance)
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,23 +90,130 @@ class AdminUserSerializer(serializers.ModelSerializer):
         )
         return user
 
-class ItemSerializer(serializers.ModelSerializer):
+class LiveListSerializer(serializers.ListSerializer):
+    """
+    Drops soft-deleted rows when rendering a reverse relation such as ``grocery.items``.
+    The views prefetch only live rows; this keeps non-prefetched instances consistent.
+    """
+    @timed('serialize')
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation([obj for obj in iterable if not obj.is_deleted])
+
+class ItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
+        list_serializer_class = LiveListSerializer
+
+class ItemBulkSerializer(ItemSerializer):
+    """
+    Row serializer for the bulk endpoints, which resolve the grocery themselves.
+    """
+    class Meta(ItemSerializer.Meta):
+        read_only_fields = ('grocery', 'created_at', 'updated_at')
 
-class DailyIncomeSerializer(serializers.ModelSerializer):
+class DailyIncomeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = DailyIncome
         fields = '__all__'
         read_only_fields = ('grocery', 'created_at', 'updated_at')
+        list_serializer_class = LiveListSerializer
 
-class GrocerySerializer(serializers.ModelSerializer):
+class GroceryChangeSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    The grocery columns alone, for the change feed (api/changes.py).
+    """
+    class Meta:
+        model = Grocery
+        fields = ['id', 'name', 'location', 'responsible_person', 'created_at', 'updated_at', 'is_deleted']
+
+class GrocerySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = ItemSerializer(many=True, read_only=True)
     incomes = DailyIncomeSerializer(many=True, read_only=True)
+    # Summary fields, filled from queryset annotations (see GroceryViewSet.get_queryset)
+    item_count = serializers.IntegerField(read_only=True)
+    catalogue_value = serializers.DecimalField(max_digits=16, decimal_places=2, read_only=True)
+    income_count = serializers.IntegerField(read_only=True)
+    average_income = serializers.SerializerMethodField()
+    latest_income = serializers.SerializerMethodField()
 
     class Meta:
         model = Grocery
-        fields = ['id', 'name', 'location', 'responsible_person', 'items', 'incomes', 'created_at', 'updated_at']
-        read_only_fields = ('created_at', 'updated_at')
\ No newline at end of file
+        fields = [
+            'id', 'name', 'location', 'responsible_person', 'items', 'incomes',
+            'item_count', 'catalogue_value', 'income_count', 'average_income', 'latest_income', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ('created_at', 'updated_at')
+        expandable_fields = ('items', 'incomes')
+
+    def get_average_income(self, obj):
+        count = getattr(obj, 'income_count', None)
+        if not count:
+            return None
+        return _income_amount_field.to_representation(obj.income_total / count)
+
+    def get_latest_income(self, obj):
+        latest_date = getattr(obj, 'latest_income_date', None)
+        if latest_date is None:
+            return None
+        return {
+            'date': latest_date.isoformat(),
+            'amount': _income_amount_field.to_representation(obj.latest_income_amount),
+        }
+
+class GroceryIdsSerializer(serializers.Serializer):
+    """
+    The ``{"ids": [...]}`` body of the grocery bulk delete and restore.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.BULK_BATCH_SIZE,
+    )
+
+class IncomeAnalyticsSerializer(serializers.Serializer):
+    """
+    One grocery and period of the income analytics (see api/analytics.py).
+    """
+    grocery = serializers.IntegerField(source='grocery_id')
+    period_start = serializers.DateField()
+    total = serializers.DecimalField(max_digits=16, decimal_places=2)
+    days = serializers.IntegerField()
+    average = serializers.DecimalField(max_digits=16, decimal_places=2)
+    moving_average = serializers.DecimalField(max_digits=16, decimal_places=2)
+    previous_total = serializers.DecimalField(max_digits=16, decimal_places=2, allow_null=True)
+    # A ratio without a bound (0.01 then 1000.00 grows 99999.0x), so a float
+    growth = serializers.FloatField(allow_null=True)
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    A background job (see api/jobs.py). Only `name`, `payload` and
+    `priority` can be set when queueing one.
+    """
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'payload', 'priority', 'status', 'attempts', 'max_attempts', 'available_at',
+            'started_at', 'finished_at', 'result', 'last_error', 'created_at', 'updated_at',
+        ]
+        read_only_fields = [
+            'status', 'attempts', 'max_attempts', 'available_at', 'started_at', 'finished_at',
+            'result', 'last_error', 'created_at', 'updated_at',
+        ]
+
+    def validate_name(self, value):
+        if value not in JOBS:
+            raise serializers.ValidationError(f'Unknown job. Choose one of: {", ".join(sorted(JOBS))}.')
+        return value
+
+    def validate_payload(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Expected an object of keyword arguments.')
+        return value
+
+    def validate(self, attrs):
+        try:
+            check_payload(attrs['name'], attrs.get('payload', {}))
+        except ValueError as exc:
+            raise serializers.ValidationError({'payload': [str(exc)]})
+        return attrs
@@ -1,24 +1,151 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from .models import Grocery
-from .graph_models import GroceryNode, SupplierNode
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from .analytics import refresh_income_rollups
+from .authentication import invalidate_cached_users
+from .caching import invalidate_model
+from .instrumentation import install_sql_wrapper
+from .models import DailyIncome, Grocery, Item, User
+from .outbox import enqueue_grocery_sync
+from .stats import apply_income_change, apply_item_change, refresh_grocery_stats
+
+# Sent after bulk writes (bulk_create, bulk_update, queryset.update), which skip
+# post_save. `keys` is a set of (grocery_id, date) pairs; date is None for
+# models without one.
+bulk_changed = Signal()
 
 @receiver(post_save, sender=Grocery)
-def create_or_update_grocery_node(sender, instance, created, **kwargs):
+@receiver(post_delete, sender=Grocery)
+def enqueue_grocery_graph_sync(sender, instance, **kwargs):
+    """
+    Queues the grocery for the Neo4j mirror. The node and its relationship to
+    the SupplierNode are written later by `manage.py process_graph_outbox`,
+    so saving a grocery never waits on Neo4j.
+    """
+    enqueue_grocery_sync([instance.pk])
+
+@receiver(bulk_changed, sender=Grocery)
+def enqueue_grocery_graph_sync_on_bulk_change(sender, keys, **kwargs):
+    enqueue_grocery_sync({grocery_id for grocery_id, _ in keys})
+
+@receiver(post_save, sender=User)
+def enqueue_supplier_graph_sync(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Supplier nodes carry the username and email, so re-sync the user's groceries
+    when those change.
     """
-    This signal creates or updates a GroceryNode and its relationship
-    to a SupplierNode whenever a Grocery instance is saved.
+    if created or (update_fields is not None and not {'username', 'email'} & set(update_fields)):
+        return
+    grocery_ids = list(instance.managed_groceries.values_list('pk', flat=True))
+    if grocery_ids:
+        enqueue_grocery_sync(grocery_ids)
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def enqueue_item_type_graph_sync(sender, instance, signal, created=False, update_fields=None, **kwargs):
+    """
+    Grocery nodes link to the item types they stock, so re-sync the grocery
+    when an item appears, disappears or changes type or grocery.
     """
-    grocery_node = GroceryNode.get_or_create({'name': instance.name})[0] # type: ignore
-    
-    if instance.responsible_person:
-        supplier_info = {
-            'username': instance.responsible_person.username,
-            'email': instance.responsible_person.email,
-        }
-        supplier_node = SupplierNode.get_or_create(supplier_info)[0] # type: ignore
-        
-        if not grocery_node.managed_by.is_connected(supplier_node):
-            grocery_node.managed_by.connect(supplier_node)
-        if not supplier_node.manages.is_connected(grocery_node):
-            supplier_node.manages.connect(grocery_node)
\ No newline at end of file
+    loaded = getattr(instance, '_loaded_stock', None)
+    unchanged = loaded == (instance.grocery_id, instance.item_type) and 'is_deleted' not in (update_fields or ())
+    if signal is post_save and not created and unchanged:
+        return
+    enqueue_grocery_sync({instance.grocery_id, *(loaded[:1] if loaded else ())})
+
+@receiver(bulk_changed, sender=Item)
+def enqueue_item_type_graph_sync_on_bulk_change(sender, keys, **kwargs):
+    enqueue_grocery_sync({grocery_id for grocery_id, _ in keys})
+
+@receiver(post_save, sender=DailyIncome)
+@receiver(post_delete, sender=DailyIncome)
+def refresh_income_rollups_on_save(sender, instance, **kwargs):
+    keys = {(instance.grocery_id, instance.date)}
+    # A row moved to another day (or grocery) also leaves its old buckets stale
+    loaded_key = getattr(instance, '_loaded_key', None)
+    if loaded_key:
+        keys.add(loaded_key)
+    refresh_income_rollups(keys)
+
+@receiver(bulk_changed, sender=DailyIncome)
+def refresh_income_rollups_on_bulk_change(sender, keys, **kwargs):
+    refresh_income_rollups(keys)
+
+def _deleting_grocery(origin):
+    """Whether a post_delete comes from a grocery's cascade, which also removes its stats."""
+    return isinstance(origin, Grocery) or getattr(origin, 'model', None) is Grocery
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def refresh_item_stats(sender, instance, signal, created=False, origin=None, **kwargs):
+    if _deleting_grocery(origin):
+        return
+    loaded = getattr(instance, '_loaded_stats', None)
+    current = (instance.grocery_id, instance.price, instance.is_deleted)
+    if signal is post_save and not created and loaded is None:
+        # Saved over a row it never read: the old state is unknown
+        refresh_grocery_stats({instance.grocery_id}, incomes=False)
+    elif signal is post_save and not created and loaded == current:
+        return
+    else:
+        # A moved item also changes the counters of its old grocery
+        old = None if created else loaded or current
+        apply_item_change(old, current if signal is post_save else None)
+    instance._loaded_stats = current
+
+@receiver(bulk_changed, sender=Item)
+def refresh_item_stats_on_bulk_change(sender, keys, **kwargs):
+    refresh_grocery_stats({grocery_id for grocery_id, _ in keys}, incomes=False)
+
+@receiver(post_save, sender=DailyIncome)
+@receiver(post_delete, sender=DailyIncome)
+def refresh_income_stats(sender, instance, signal, created=False, origin=None, **kwargs):
+    if _deleting_grocery(origin):
+        return
+    loaded = getattr(instance, '_loaded_stats', None)
+    current = (instance.grocery_id, instance.date, instance.amount, instance.is_deleted)
+    if signal is post_save and not created and loaded is None:
+        refresh_grocery_stats({instance.grocery_id}, items=False)
+    elif signal is post_save and not created and loaded == current:
+        return
+    else:
+        old = None if created else loaded or current
+        apply_income_change(old, current if signal is post_save else None)
+    instance._loaded_stats = current
+
+@receiver(bulk_changed, sender=DailyIncome)
+def refresh_income_stats_on_bulk_change(sender, keys, **kwargs):
+    refresh_grocery_stats({grocery_id for grocery_id, _ in keys}, items=False)
+
+@receiver(post_save, sender=Grocery)
+@receiver(post_delete, sender=Grocery)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=DailyIncome)
+@receiver(post_delete, sender=DailyIncome)
+@receiver(bulk_changed, sender=Grocery)
+@receiver(bulk_changed, sender=Item)
+@receiver(bulk_changed, sender=DailyIncome)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_model(sender)
+
+@receiver(connection_created)
+def time_sql_queries(sender, connection, **kwargs):
+    install_sql_wrapper(connection)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_cached_users([instance.pk])
+
+@receiver(post_save, sender=Grocery)
+@receiver(post_delete, sender=Grocery)
+def invalidate_cached_grocery_scope(sender, instance, **kwargs):
+    invalidate_cached_users({instance.responsible_person_id, getattr(instance, '_loaded_owner', None)})
+    # The next save of this instance must still find the previous owner
+    instance._loaded_owner = instance.responsible_person_id
+
+@receiver(bulk_changed, sender=Grocery)
+def invalidate_cached_grocery_scopes_on_bulk_change(sender, keys, **kwargs):
+    owners = Grocery.all_objects.filter(pk__in={grocery_id for grocery_id, _ in keys}).values_list('responsible_person_id', flat=True)  # type: ignore
+    invalidate_cached_users(set(owners))
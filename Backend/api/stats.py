@@ -0,0 +1,188 @@
+"""
+Per-grocery dashboard counters in the GroceryStats side table.
+
+The grocery list used to count items and incomes with correlated subqueries
+on every request. GroceryStats keeps the item count, catalogue value (sum of
+item prices), income count and total and the latest income per grocery, so
+the list reads them with one join.
+
+Saving or deleting one row applies the difference between its old and new
+state as `F()` deltas in a single UPDATE of the stats row, so the cost does
+not grow with the grocery. The latest income only needs a lookup when the
+row that was the latest changes, and that one walks the (grocery, date)
+index. Bulk writes know only which groceries they touched, so they
+recompute those groceries' counters; the stats rows are locked first, so
+concurrent writers of one grocery refresh one after the other and the last
+one sees every committed change. `manage.py reconcile_grocery_stats` repairs
+any drift.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DateField, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import DailyIncome, Grocery, GroceryStats, Item
+
+ITEM_FIELDS = ('item_count', 'catalogue_value')
+INCOME_FIELDS = ('income_count', 'income_total', 'last_income_date', 'last_income_amount')
+
+
+def _total(queryset, column, output_field):
+    """Correlated subquery of one aggregate over the live rows of the outer grocery."""
+    value = queryset.order_by().values('grocery').annotate(value=column).values('value')
+    return Subquery(value, output_field=output_field)
+
+
+def stats_expressions(grocery_ref, items=True, incomes=True):
+    """The GroceryStats columns as expressions, for the grocery in `grocery_ref`."""
+    money, count = DecimalField(max_digits=16, decimal_places=2), IntegerField()
+    expressions = {}
+    if items:
+        live_items = Item.objects.filter(grocery=OuterRef(grocery_ref)) # type: ignore
+        expressions['item_count'] = Coalesce(_total(live_items, Count('pk'), count), 0)
+        expressions['catalogue_value'] = Coalesce(_total(live_items, Sum('price'), money), Value(Decimal('0')), output_field=money)
+    if incomes:
+        live_incomes = DailyIncome.objects.filter(grocery=OuterRef(grocery_ref)) # type: ignore
+        latest = live_incomes.order_by('-date')
+        expressions['income_count'] = Coalesce(_total(live_incomes, Count('pk'), count), 0)
+        expressions['income_total'] = Coalesce(_total(live_incomes, Sum('amount'), money), Value(Decimal('0')), output_field=money)
+        expressions['last_income_date'] = Subquery(latest.values('date')[:1])
+        expressions['last_income_amount'] = Subquery(latest.values('amount')[:1])
+    return expressions
+
+
+def refresh_grocery_stats(grocery_ids, items=True, incomes=True):
+    """
+    Recomputes the item and/or income counters of `grocery_ids` with one
+    UPDATE, creating the missing stats rows first.
+    """
+    grocery_ids = {grocery_id for grocery_id in grocery_ids if grocery_id is not None}
+    if not grocery_ids:
+        return
+    with transaction.atomic(savepoint=False):
+        locked = set(
+            GroceryStats.objects.select_for_update().filter(grocery_id__in=grocery_ids) # type: ignore
+            .order_by('grocery_id').values_list('grocery_id', flat=True)
+        )
+        missing = grocery_ids - locked
+        if missing:
+            # Skips groceries deleted in the meantime (their children cascade)
+            existing = Grocery.all_objects.filter(pk__in=missing).values_list('pk', flat=True) # type: ignore
+            GroceryStats.objects.bulk_create([GroceryStats(grocery_id=pk) for pk in existing], ignore_conflicts=True) # type: ignore
+            # Fresh rows need every counter
+            items = incomes = True
+        GroceryStats.objects.filter(grocery_id__in=grocery_ids).update( # type: ignore
+            updated_at=timezone.now(), **stats_expressions('grocery_id', items, incomes)
+        )
+
+
+def _live_state(state):
+    """`state` when it describes a live row, None for a deleted or missing one."""
+    return state if state is not None and state[0] is not None and not state[-1] else None
+
+
+def _apply(changes):
+    """
+    Runs one UPDATE per grocery with its {column: expression} changes. A
+    grocery without a stats row yet gets one, with a full recompute.
+    """
+    now = timezone.now()
+    missing = {
+        grocery_id for grocery_id, columns in changes.items()
+        if not GroceryStats.objects.filter(grocery_id=grocery_id).update(updated_at=now, **columns) # type: ignore
+    }
+    refresh_grocery_stats(missing)
+
+
+def apply_item_change(old, new):
+    """
+    Adjusts item_count and catalogue_value by the difference between an
+    item's `old` and `new` (grocery_id, price, is_deleted) states, None for a
+    row that did not or no longer exists.
+    """
+    deltas = {}
+    for state, sign in ((_live_state(old), -1), (_live_state(new), 1)):
+        if state is not None:
+            count, value = deltas.get(state[0], (0, Decimal('0')))
+            deltas[state[0]] = (count + sign, value + sign * Decimal(str(state[1])))
+    _apply({
+        grocery_id: {'item_count': F('item_count') + count, 'catalogue_value': F('catalogue_value') + value}
+        for grocery_id, (count, value) in deltas.items() if count or value
+    })
+
+
+def apply_income_change(old, new):
+    """
+    Adjusts the income counters by the difference between an income's `old`
+    and `new` (grocery_id, date, amount, is_deleted) states, None for a row
+    that did not or no longer exists. A newer income becomes the latest one;
+    when the latest one changes, the next is looked up on the index.
+    """
+    changes = {}
+    for state, sign in ((_live_state(old), -1), (_live_state(new), 1)):
+        if state is None:
+            continue
+        grocery_id, day, amount = state[0], state[1], Decimal(str(state[2]))
+        day = parse_date(day) if isinstance(day, str) else day
+        change = changes.setdefault(grocery_id, {'count': 0, 'total': Decimal('0'), 'removed': None, 'added': None})
+        change['count'] += sign
+        change['total'] += sign * amount
+        change['removed' if sign < 0 else 'added'] = (day, amount)
+
+    updates = {}
+    for grocery_id, change in changes.items():
+        dates, amounts = [], []
+        if change['removed']:
+            # The statement sees this transaction's write, so the lookup finds the new latest
+            latest = DailyIncome.objects.filter(grocery_id=grocery_id).order_by('-date') # type: ignore
+            removed = Q(last_income_date=change['removed'][0])
+            dates.append(When(removed, then=Subquery(latest.values('date')[:1])))
+            amounts.append(When(removed, then=Subquery(latest.values('amount')[:1])))
+        if change['added']:
+            day, amount = change['added']
+            newer = Q(last_income_date__isnull=True) | Q(last_income_date__lte=day)
+            dates.append(When(newer, then=Value(day)))
+            amounts.append(When(newer, then=Value(amount)))
+        updates[grocery_id] = {
+            'income_count': F('income_count') + change['count'],
+            'income_total': F('income_total') + change['total'],
+            'last_income_date': Case(*dates, default=F('last_income_date'), output_field=DateField()),
+            'last_income_amount': Case(*amounts, default=F('last_income_amount'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+        }
+    _apply(updates)
+
+
+def reconcile_grocery_stats(batch_size=1000, dry_run=False):
+    """
+    Compares the stats of every grocery with a fresh count, in primary-key
+    chunks, and rewrites the missing and drifted rows. Returns the counts.
+    """
+    report = {'groceries': 0, 'missing': 0, 'drifted': 0}
+    fields = ITEM_FIELDS + INCOME_FIELDS
+    last_pk = 0
+    while True:
+        chunk = list(
+            Grocery.all_objects.filter(pk__gt=last_pk).order_by('pk') # type: ignore
+            .annotate(**stats_expressions('pk')).values('pk', *fields)[:batch_size]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1]['pk']
+        report['groceries'] += len(chunk)
+        stored = GroceryStats.objects.in_bulk([row['pk'] for row in chunk]) # type: ignore
+        repair = set()
+        for row in chunk:
+            stats = stored.get(row['pk'])
+            if stats is None:
+                report['missing'] += 1
+            elif any(getattr(stats, field) != row[field] for field in fields):
+                report['drifted'] += 1
+            else:
+                continue
+            repair.add(row['pk'])
+        if repair and not dry_run:
+            refresh_grocery_stats(repair)
+    return report
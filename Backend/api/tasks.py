@@ -0,0 +1,58 @@
+"""
+Functions the job queue (api/jobs.py) can run. Payload keys are their
+keyword arguments and return values are stored as the job result, so both
+must be JSON.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .analytics import rebuild_income_rollups
+from .archive import archive_deleted_incomes
+from .cascade import restore_groceries, soft_delete_groceries
+from .graph import get_graph_backend
+from .graph_sync import sync_graph
+from .idempotency import purge_idempotency_keys
+from .importers import run_spooled_import
+from .jobs import job
+from .stats import reconcile_grocery_stats
+
+
+@job('graph_sync')
+def run_graph_sync(full=False, batch_size=1000):
+    return sync_graph(get_graph_backend(), full=full, batch_size=batch_size)
+
+
+@job('rebuild_income_rollups')
+def run_rebuild_income_rollups(grocery_ids=None):
+    return {'rollups': rebuild_income_rollups(grocery_ids)}
+
+
+@job('reconcile_grocery_stats')
+def run_reconcile_grocery_stats(batch_size=1000):
+    return reconcile_grocery_stats(batch_size)
+
+
+@job('archive_incomes')
+def run_archive_incomes(days=30, batch_size=5000):
+    return {'archived': archive_deleted_incomes(timezone.now() - timedelta(days=days), batch_size)}
+
+
+@job('purge_idempotency_keys')
+def run_purge_idempotency_keys(hours=None):
+    return {'purged': purge_idempotency_keys(hours)}
+
+
+@job('soft_delete_groceries')
+def run_soft_delete_groceries(grocery_ids):
+    return soft_delete_groceries(grocery_ids)
+
+
+@job('restore_groceries')
+def run_restore_groceries(grocery_ids):
+    return restore_groceries(grocery_ids)
+
+
+@job('import_upload')
+def run_import_upload(name, kind, fmt, checkpoint_key, grocery_id=None):
+    return run_spooled_import(name, kind, fmt, checkpoint_key, grocery_id)
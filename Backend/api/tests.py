@@ -1,7 +1,41 @@
-from django.urls import reverse
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, resolve, reverse
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from .models import User, Grocery, Item, DailyIncome
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import async_to_sync, sync_to_async
+from .models import User, Grocery, GroceryStats, Item, DailyIncome, ArchivedDailyIncome, GraphOutbox, IdempotencyKey, Job, ImportCheckpoint, IncomeRollup
+from . import graph as graph_module
+from .graph import InMemoryGraphBackend, get_graph_backend, invalidate_graph_queries
+from .outbox import MAX_ATTEMPTS, drain_outbox
+from .jobs import JOBS, claim_job, enqueue, requeue_stale_jobs, work
+from .importers import run_import
+from .archive import archive_deleted_incomes
+from .filters import FullTextSearchFilter
+from .benchmarks import EXCLUDED_ROUTES, build_scenarios, compare_fast_path, load_baseline, save_baseline
+from .caching import get_cache_stats
+from .instrumentation import registry as metrics_registry
+from .views import ItemViewSet
+from .database import ReplicaRouter, _read_from_replica, replica_reads
+from .middleware import ReplicaRoutingMiddleware
+from .benchmarks import compare_connection_modes
 from django.contrib.auth.models import Group
 
 # -----------------------------------------------------------------------------
@@ -15,6 +49,10 @@ class BaseTestCase(APITestCase):
     Base class for setting up dummy data that will be used by all tests.
     """
     def setUp(self):
+        # Cached responses and rate limit counters must not leak between tests
+        cache.clear()
+        caches['throttle'].clear()
+
         # 1. Create users
         self.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'adminpass')
         self.supplier1 = User.objects.create_user('supplier1', 's1@example.com', 'supplierpass')
@@ -70,7 +108,7 @@ class AdminRoleTests(BaseTestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
         # Make sure it sees all products
-        self.assertEqual(len(response.data), 1)  # type: ignore
+        self.assertEqual(len(response.data['results']), 1)  # type: ignore
 
     def test_admin_can_soft_delete_grocery(self):
         url = reverse('grocery-detail', kwargs={'pk': self.grocery1.pk})
@@ -122,7 +160,7 @@ class SupplierPermissionsTests(BaseTestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
         # Should only see their own products in the filtered display list
-        self.assertEqual(len(response.data), 1)  # type: ignore
+        self.assertEqual(len(response.data['results']), 1)  # type: ignore
 
     def test_supplier_cannot_update_other_grocery_item(self):
         """ Tests if a supplier is prevented from modifying a product in another grocery. """
@@ -141,4 +179,1666 @@ class SupplierPermissionsTests(BaseTestCase):
         data = {'amount': '1500.75', 'date': '2025-09-30'}
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
-        self.assertTrue(DailyIncome.objects.filter(grocery=self.grocery1, amount='1500.75').exists())  # type: ignore
\ No newline at end of file
+        self.assertTrue(DailyIncome.objects.filter(grocery=self.grocery1, amount='1500.75').exists())  # type: ignore
+
+
+class PaginationTests(BaseTestCase):
+    """
+    Tests for the cursor pagination on the list endpoints.
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+
+    def test_item_list_is_paginated_with_cursor(self):
+        Item.objects.bulk_create([  # type: ignore
+            Item(name=f'Item {i}', item_type='Misc', location_in_grocery='C1', price='1.00', grocery=self.grocery1)
+            for i in range(4)
+        ])
+        response = self.client.get(reverse('item-list'), {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertEqual(len(response.data['results']), 3)  # type: ignore
+        self.assertIsNotNone(response.data['next'])  # type: ignore
+
+        # Follow the cursor to the last page
+        response = self.client.get(response.data['next'])  # type: ignore
+        self.assertEqual(len(response.data['results']), 2)  # type: ignore
+        self.assertIsNone(response.data['next'])  # type: ignore
+
+    def test_daily_income_list_is_ordered_by_newest_date(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='20.00', date='2025-01-02')  # type: ignore
+        response = self.client.get(reverse('dailyincome-list'))
+        dates = [row['date'] for row in response.data['results']]  # type: ignore
+        self.assertEqual(dates, ['2025-01-02', '2025-01-01'])
+
+
+class GrocerySummaryTests(BaseTestCase):
+    """
+    Tests for the lightweight grocery rows and the ?expand= / ?fields= parameters.
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='100.00', date='2025-01-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='250.50', date='2025-01-02')  # type: ignore
+        Item.objects.create(  # type: ignore
+            name='Old', item_type='Dairy', location_in_grocery='A9', price='1.00', grocery=self.grocery1, is_deleted=True
+        )
+
+    def _grocery1_row(self, params=None):
+        response = self.client.get(reverse('grocery-list'), params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        return next(row for row in response.data['results'] if row['id'] == self.grocery1.id)  # type: ignore
+
+    def test_list_returns_counts_instead_of_nested_arrays(self):
+        row = self._grocery1_row()
+        self.assertNotIn('items', row)
+        self.assertNotIn('incomes', row)
+        # Soft-deleted items are not counted
+        self.assertEqual(row['item_count'], 1)
+        self.assertEqual(row['income_count'], 2)
+        self.assertEqual(row['latest_income'], {'date': '2025-01-02', 'amount': '250.50'})
+
+    def test_expand_includes_nested_arrays(self):
+        row = self._grocery1_row({'expand': 'items'})
+        self.assertIn('items', row)
+        self.assertNotIn('incomes', row)
+
+    def test_fields_trims_the_row(self):
+        row = self._grocery1_row({'fields': 'id,name,item_count'})
+        self.assertEqual(set(row), {'id', 'name', 'item_count'})
+
+    def test_retrieve_keeps_nested_arrays(self):
+        response = self.client.get(reverse('grocery-detail', kwargs={'pk': self.grocery1.pk}))
+        self.assertIn('items', response.data)  # type: ignore
+        self.assertIn('incomes', response.data)  # type: ignore
+        # Soft-deleted children are not nested
+        self.assertEqual([item['name'] for item in response.data['items']], ['Milk'])  # type: ignore
+
+
+class QueryBudgetTests(BaseTestCase):
+    """
+    Query-count regression tests: every endpoint must run a constant number of
+    queries whether the tables hold 1, 100 or 10k rows.
+    """
+    SIZES = (1, 100, 10_000)
+
+    def _grow_to(self, size):
+        """ Tops up groceries, items and incomes of grocery1 to `size` rows each. """
+        groceries = Grocery.objects.count()  # type: ignore
+        Grocery.objects.bulk_create([  # type: ignore
+            Grocery(name=f'Branch {i}', location='Dammam', responsible_person=self.supplier2)
+            for i in range(groceries, size)
+        ])
+        items = Item.objects.filter(grocery=self.grocery1).count()  # type: ignore
+        Item.objects.bulk_create([  # type: ignore
+            Item(name=f'Item {i}', item_type='Misc', location_in_grocery='C1', price='1.00', grocery=self.grocery1)
+            for i in range(items, size)
+        ])
+        incomes = DailyIncome.objects.filter(grocery=self.grocery1).count()  # type: ignore
+        DailyIncome.objects.bulk_create([  # type: ignore
+            DailyIncome(grocery=self.grocery1, amount='10.00', date=date(2000, 1, 1) + timedelta(days=i))
+            for i in range(incomes, size)
+        ])
+
+    def assertQueryBudget(self, user, budget, method, url, data=None):
+        self.client.force_authenticate(user=user)  # type: ignore
+        for size in self.SIZES:
+            self._grow_to(size)
+            # bulk_create skips the signals that bump cache versions; measure the uncached path
+            cache.clear()
+            with self.subTest(size=size), self.assertNumQueries(budget):
+                response = getattr(self.client, method)(url, data(size) if callable(data) else data, format='json')
+                self.assertLess(response.status_code, 400)  # type: ignore
+
+    def test_grocery_list(self):
+        self.assertQueryBudget(self.admin_user, 1, 'get', reverse('grocery-list'))
+
+    def test_grocery_list_expanded(self):
+        url = reverse('grocery-list') + '?expand=items,incomes'
+        self.assertQueryBudget(self.admin_user, 3, 'get', url)
+
+    def test_grocery_retrieve(self):
+        url = reverse('grocery-detail', kwargs={'pk': self.grocery1.pk})
+        self.assertQueryBudget(self.supplier1, 3, 'get', url)
+
+    def test_item_list(self):
+        self.assertQueryBudget(self.supplier1, 1, 'get', reverse('item-list'))
+
+    def test_item_update_checks_owner_without_extra_queries(self):
+        url = reverse('item-detail', kwargs={'pk': self.item1.pk})
+        # The item, its UPDATE, then the delta UPDATE of the grocery's stats
+        self.assertQueryBudget(self.supplier1, 3, 'patch', url, lambda size: {'price': f'{size}.00'})
+
+    def test_daily_income_list(self):
+        self.assertQueryBudget(self.admin_user, 1, 'get', reverse('dailyincome-list'))
+
+
+
+class FailingGraphBackend(InMemoryGraphBackend):
+    def upsert_groceries(self, rows):
+        raise ConnectionError('Neo4j unavailable')
+
+
+class GraphOutboxTests(BaseTestCase):
+    """
+    Tests for the Neo4j outbox: writes only queue work, the worker applies it.
+    """
+    def setUp(self):
+        super().setUp()
+        self.graph = InMemoryGraphBackend()
+
+    def test_saving_a_grocery_queues_it_without_touching_the_graph(self):
+        self.assertTrue(GraphOutbox.objects.filter(grocery_id=self.grocery1.pk).exists())  # type: ignore
+        self.assertEqual(self.graph.groceries, {})
+
+    def test_drain_mirrors_groceries_and_suppliers_in_one_statement(self):
+        drain_outbox(self.graph)
+        self.assertEqual(self.graph.groceries[self.grocery1.pk]['name'], 'Jeddah Branch')
+        self.assertEqual(self.graph.managed_by[self.grocery1.pk], self.supplier1.pk)
+        self.assertEqual(self.graph.suppliers[self.supplier1.pk]['username'], 'supplier1')
+        self.assertEqual(self.graph.statements, 1)
+        self.assertFalse(GraphOutbox.objects.exists())  # type: ignore
+
+    def test_rename_and_reassign_update_the_same_node(self):
+        drain_outbox(self.graph)
+        self.grocery1.name = 'Jeddah Central'
+        self.grocery1.responsible_person = self.supplier2
+        self.grocery1.save()
+        self.grocery1.save()
+        drain_outbox(self.graph)
+        self.assertEqual(len(self.graph.groceries), 2)
+        self.assertEqual(self.graph.groceries[self.grocery1.pk]['name'], 'Jeddah Central')
+        self.assertEqual(self.graph.managed_by[self.grocery1.pk], self.supplier2.pk)
+
+    def test_soft_delete_removes_the_node(self):
+        drain_outbox(self.graph)
+        self.grocery1.is_deleted = True
+        self.grocery1.save()
+        drain_outbox(self.graph)
+        self.assertNotIn(self.grocery1.pk, self.graph.groceries)
+
+    def test_failures_are_retried_later(self):
+        with self.assertLogs('api.outbox', level='WARNING'):
+            drain_outbox(FailingGraphBackend())
+        # One row for the grocery and one for its item, both pushed back
+        for event in GraphOutbox.objects.filter(grocery_id=self.grocery1.pk):  # type: ignore
+            self.assertEqual(event.attempts, 1)
+            self.assertIn('Neo4j unavailable', event.last_error)
+        # Not due yet, so a healthy worker leaves it alone until the backoff expires
+        self.assertEqual(drain_outbox(self.graph), 0)
+
+    @override_settings(GRAPH_BACKEND='api.graph.InMemoryGraphBackend')
+    def test_rows_out_of_attempts_are_reported_and_can_be_requeued(self):
+        GraphOutbox.objects.update(attempts=MAX_ATTEMPTS - 1)  # type: ignore
+        with self.assertLogs('api.outbox', level='ERROR') as logs:
+            drain_outbox(FailingGraphBackend())
+        self.assertIn('gave up', logs.output[-1])
+        dead = GraphOutbox.objects.count()  # type: ignore
+        GraphOutbox.objects.update(available_at=timezone.now())  # type: ignore
+        self.assertEqual(drain_outbox(self.graph), 0)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(f'api_graph_outbox_dead_rows {dead}', body)
+
+        out = StringIO()
+        call_command('process_graph_outbox', '--retry-dead', stdout=out)
+        self.assertIn(f'Requeued {dead} dead outbox rows.', out.getvalue())
+        self.assertFalse(GraphOutbox.objects.exists())  # type: ignore
+
+
+class BulkEndpointTests(BaseTestCase):
+    """
+    Tests for the list-payload bulk endpoints on items and daily incomes.
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+
+    def test_supplier_bulk_creates_items_in_own_grocery(self):
+        rows = [
+            {'name': f'Item {i}', 'item_type': 'Misc', 'location_in_grocery': 'C1', 'price': '1.00'}
+            for i in range(5)
+        ]
+        # Grocery scope and lookup, one batched INSERT, the graph outbox row,
+        # locking and refreshing the grocery's stats, plus the savepoint pair
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('item-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(response.data['created'], 5)  # type: ignore
+        self.assertEqual(Item.objects.filter(grocery=self.grocery1).count(), 6)  # type: ignore
+
+    def test_invalid_rows_reject_the_whole_payload(self):
+        rows = [
+            {'name': 'Ok', 'item_type': 'Misc', 'location_in_grocery': 'C1', 'price': '1.00'},
+            {'name': 'Bad price', 'item_type': 'Misc', 'location_in_grocery': 'C1', 'price': 'abc'},
+            {'name': 'Other', 'item_type': 'Misc', 'location_in_grocery': 'C1', 'price': '1.00', 'grocery': self.grocery2.id},
+        ]
+        response = self.client.post(reverse('item-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])  # type: ignore
+        self.assertEqual(Item.objects.count(), 1)  # type: ignore
+
+    def test_bulk_update_and_soft_delete_are_scoped_to_own_items(self):
+        other = Item.objects.create(  # type: ignore
+            name='Water', item_type='Drinks', location_in_grocery='B1', price='1.00', grocery=self.grocery2
+        )
+        response = self.client.patch(reverse('item-bulk'), [{'id': self.item1.id, 'price': '9.99'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.item1.refresh_from_db()
+        self.assertEqual(str(self.item1.price), '9.99')
+
+        response = self.client.patch(reverse('item-bulk'), [{'id': other.id, 'price': '9.99'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+        response = self.client.delete(reverse('item-bulk'), {'ids': [self.item1.id, other.id]}, format='json')
+        self.assertEqual(response.data['deleted'], 1)  # type: ignore
+        self.item1.refresh_from_db()
+        other.refresh_from_db()
+        self.assertTrue(self.item1.is_deleted)
+        self.assertFalse(other.is_deleted)
+
+    def test_supplier_of_several_groceries_names_one_per_row(self):
+        second = Grocery.objects.create(name='Mecca Branch', location='Mecca', responsible_person=self.supplier1)  # type: ignore
+        rows = [
+            {'name': 'Tea', 'item_type': 'Drinks', 'location_in_grocery': 'D1', 'price': '3.00', 'grocery': second.id},
+            {'name': 'Rice', 'item_type': 'Grains', 'location_in_grocery': 'D2', 'price': '8.00'},
+        ]
+        response = self.client.post(reverse('item-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertEqual(response.data['errors'], [{'index': 1, 'errors': {'grocery': ['You manage several groceries, choose one.']}}])  # type: ignore
+
+        rows[1]['grocery'] = self.grocery1.id
+        response = self.client.post(reverse('item-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertTrue(Item.objects.filter(name='Tea', grocery=second).exists())  # type: ignore
+        self.assertTrue(Item.objects.filter(name='Rice', grocery=self.grocery1).exists())  # type: ignore
+
+    def test_bulk_income_create_reports_existing_dates(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+        rows = [{'amount': '1.00', 'date': '2025-01-01'}, {'amount': '2.00', 'date': '2025-01-02'}]
+        response = self.client.post(reverse('dailyincome-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertEqual(response.data['errors'], [{'index': 0, 'errors': {'date': ['Income for this date already exists.']}}])  # type: ignore
+        # All rows or none: the free day was rolled back
+        self.assertFalse(DailyIncome.objects.filter(grocery=self.grocery1, date='2025-01-02').exists())  # type: ignore
+
+    def test_bulk_income_upsert_on_grocery_and_date(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='20.00', date='2025-01-02', is_deleted=True)  # type: ignore
+        rows = [
+            {'amount': '11.00', 'date': '2025-01-01'},
+            {'amount': '22.00', 'date': '2025-01-02'},
+            {'amount': '33.00', 'date': '2025-01-03'},
+        ]
+        response = self.client.post(reverse('dailyincome-bulk-upsert'), rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        # The soft-deleted day is kept as history and gets a new live row
+        self.assertEqual(response.data, {'created': 2, 'updated': 1})  # type: ignore
+        amounts = DailyIncome.objects.filter(grocery=self.grocery1, is_deleted=False).order_by('date').values_list('amount', flat=True)  # type: ignore
+        self.assertEqual([str(amount) for amount in amounts], ['11.00', '22.00', '33.00'])
+
+
+class ImportTests(BaseTestCase):
+    """
+    Tests for the streaming CSV/NDJSON import pipeline (command and endpoint).
+    """
+    def test_command_imports_csv_items_and_reports_bad_rows(self):
+        content = (
+            'name,item_type,location_in_grocery,price\n'
+            'Bread,Bakery,A2,2.00\n'
+            'Broken,Bakery,A2,not-a-price\n'
+            'Cheese,Dairy,A3,12.50\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_groceries', handle.name, kind='items', grocery=self.grocery1.pk, chunk_size=2, stdout=out, stderr=err)
+        self.assertEqual(Item.objects.filter(grocery=self.grocery1).count(), 3)  # type: ignore
+        self.assertIn('Row 2', err.getvalue())
+        self.assertIn('3 rows read, 2 written, 1 rejected', out.getvalue())
+
+    def test_checkpoint_skips_rows_already_imported(self):
+        content = (
+            '{"name": "A", "item_type": "T", "location_in_grocery": "L", "price": "1.00"}\n'
+            '{"name": "B", "item_type": "T", "location_in_grocery": "L", "price": "1.00"}\n'
+            '{"name": "C", "item_type": "T", "location_in_grocery": "L", "price": "1.00"}\n'
+        )
+        ImportCheckpoint.objects.create(key='backfill', kind='items', rows_done=2, rows_written=2)  # type: ignore
+        result = run_import(BytesIO(content.encode()), 'items', 'ndjson', 'backfill', self.grocery1)
+        self.assertEqual(result['rows_done'], 3)
+        self.assertEqual(list(Item.objects.filter(grocery=self.grocery1).values_list('name', flat=True).order_by('id')), ['Milk', 'C'])  # type: ignore
+
+        # A completed checkpoint makes re-running the import a no-op
+        run_import(BytesIO(content.encode()), 'items', 'ndjson', 'backfill', self.grocery1)
+        self.assertEqual(Item.objects.filter(grocery=self.grocery1).count(), 2)  # type: ignore
+
+    def test_supplier_streams_incomes_into_own_grocery(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        body = '{"date": "2025-01-01", "amount": "10.00"}\n{"date": "2025-01-01", "amount": "15.00"}\n'
+        response = self.client.post(reverse('import', kwargs={'kind': 'incomes'}), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertEqual(response.data['rows_written'], 2)  # type: ignore
+        # The later row for the same day wins
+        income = DailyIncome.objects.get(grocery=self.grocery1, date='2025-01-01')  # type: ignore
+        self.assertEqual(str(income.amount), '15.00')
+
+    def test_supplier_of_several_groceries_imports_into_the_named_one(self):
+        second = Grocery.objects.create(name='Mecca Branch', location='Mecca', responsible_person=self.supplier1)  # type: ignore
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        body = '{"date": "2025-01-01", "amount": "10.00"}\n'
+        url = reverse('import', kwargs={'kind': 'incomes'})
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+        response = self.client.post(f'{url}?grocery={self.grocery2.pk}', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+
+        response = self.client.post(f'{url}?grocery={second.pk}', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertTrue(DailyIncome.objects.filter(grocery=second, date='2025-01-01').exists())  # type: ignore
+
+    def test_large_uploads_are_imported_by_a_job(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        body = '{"date": "2025-01-01", "amount": "10.00"}\n{"date": "2025-01-02", "amount": "15.00"}\n'
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, IMPORT_INLINE_MAX_BYTES=10):
+            response = self.client.post(reverse('import', kwargs={'kind': 'incomes'}), body, content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)  # type: ignore
+            self.assertFalse(DailyIncome.objects.filter(grocery=self.grocery1).exists())  # type: ignore
+
+            work(burst=True)
+            job = self.client.get(response['Location']).data  # type: ignore
+            self.assertEqual((job['status'], job['result']['rows_written']), (Job.SUCCEEDED, 2))
+            self.assertEqual(DailyIncome.objects.filter(grocery=self.grocery1).count(), 2)  # type: ignore
+            # The spooled file is removed once imported
+            self.assertEqual(os.listdir(os.path.join(media, 'imports')), [])
+
+    def test_unsupported_content_type_is_rejected(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.post(reverse('import', kwargs={'kind': 'items'}), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)  # type: ignore
+
+
+class ExportTests(BaseTestCase):
+    """
+    Tests for the streaming CSV/NDJSON export endpoints.
+    """
+    def _content(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        return b''.join(response.streaming_content).decode()  # type: ignore
+
+    def test_item_csv_export_matches_api_formatting(self):
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        response = self.client.get(reverse('item-export'))
+        lines = self._content(response).splitlines()
+        self.assertEqual(lines[0], 'id,name,item_type,location_in_grocery,price,grocery,created_at,updated_at')
+        api_row = self.client.get(reverse('item-detail', kwargs={'pk': self.item1.pk})).data  # type: ignore
+        self.assertEqual(lines[1].split(','), [
+            str(self.item1.pk), 'Milk', 'Dairy', 'A1', '5.50', str(self.grocery1.pk), api_row['created_at'], api_row['updated_at'],
+        ])
+
+    def test_income_ndjson_export_is_scoped_and_filtered(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='20.00', date='2025-02-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery2, amount='30.00', date='2025-02-01')  # type: ignore
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.get(reverse('dailyincome-export'), {'output': 'ndjson', 'date_from': '2025-01-15'})
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([(row['date'], row['amount']) for row in rows], [('2025-02-01', '20.00')])
+
+    def test_invalid_filters_are_rejected(self):
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        response = self.client.get(reverse('dailyincome-export'), {'date_to': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+    async def test_asgi_export_streams_chunks(self):
+        await Item.objects.abulk_create([  # type: ignore
+            Item(name=f'Item {n}', item_type='Misc', location_in_grocery='B1', price='1.00', grocery=self.grocery1) for n in range(1200)
+        ])
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.admin_user).access_token))()
+        response = await AsyncClient().get(reverse('item-export'), {'output': 'ndjson'}, headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        # A sync body would be read into memory whole before the first byte
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count(b'\n') for chunk in chunks), 1201)
+
+
+class IncomeAnalyticsTests(BaseTestCase):
+    """
+    Tests for the income rollups and the analytics endpoint.
+    """
+    def setUp(self):
+        super().setUp()
+        for day, amount in (('2025-01-10', '100.00'), ('2025-01-20', '50.00'), ('2025-02-05', '300.00'), ('2025-03-01', '90.00')):
+            DailyIncome.objects.create(grocery=self.grocery1, amount=amount, date=day)  # type: ignore
+
+    def test_rollups_follow_income_writes(self):
+        rollup = IncomeRollup.objects.get(grocery=self.grocery1, period='month', period_start=date(2025, 1, 1))  # type: ignore
+        self.assertEqual((str(rollup.total), rollup.days), ('150.00', 2))
+
+        income = DailyIncome.objects.get(grocery=self.grocery1, date='2025-01-20')  # type: ignore
+        income.date = date(2025, 2, 20)
+        income.save()
+        totals = dict(IncomeRollup.objects.filter(period='month').values_list('period_start', 'total'))  # type: ignore
+        self.assertEqual(str(totals[date(2025, 1, 1)]), '100.00')
+        self.assertEqual(str(totals[date(2025, 2, 1)]), '350.00')
+
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        self.client.delete(reverse('dailyincome-bulk'), {'ids': [income.pk]}, format='json')
+        self.assertEqual(str(IncomeRollup.objects.get(period='month', period_start=date(2025, 2, 1)).total), '300.00')  # type: ignore
+
+    def test_rebuild_matches_incremental_rollups(self):
+        expected = set(IncomeRollup.objects.values_list('grocery_id', 'period', 'period_start', 'total', 'days'))  # type: ignore
+        IncomeRollup.objects.all().delete()  # type: ignore
+        call_command('rebuild_income_rollups', stdout=StringIO())
+        self.assertEqual(set(IncomeRollup.objects.values_list('grocery_id', 'period', 'period_start', 'total', 'days')), expected)  # type: ignore
+
+    def test_monthly_analytics_with_moving_average_and_growth(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.get(reverse('income-analytics'), {'period': 'month', 'window': 2, 'date_from': '2025-02-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        february, march = response.data['results']  # type: ignore
+        self.assertEqual(february['period_start'], '2025-02-01')
+        self.assertEqual(february['total'], '300.00')
+        # January is filtered out but still feeds the window functions
+        self.assertEqual(february['moving_average'], '225.00')
+        self.assertEqual(february['previous_total'], '150.00')
+        self.assertEqual(february['growth'], 1.0)
+        self.assertAlmostEqual(march['growth'], -0.7)
+
+    def test_a_month_without_income_counts_as_zero(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='60.00', date='2025-05-02')  # type: ignore
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.get(reverse('income-analytics'), {'period': 'month', 'window': 2})
+        january, february, march, may = response.data['results']  # type: ignore
+        # Months before the first income are not part of the window
+        self.assertEqual(january['moving_average'], '150.00')
+        self.assertIsNone(january['previous_total'])
+        # April had no income, so May compares against 0 rather than March
+        self.assertEqual(may['previous_total'], '0.00')
+        self.assertIsNone(may['growth'])
+        self.assertEqual(may['moving_average'], '30.00')
+        self.assertEqual(march['moving_average'], '195.00')
+
+    def test_unbounded_growth_is_returned_as_a_float(self):
+        DailyIncome.objects.create(grocery=self.grocery2, amount='0.01', date='2025-01-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery2, amount='9999999.00', date='2025-02-01')  # type: ignore
+        self.client.force_authenticate(user=self.supplier2)  # type: ignore
+        response = self.client.get(reverse('income-analytics'), {'period': 'month'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertGreater(response.data['results'][1]['growth'], 1e8)  # type: ignore
+
+    def test_results_are_paginated_per_grocery(self):
+        DailyIncome.objects.create(grocery=self.grocery2, amount='10.00', date='2025-03-01')  # type: ignore
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        response = self.client.get(reverse('income-analytics'), {'period': 'month', 'window': 2, 'page_size': 2})
+        rows = list(response.data['results'])  # type: ignore
+        while response.data['next']:  # type: ignore
+            response = self.client.get(response.data['next'])  # type: ignore
+            rows += response.data['results']  # type: ignore
+        self.assertEqual([(row['grocery'], row['period_start']) for row in rows], [
+            (self.grocery1.pk, '2025-01-01'), (self.grocery1.pk, '2025-02-01'), (self.grocery1.pk, '2025-03-01'),
+            (self.grocery2.pk, '2025-03-01'),
+        ])
+        # A page boundary inside a grocery's periods does not cut its window short
+        self.assertEqual(rows[2]['moving_average'], '195.00')
+
+    def test_supplier_only_sees_own_groceries(self):
+        DailyIncome.objects.create(grocery=self.grocery2, amount='10.00', date='2025-01-01')  # type: ignore
+        self.client.force_authenticate(user=self.supplier2)  # type: ignore
+        response = self.client.get(reverse('income-analytics'), {'period': 'year'})
+        self.assertEqual([row['grocery'] for row in response.data['results']], [self.grocery2.pk])  # type: ignore
+
+
+class SoftDeleteIndexTests(BaseTestCase):
+    """
+    Tests for the partial indexes and constraint covering live (is_deleted=False) rows.
+    """
+    def test_one_live_income_per_day(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01', is_deleted=True)  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='20.00', date='2025-01-01')  # type: ignore
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailyIncome.objects.create(grocery=self.grocery1, amount='30.00', date='2025-01-01')  # type: ignore
+
+    def test_soft_deleted_day_can_be_entered_again(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.post(reverse('dailyincome-list'), {'amount': '10.00', 'date': '2025-01-01'}, format='json')
+        self.client.delete(reverse('dailyincome-detail', args=[response.data['id']]))  # type: ignore
+        response = self.client.post(reverse('dailyincome-list'), {'amount': '15.00', 'date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(DailyIncome.all_objects.filter(grocery=self.grocery1, date='2025-01-01').count(), 2)  # type: ignore
+
+    @skipUnless(connection.vendor == 'postgresql', 'EXPLAIN plans are only checked on PostgreSQL.')
+    def test_list_endpoints_avoid_sequential_scans(self):
+        owners = User.objects.bulk_create([User(username=f'owner{n}') for n in range(500)])  # type: ignore
+        groceries = Grocery.objects.bulk_create([  # type: ignore
+            Grocery(name=f'G{n}', location='X', responsible_person=owners[n % len(owners)], is_deleted=n % 4 == 0)
+            for n in range(5000)
+        ])
+        Item.objects.bulk_create([  # type: ignore
+            Item(name=f'I{n}', item_type='Dairy', location_in_grocery='A1', price='1.00', grocery=groceries[n % 5000], is_deleted=n % 3 == 0)
+            for n in range(50000)
+        ], batch_size=5000)
+        start = date(2020, 1, 1)
+        DailyIncome.objects.bulk_create([  # type: ignore
+            DailyIncome(grocery=groceries[n % 5000], amount='1.00', date=start + timedelta(days=n // 5000))
+            for n in range(50000)
+        ], batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        for name in ('grocery-list', 'item-list', 'dailyincome-list'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name), {'expand': 'items,incomes'} if name == 'grocery-list' else {})
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN ' + query['sql'])
+                    plan = '\n'.join(row[0] for row in cursor.fetchall())
+                for table in ('api_grocery', 'api_item', 'api_dailyincome'):
+                    self.assertNotIn(f'Seq Scan on {table}', plan, f'{name}: {query["sql"]}')
+
+
+class SoftDeleteManagerTests(BaseTestCase):
+    """
+    Tests for the soft-delete managers and the income archive.
+    """
+    def test_objects_hides_deleted_rows(self):
+        self.item1.soft_delete()
+        self.assertFalse(Item.objects.filter(pk=self.item1.pk).exists())  # type: ignore
+        self.assertTrue(Item.all_objects.filter(pk=self.item1.pk, is_deleted=True).exists())  # type: ignore
+        self.assertEqual(list(self.grocery1.items.all()), [])
+
+    def test_queryset_soft_delete_is_one_update(self):
+        before = Item.all_objects.get(pk=self.item1.pk).updated_at  # type: ignore
+        with self.assertNumQueries(1):
+            self.assertEqual(Item.objects.filter(grocery=self.grocery1).soft_delete(), 1)  # type: ignore
+        self.assertGreater(Item.all_objects.get(pk=self.item1.pk).updated_at, before)  # type: ignore
+
+    def test_archive_moves_old_deleted_incomes(self):
+        live = DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+        old = DailyIncome.objects.create(grocery=self.grocery1, amount='20.00', date='2025-01-02')  # type: ignore
+        recent = DailyIncome.objects.create(grocery=self.grocery1, amount='30.00', date='2025-01-03')  # type: ignore
+        DailyIncome.objects.filter(pk__in=[old.pk, recent.pk]).soft_delete()  # type: ignore
+        DailyIncome.all_objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=60))  # type: ignore
+
+        call_command('archive_incomes', days=30, stdout=StringIO())
+        self.assertEqual(set(DailyIncome.all_objects.values_list('pk', flat=True)), {live.pk, recent.pk})  # type: ignore
+        archived = ArchivedDailyIncome.objects.get()  # type: ignore
+        self.assertEqual((archived.pk, str(archived.amount), archived.grocery_id), (old.pk, '20.00', self.grocery1.pk))
+
+
+class ResponseCacheTests(BaseTestCase):
+    """
+    Tests for the cached grocery and item responses.
+    """
+    def test_repeated_list_is_served_from_cache(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        first = self.client.get(reverse('grocery-list'))
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('grocery-list'))
+        self.assertEqual(second.data, first.data)  # type: ignore
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        self.assertEqual(self.client.get(reverse('cache-stats')).data, {'hits': 1, 'misses': 1})  # type: ignore
+
+    def test_if_none_match_returns_304(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        etag = self.client.get(reverse('item-detail', args=[self.item1.pk]))['ETag']
+        response = self.client.get(reverse('item-detail', args=[self.item1.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)  # type: ignore
+
+    def test_writes_invalidate_dependent_responses(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        before = self.client.get(reverse('grocery-detail', args=[self.grocery1.pk]))
+        self.client.delete(reverse('item-detail', args=[self.item1.pk]))
+        after = self.client.get(reverse('grocery-detail', args=[self.grocery1.pk]), HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertEqual((before.data['item_count'], after.data['item_count']), (1, 0))  # type: ignore
+
+        self.client.post(reverse('dailyincome-bulk'), [{'amount': '5.00', 'date': '2025-01-01'}], format='json')
+        self.assertEqual(self.client.get(reverse('grocery-detail', args=[self.grocery1.pk])).data['income_count'], 1)  # type: ignore
+
+    def test_responses_are_cached_per_scope(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        self.client.get(reverse('grocery-list'))
+        self.client.force_authenticate(user=self.supplier2)  # type: ignore
+        response = self.client.get(reverse('grocery-list'))
+        self.assertEqual([row['id'] for row in response.data['results']], [self.grocery2.pk])  # type: ignore
+
+
+class FilteringTests(BaseTestCase):
+    """
+    Tests for the filter, search and ordering query parameters.
+    """
+    def setUp(self):
+        super().setUp()
+        Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='B2', price='3.00', grocery=self.grocery1)  # type: ignore
+        Item.objects.create(name='Cheese', item_type='Dairy', location_in_grocery='Fridge 4', price='12.00', grocery=self.grocery1)  # type: ignore
+        Item.objects.create(name='Rice', item_type='Grains', location_in_grocery='C1', price='8.00', grocery=self.grocery2)  # type: ignore
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+
+    def names(self, params):
+        response = self.client.get(reverse('item-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        return [row['name'] for row in response.data['results']]  # type: ignore
+
+    def test_item_filters(self):
+        self.assertEqual(self.names({'item_type': 'Dairy,Bakery', 'price_min': '4'}), ['Cheese', 'Milk'])
+        self.assertEqual(self.names({'grocery': self.grocery2.pk}), ['Rice'])
+        self.assertEqual(self.names({'price_max': '3.00'}), ['Bread'])
+
+    def test_invalid_filter_values_are_rejected(self):
+        response = self.client.get(reverse('item-list'), {'price_min': 'cheap', 'grocery': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertEqual(set(response.data), {'price_min', 'grocery'})  # type: ignore
+
+    def test_search_matches_name_type_and_location(self):
+        self.assertEqual(self.names({'search': 'fridge'}), ['Cheese'])
+        self.assertEqual(self.names({'search': 'dairy', 'ordering': 'name'}), ['Cheese', 'Milk'])
+
+    def test_ordering_pages_through_equal_values(self):
+        for n in range(5):
+            Item.objects.create(name=f'Same {n}', item_type='Misc', location_in_grocery='D1', price='1.00', grocery=self.grocery1)  # type: ignore
+        seen = []
+        url = reverse('item-list') + '?ordering=price&page_size=2'
+        while url:
+            response = self.client.get(url)
+            seen += [row['id'] for row in response.data['results']]  # type: ignore
+            url = response.data['next']  # type: ignore
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Item.objects.count())  # type: ignore
+
+    def test_income_date_range_and_ordering(self):
+        for day, amount in (('2025-01-01', '30.00'), ('2025-01-02', '10.00'), ('2025-01-03', '20.00')):
+            DailyIncome.objects.create(grocery=self.grocery1, amount=amount, date=day)  # type: ignore
+        response = self.client.get(reverse('dailyincome-list'), {'date_from': '2025-01-02', 'ordering': 'amount'})
+        self.assertEqual([row['amount'] for row in response.data['results']], ['10.00', '20.00'])  # type: ignore
+
+    @skipUnless(connection.vendor == 'postgresql', 'The GIN search index only exists on PostgreSQL.')
+    def test_search_uses_the_gin_index(self):
+        request = Request(APIRequestFactory().get('/', {'search': 'milk'}))
+        queryset = FullTextSearchFilter().filter_queryset(request, Item.objects.all(), ItemViewSet)  # type: ignore
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            self.assertIn('item_search_idx', queryset.explain())
+
+
+class BenchmarkTests(BaseTestCase):
+    """
+    Smoke tests for the seed and benchmark commands on a tiny dataset.
+    """
+    def setUp(self):
+        super().setUp()
+        self.income = DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+
+    def test_seed_data_creates_requested_volumes(self):
+        call_command('seed_data', groceries=3, items=4, years=0.1, stdout=StringIO())
+        self.assertEqual(Grocery.objects.filter(responsible_person__username__startswith='seed-').count(), 3)  # type: ignore
+        self.assertEqual(Item.objects.filter(grocery__responsible_person__username__startswith='seed-').count(), 12)  # type: ignore
+        self.assertEqual(DailyIncome.objects.filter(grocery__responsible_person__username__startswith='seed-').count(), 3 * 36)  # type: ignore
+        self.assertTrue(IncomeRollup.objects.filter(grocery__responsible_person__username__startswith='seed-').exists())  # type: ignore
+        stats = GroceryStats.objects.filter(grocery__responsible_person__username__startswith='seed-')  # type: ignore
+        self.assertEqual([row.item_count for row in stats], [4, 4, 4])
+
+    @override_settings(GRAPH_BACKEND='api.graph.InMemoryGraphBackend')
+    def test_every_scenario_runs_and_compares_to_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            output = StringIO()
+            call_command('benchmark_api', requests=2, save=path, stdout=output)
+            for row in load_baseline(path):
+                self.assertEqual(row['errors'], 0, row['scenario'])
+                self.assertEqual(row['requests'], 2)
+
+            # A baseline claiming fewer queries flags a regression
+            baseline = load_baseline(path)
+            baseline[0]['queries'] = 0
+            save_baseline(path, baseline)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_api', requests=1, scenario=[baseline[0]['scenario']], baseline=path, stdout=output, stderr=output)
+
+
+    def test_every_route_has_a_scenario_or_a_reason(self):
+        fixtures = {
+            'admin': self.admin_user, 'supplier': self.supplier1, 'grocery': self.grocery1.pk, 'item': self.item1.pk,
+            'income': self.income.pk,
+        }
+        covered = {resolve(path.split('?')[0]).url_name for _, _, _, path, _, _ in build_scenarios(fixtures)}
+        routes = {name for name in get_resolver('api.urls').reverse_dict if isinstance(name, str)}
+        self.assertEqual(routes - covered, set(EXCLUDED_ROUTES))
+        self.assertFalse(covered & set(EXCLUDED_ROUTES))
+
+    def test_cold_runs_only_expire_cached_responses(self):
+        cache.set('unrelated', 'kept')
+        misses = get_cache_stats()['misses']
+        call_command('benchmark_api', requests=3, scenario=['item-list'], cold=True, stdout=StringIO())
+        self.assertEqual(get_cache_stats()['misses'], misses + 3)
+        self.assertEqual(cache.get('unrelated'), 'kept')
+
+class InstrumentationTests(BaseTestCase):
+    """
+    Tests for the request timing middleware and the /metrics endpoint.
+    """
+    def setUp(self):
+        super().setUp()
+        metrics_registry.reset()
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+
+    def test_server_timing_splits_the_request(self):
+        response = self.client.get(reverse('grocery-detail', args=[self.grocery1.pk]))
+        phases = {part.split(';')[0] for part in response['Server-Timing'].split(', ')}
+        self.assertEqual(phases, {'sql', 'serialize', 'permissions', 'total'})
+
+    def test_requests_are_logged_as_json(self):
+        with self.assertLogs('api.requests', 'INFO') as logs:
+            self.client.get(reverse('item-list'))
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['route'], record['status']), ('item-list', 200))
+        self.assertEqual(record['sql_count'], 1)
+
+    def test_metrics_exposes_route_histograms(self):
+        self.client.get(reverse('item-list'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('api_requests_total{route="item-list",method="GET",status="200"} 1', body)
+        self.assertIn('api_request_duration_seconds_count{route="item-list",method="GET",phase="total"} 1', body)
+        self.assertIn('api_request_duration_seconds_bucket{route="item-list",method="GET",phase="sql",le="+Inf"} 1', body)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+
+
+class FastReadPathTests(BaseTestCase):
+    """
+    The fast list path must render exactly the bytes of the serializers.
+    """
+    def setUp(self):
+        super().setUp()
+        Item.objects.create(  # type: ignore
+            name='Br\u00f6t "fresh" \u2028 \U0001F35E', item_type='Bakery\\', location_in_grocery='\u2029\nB2', price='0.10', grocery=self.grocery1
+        )
+        for n in range(5):
+            DailyIncome.objects.create(grocery=self.grocery1, amount=f'{n}1234.5', date=date(2025, 1, n + 1))  # type: ignore
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+
+    def assertSameBytes(self, url):
+        responses = {}
+        for enabled in (False, True):
+            cache.clear()
+            with override_settings(FAST_READ_PATH=enabled):
+                responses[enabled] = self.client.get(url)
+        self.assertTrue(getattr(responses[True], 'plain_json', False))
+        self.assertEqual(responses[True].content, responses[False].content)
+        return responses[True]
+
+    def test_item_list_bytes(self):
+        self.assertSameBytes(reverse('item-list'))
+        self.assertSameBytes(reverse('item-list') + '?fields=name,price&ordering=price')
+
+    def test_income_list_bytes_across_pages(self):
+        url = reverse('dailyincome-list') + '?page_size=2'
+        while url:
+            url = json.loads(self.assertSameBytes(url).content)['next']
+
+    def test_bytes_without_orjson(self):
+        # orjson is pinned in requirements.txt, but the json fallback must match too
+        with mock.patch('api.encoding.orjson', None):
+            self.assertSameBytes(reverse('item-list'))
+
+    def test_benchmark_reports_identical_output(self):
+        results = compare_fast_path({'admin': self.admin_user}, requests=2, page_size=10)
+        self.assertTrue(all(row['identical'] for row in results))
+
+
+class AsyncViewTests(BaseTestCase):
+    """
+    The async routes must answer like the regular ones.
+    """
+    def setUp(self):
+        super().setUp()
+        DailyIncome.objects.create(grocery=self.grocery1, amount='100.00', date=date(2025, 1, 1))  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery2, amount='200.00', date=date(2025, 1, 1))  # type: ignore
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')  # type: ignore
+
+    def test_same_bodies_as_the_sync_routes(self):
+        self.login(self.admin_user)
+        for name, args in [('grocery-list', []), ('grocery-detail', [self.grocery1.pk]), ('item-list', []),
+                           ('item-detail', [self.item1.pk]), ('dailyincome-list', [])]:
+            expected = self.client.get(reverse(name, args=args))
+            response = self.client.get(reverse(f'async-{name}', args=args))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+    def test_supplier_scope_and_errors(self):
+        self.login(self.supplier2)
+        incomes = json.loads(self.client.get(reverse('async-dailyincome-list')).content)['results']
+        self.assertEqual([income['grocery'] for income in incomes], [self.grocery2.pk])
+        response = self.client.get(reverse('async-item-detail', args=[self.item1.pk]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+        response = self.client.get(reverse('async-item-list') + '?price_min=cheap')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertIn('price_min', json.loads(response.content))
+
+    def test_requires_a_valid_token(self):
+        response = self.client.get(reverse('async-item-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')  # type: ignore
+        self.assertEqual(self.client.get(reverse('async-item-list')).status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+
+    def test_cached_with_etag_and_timed(self):
+        self.login(self.supplier1)
+        response = self.client.get(reverse('async-item-list'))
+        self.assertIn('sql;', response['Server-Timing'])
+        again = self.client.get(reverse('async-item-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)  # type: ignore
+
+
+@override_settings(GRAPH_BACKEND='api.graph.InMemoryGraphBackend')
+class GraphQueryTests(BaseTestCase):
+    """
+    Tests for the graph read endpoints and their in-process cache.
+    """
+    def setUp(self):
+        super().setUp()
+        graph_module._backends.clear()
+        graph_module._query_cache.clear()
+        self.grocery3 = Grocery.objects.create(name='Dammam Branch', location='Dammam', responsible_person=self.supplier2)  # type: ignore
+        Item.objects.create(name='Cheese', item_type='Dairy', location_in_grocery='C1', price='9.00', grocery=self.grocery3)  # type: ignore
+        Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='C2', price='2.00', grocery=self.grocery3)  # type: ignore
+        self.bread = Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='B1', price='2.00', grocery=self.grocery2)  # type: ignore
+        self.graph = get_graph_backend()
+        drain_outbox(self.graph)
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+
+    def results(self, name, pk, query=''):
+        response = self.client.get(reverse(name, args=[pk]) + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        return response.data['results']  # type: ignore
+
+    def test_groceries_managed_by_supplier(self):
+        rows = self.results('graph-supplier-groceries', self.supplier2.pk)
+        self.assertEqual([row['id'] for row in rows], [self.grocery2.pk, self.grocery3.pk])
+
+    def test_suppliers_sharing_item_types(self):
+        rows = self.results('graph-shared-suppliers', self.grocery1.pk)
+        self.assertEqual(rows, [{'id': self.supplier2.pk, 'username': 'supplier2', 'item_types': ['Dairy']}])
+
+    def test_related_groceries_by_depth(self):
+        related = self.results('graph-related-groceries', self.grocery1.pk)
+        self.assertEqual([(row['id'], row['distance']) for row in related], [(self.grocery3.pk, 1)])
+        related = self.results('graph-related-groceries', self.grocery1.pk, '?depth=2')
+        self.assertEqual([(row['id'], row['distance']) for row in related], [(self.grocery3.pk, 1), (self.grocery2.pk, 2)])
+        response = self.client.get(reverse('graph-related-groceries', args=[self.grocery1.pk]) + '?depth=9')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+    def test_related_groceries_are_limited_nearest_first(self):
+        related = self.results('graph-related-groceries', self.grocery1.pk, '?depth=2&limit=1')
+        self.assertEqual([(row['id'], row['distance']) for row in related], [(self.grocery3.pk, 1)])
+        for limit in ('0', '101', 'all'):
+            response = self.client.get(reverse('graph-related-groceries', args=[self.grocery1.pk]) + f'?limit={limit}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+    def test_related_groceries_query_expands_one_level_per_step(self):
+        query = graph_module.related_groceries_query(3)
+        self.assertEqual(query.count('UNWIND frontier'), 3)
+        self.assertIn('LIMIT $limit', query)
+        self.assertNotIn('*', query)
+
+    def test_cache_is_dropped_by_sync_events(self):
+        self.assertEqual(len(self.results('graph-shared-suppliers', self.grocery2.pk)), 1)
+        # Changes that did not go through the outbox are not seen
+        self.graph.stocks[self.grocery3.pk] = set()
+        self.assertEqual(len(self.results('graph-shared-suppliers', self.grocery2.pk)), 1)
+        invalidate_graph_queries()
+        self.assertEqual(self.results('graph-shared-suppliers', self.grocery2.pk), [])
+
+        # An item changing type re-syncs its grocery
+        self.bread.item_type = 'Dairy'
+        self.bread.save()
+        drain_outbox(self.graph)
+        rows = self.results('graph-shared-suppliers', self.grocery2.pk)
+        self.assertEqual([(row['id'], row['item_types']) for row in rows], [(self.supplier1.pk, ['Dairy'])])
+
+
+@override_settings(GRAPH_BACKEND='api.graph.InMemoryGraphBackend')
+class GraphSyncCommandTests(BaseTestCase):
+    """
+    Tests for `manage.py graph_sync`.
+    """
+    def setUp(self):
+        super().setUp()
+        graph_module._backends.clear()
+        self.graph = get_graph_backend()
+        drain_outbox(self.graph)
+        # Drift: a missed rename, a grocery never synced and an orphaned node
+        self.graph.groceries[self.grocery1.pk]['name'] = 'Old name'
+        self.graph.delete_groceries([self.grocery2.pk])
+        self.graph.upsert_groceries([{
+            'id': 999, 'name': 'Gone', 'location': 'X', 'item_types': [],
+            'supplier': {'id': 998, 'username': 'gone', 'email': None},
+        }])
+
+    def sync(self, *args):
+        out = StringIO()
+        call_command('graph_sync', *args, stdout=out)
+        return out.getvalue()
+
+    def test_incremental_repairs_drift(self):
+        output = self.sync('--incremental', '--batch-size', '1')
+        self.assertIn('2 groceries checked: 1 missing, 1 changed, 1 orphaned nodes.', output)
+        self.assertIn('2 groceries written, 1 unlinked nodes pruned.', output)
+        self.assertEqual(self.graph.groceries[self.grocery1.pk]['name'], 'Jeddah Branch')
+        self.assertEqual(self.graph.managed_by[self.grocery2.pk], self.supplier2.pk)
+        self.assertEqual(set(self.graph.groceries), {self.grocery1.pk, self.grocery2.pk})
+        self.assertNotIn(998, self.graph.suppliers)
+        self.assertIn('0 missing, 0 changed, 0 orphaned', self.sync())
+
+    def test_dry_run_and_full(self):
+        statements = self.graph.statements
+        self.assertIn('1 missing, 1 changed, 1 orphaned', self.sync('--dry-run'))
+        self.assertEqual(self.graph.statements, statements)
+        self.sync()
+        self.assertIn('2 groceries written', self.sync('--full'))
+
+
+class CachedAuthenticationTests(BaseTestCase):
+    """
+    Tests for the cached JWT user and grocery scope.
+    """
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')  # type: ignore
+
+    def queries_for(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 400)  # type: ignore
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_user_and_scope_are_read_once(self):
+        self.login(self.supplier1)
+        first = self.queries_for('get', reverse('item-detail', args=[self.item1.pk]))
+        self.assertTrue(any('"api_user"' in sql for sql in first))
+        data = {'name': 'Eggs', 'item_type': 'Dairy', 'location_in_grocery': 'A2', 'price': '3.00', 'grocery': self.grocery1.pk}
+        # Only the serializer's grocery lookup remains; the owner check uses the cached scope
+        created = self.queries_for('post', reverse('item-list'), data)
+        self.assertFalse(any('"api_user"' in sql for sql in created))
+        self.assertEqual(sum('FROM "api_grocery"' in sql for sql in created), 1)
+
+    def test_supplier_income_uses_the_scope(self):
+        self.login(self.supplier1)
+        self.client.get(reverse('item-list'))
+        created = self.queries_for('post', reverse('dailyincome-list'), {'amount': '50.00', 'date': '2025-02-01'})
+        # The rollup refresh locks the grocery by id, but its owner is never looked up
+        self.assertFalse(any('FROM "api_grocery"' in sql and 'responsible_person_id' in sql for sql in created))
+        self.assertTrue(DailyIncome.objects.filter(grocery=self.grocery1, date=date(2025, 2, 1)).exists())  # type: ignore
+
+    def test_changes_drop_the_cached_entry(self):
+        self.login(self.supplier1)
+        self.client.get(reverse('item-list'))
+        # Reassigned grocery: the old owner loses it at once
+        self.grocery1.responsible_person = self.supplier2
+        self.grocery1.save()
+        data = {'name': 'Eggs', 'item_type': 'Dairy', 'location_in_grocery': 'A2', 'price': '3.00', 'grocery': self.grocery1.pk}
+        response = self.client.post(reverse('item-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+
+        self.supplier1.is_active = False
+        self.supplier1.save()
+        self.assertEqual(self.client.get(reverse('item-list')).status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+class ReplicaRoutingTests(BaseTestCase):
+    """
+    Tests for the read-replica router and the middleware choosing when to use it.
+    """
+    def test_router_reads_from_replicas_only_when_asked(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Item))
+        with replica_reads():
+            self.assertIn(router.db_for_read(Item), ('replica_0', 'replica_1'))
+            # Related rows come from the same database as their instance
+            self.item1._state.db = 'replica_1'
+            self.assertEqual(router.db_for_read(Grocery, instance=self.item1), 'replica_1')
+        self.assertEqual(router.db_for_write(Item), 'default')
+        self.assertFalse(router.allow_migrate('replica_0', 'api'))
+        self.assertTrue(router.allow_migrate('default', 'api'))
+
+    def test_safe_requests_use_replicas_until_the_client_writes(self):
+        seen = []
+
+        def view(request):
+            seen.append(_read_from_replica.get())
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = APIRequestFactory()
+        auth = {'HTTP_AUTHORIZATION': 'Bearer token-a'}
+        middleware(factory.get('/api/items/', **auth))
+        middleware(factory.post('/api/items/', **auth))
+        middleware(factory.get('/api/items/', **auth))
+        middleware(factory.get('/api/items/', HTTP_AUTHORIZATION='Bearer token-b'))
+        self.assertEqual(seen, [True, False, False, True])
+
+    def test_cached_responses_are_rendered_from_the_primary(self):
+        seen = []
+        get_queryset = ItemViewSet.get_queryset
+
+        def spy(view):
+            seen.append(_read_from_replica.get())
+            return get_queryset(view)
+
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        with mock.patch.object(ItemViewSet, 'get_queryset', spy):
+            # Stored under the version the primary bumped, so never from a lagging replica
+            self.assertEqual(self.client.get(reverse('item-list')).status_code, status.HTTP_200_OK)  # type: ignore
+            # Uncached routes still read from the replicas
+            with mock.patch('api.exports.stream_export', side_effect=lambda *args: HttpResponse()):
+                self.client.get(reverse('item-export'))
+        self.assertEqual(seen, [False, True])
+
+
+class ConnectionModeBenchmarkTests(BaseTestCase):
+    def test_reports_each_connection_mode(self):
+        income = DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date='2025-01-01')  # type: ignore
+        fixtures = {
+            'admin': self.admin_user, 'supplier': self.supplier1, 'grocery': self.grocery1.pk, 'item': self.item1.pk, 'income': income.pk,
+        }
+        results = compare_connection_modes(fixtures, requests=3, concurrency=1)
+        self.assertEqual([row['mode'] for row in results][:2], ['per-request', 'persistent'])
+        self.assertTrue(all(row['errors'] == 0 and row['requests'] == 3 for row in results))
+
+    def test_metrics_render_labelled_series(self):
+        body = metrics_registry.render(extra=[('api_db_pool_size', 'gauge', 'Pool size.', [('database="default"', 4)])])
+        self.assertIn('api_db_pool_size{database="default"} 4', body)
+
+
+class IncomeSubmissionTests(BaseTestCase):
+    """
+    Tests for the single-statement income create and Idempotency-Key replays.
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        self.url = reverse('dailyincome-list')
+
+    def test_duplicate_day_is_rejected_without_an_integrity_error(self):
+        response = self.client.post(self.url, {'amount': '10.00', 'date': '2025-03-01'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(response.data['grocery'], self.grocery1.id)  # type: ignore
+        self.assertIsNotNone(response.data['created_at'])  # type: ignore
+
+        # The INSERT ... ON CONFLICT is the only statement touching the income table
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'amount': '20.00', 'date': '2025-03-01'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+        income_queries = [query['sql'] for query in queries if 'api_dailyincome' in query['sql']]
+        self.assertEqual(len(income_queries), 1)
+        self.assertIn('ON CONFLICT', income_queries[0])
+        self.assertEqual(DailyIncome.objects.get(grocery=self.grocery1, date='2025-03-01').amount, 10)  # type: ignore
+
+    def test_soft_deleted_day_can_be_entered_again(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='5.00', date='2025-03-01', is_deleted=True)  # type: ignore
+        response = self.client.post(self.url, {'amount': '10.00', 'date': '2025-03-01'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(DailyIncome.all_objects.filter(grocery=self.grocery1, date='2025-03-01').count(), 2)  # type: ignore
+        # The rollups were refreshed for the new day
+        self.assertEqual(IncomeRollup.objects.get(grocery=self.grocery1, period='year').total, 10)  # type: ignore
+
+    def test_retry_with_the_same_key_replays_the_response(self):
+        data = {'amount': '10.00', 'date': '2025-03-01'}
+        first = self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY='till-1-0001')
+        retry = self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY='till-1-0001')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())  # type: ignore
+        self.assertEqual(DailyIncome.objects.filter(grocery=self.grocery1).count(), 1)  # type: ignore
+
+        # Keys are per user
+        self.client.force_authenticate(user=self.supplier2)  # type: ignore
+        other = self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY='till-1-0001')
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)  # type: ignore
+        self.assertNotIn('Idempotent-Replayed', other)
+
+    def test_key_reused_for_another_request_or_after_a_failure(self):
+        response = self.client.post(self.url, {'amount': 'abc', 'date': '2025-03-01'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        # A failed request does not keep its key
+        self.assertFalse(IdempotencyKey.objects.exists())  # type: ignore
+
+        response = self.client.post(self.url, {'amount': '10.00', 'date': '2025-03-01'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)  # type: ignore
+        response = self.client.post(self.url, {'amount': '99.00', 'date': '2025-03-02'}, format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)  # type: ignore
+
+    def test_purge_command_deletes_old_keys(self):
+        self.client.post(self.url, {'amount': '10.00', 'date': '2025-03-01'}, format='json', HTTP_IDEMPOTENCY_KEY='old')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))  # type: ignore
+        self.client.post(self.url, {'amount': '10.00', 'date': '2025-03-02'}, format='json', HTTP_IDEMPOTENCY_KEY='new')
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])  # type: ignore
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Concurrent submissions need a database with row-level locking.')
+class ConcurrentIncomeSubmissionTests(APITransactionTestCase):
+    """
+    Fires hundreds of parallel submissions of the same day, as a branch's
+    tills do after a network hiccup, from separate threads and connections.
+    """
+    submissions = 300
+    workers = 16
+
+    def setUp(self):
+        cache.clear()
+        self.supplier = User.objects.create_user('till-owner', 'till@example.com', 'supplierpass')
+        self.grocery = Grocery.objects.create(name='Dammam Branch', location='Dammam', responsible_person=self.supplier)  # type: ignore
+
+    def submit(self, headers, day='2025-03-01'):
+        client = APIClient()
+        client.force_authenticate(user=self.supplier)
+        try:
+            response = client.post(reverse('dailyincome-list'), {'amount': '10.00', 'date': day}, format='json', **headers)
+            return response.status_code, response.data.get('id')  # type: ignore
+        finally:
+            connections.close_all()
+
+    def test_only_one_submission_creates_the_day(self):
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(self.submit, [{}] * self.submissions))
+        codes = [code for code, _ in results]
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(codes.count(status.HTTP_403_FORBIDDEN), self.submissions - 1)
+        self.assertEqual(DailyIncome.objects.filter(grocery=self.grocery).count(), 1)  # type: ignore
+
+    def test_retries_with_one_key_all_get_the_same_income(self):
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(self.submit, [{'HTTP_IDEMPOTENCY_KEY': 'till-7-42'}] * self.submissions))
+        self.assertEqual({code for code, _ in results}, {status.HTTP_201_CREATED})
+        self.assertEqual(len({pk for _, pk in results}), 1)
+        self.assertEqual(DailyIncome.objects.filter(grocery=self.grocery).count(), 1)  # type: ignore
+
+    def test_parallel_bulk_creates_of_one_day_never_fail(self):
+        def bulk_create(_):
+            client = APIClient()
+            client.force_authenticate(user=self.supplier)
+            try:
+                rows = [{'amount': '10.00', 'date': '2025-03-01'}, {'amount': '10.00', 'date': '2025-03-02'}]
+                return client.post(reverse('dailyincome-bulk'), rows, format='json').status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            codes = list(pool.map(bulk_create, range(self.workers * 4)))
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), len(codes) - 1)
+        self.assertEqual(DailyIncome.objects.filter(grocery=self.grocery).count(), 2)  # type: ignore
+
+    def test_days_of_one_month_all_land_in_its_rollup(self):
+        days = [date(2025, 2, day).isoformat() for day in range(1, 29)]
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(lambda day: self.submit({}, day), days))
+        self.assertEqual({code for code, _ in results}, {status.HTTP_201_CREATED})
+        rollup = IncomeRollup.objects.get(grocery=self.grocery, period='month', period_start=date(2025, 2, 1))  # type: ignore
+        self.assertEqual((rollup.total, rollup.days), (Decimal('280.00'), 28))
+
+
+async def read_stream(response):
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+
+@override_settings(CHANGE_FEED_LAG_SECONDS=0)
+class ChangeFeedTests(BaseTestCase):
+    """
+    Tests for the ``changes/`` delta feeds and their server-sent events stream.
+    """
+    def poll(self, name, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)  # type: ignore
+        return response.json()  # type: ignore
+
+    def test_polls_return_only_what_changed(self):
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        first = self.poll('item-changes')
+        self.assertEqual([row['id'] for row in first['results']], [self.item1.id])
+        self.assertFalse(first['has_more'])
+
+        # Nothing changed: an empty page and the same cursor
+        again = self.poll('item-changes', first['next'])
+        self.assertEqual((again['results'], again['next']), ([], first['next']))
+
+        bread = Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='A2', price='2.00', grocery=self.grocery1)  # type: ignore
+        self.item1.soft_delete()
+        changed = self.poll('item-changes', first['next'])
+        self.assertEqual([(row['id'], row['is_deleted']) for row in changed['results']], [(bread.id, False), (self.item1.id, True)])
+        self.assertEqual(changed['results'][0]['price'], '2.00')
+
+    def test_pages_follow_the_cursor(self):
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        for day in range(1, 6):
+            DailyIncome.objects.create(grocery=self.grocery1, amount='1.00', date=date(2025, 1, day))  # type: ignore
+        seen, cursor, has_more = [], None, True
+        while has_more:
+            page = self.poll('dailyincome-changes', cursor, page_size=2)
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(row['date'] for row in page['results'])
+            cursor, has_more = page['next'], page['has_more']
+        self.assertEqual(seen, [f'2025-01-0{day}' for day in range(1, 6)])
+
+    def test_supplier_scope_lag_and_invalid_cursor(self):
+        self.client.force_authenticate(user=self.supplier2)  # type: ignore
+        self.assertEqual(self.poll('grocery-changes')['results'][0]['id'], self.grocery2.id)
+        self.assertEqual(len(self.poll('grocery-changes')['results']), 1)
+        self.assertEqual(self.poll('item-changes')['results'], [])
+
+        # Rows younger than the lag wait for the next poll
+        with override_settings(CHANGE_FEED_LAG_SECONDS=60):
+            self.assertEqual(self.poll('grocery-changes')['results'], [])
+
+        response = self.client.get(reverse('grocery-changes'), {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertIn('since', response.data)  # type: ignore
+
+    @override_settings(CHANGE_STREAM_SECONDS=0)
+    def test_stream_sends_changes_as_events(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.supplier1).access_token}')  # type: ignore
+        cursor = self.poll('item-changes')['next']
+        bread = Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='A2', price='2.00', grocery=self.grocery1)  # type: ignore
+
+        response = self.client.get(reverse('item-change-stream'), HTTP_LAST_EVENT_ID=cursor)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = async_to_sync(read_stream)(response).decode().split('\n\n')
+        self.assertTrue(events[0].startswith('retry: '))
+        fields = dict(line.split(': ', 1) for line in events[1].splitlines())
+        self.assertEqual(fields['event'], 'changes')
+        self.assertEqual([row['id'] for row in json.loads(fields['data'])], [bread.id])
+        # The event id resumes after the last row
+        self.assertEqual(self.poll('item-changes', fields['id'])['results'], [])
+
+        self.client.credentials()  # type: ignore
+        self.assertEqual(self.client.get(reverse('item-change-stream')).status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+
+
+class GroceryStatsTests(BaseTestCase):
+    """
+    Tests for the GroceryStats counters behind the grocery list.
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+
+    def stats(self, grocery):
+        return GroceryStats.objects.get(grocery=grocery)  # type: ignore
+
+    def test_counters_follow_item_and_income_writes(self):
+        bread = Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='A2', price='2.00', grocery=self.grocery1)  # type: ignore
+        self.assertEqual((self.stats(self.grocery1).item_count, self.stats(self.grocery1).catalogue_value), (2, Decimal('7.50')))
+
+        bread.price = Decimal('3.00')
+        bread.save()
+        self.assertEqual(self.stats(self.grocery1).catalogue_value, Decimal('8.50'))
+        # Moving an item updates both groceries
+        bread.grocery = self.grocery2
+        bread.save()
+        self.assertEqual((self.stats(self.grocery1).item_count, self.stats(self.grocery2).item_count), (1, 1))
+        bread.soft_delete()
+        self.assertEqual((self.stats(self.grocery2).item_count, self.stats(self.grocery2).catalogue_value), (0, 0))
+        # Hard deletes cascade to the stats row
+        self.grocery2.delete()
+        self.assertFalse(GroceryStats.objects.filter(grocery_id=self.grocery2.id).exists())  # type: ignore
+
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        self.client.post(reverse('dailyincome-list'), {'amount': '100.00', 'date': '2025-01-01'}, format='json')
+        rows = [{'amount': '50.00', 'date': '2025-01-02'}, {'amount': '60.00', 'date': '2025-01-01'}]
+        self.client.post(reverse('dailyincome-bulk-upsert'), rows, format='json')
+        stats = self.stats(self.grocery1)
+        self.assertEqual((stats.income_count, stats.income_total), (2, Decimal('110.00')))
+        self.assertEqual((stats.last_income_date, stats.last_income_amount), (date(2025, 1, 2), Decimal('50.00')))
+
+    def test_single_writes_apply_deltas_without_recounting(self):
+        first = DailyIncome.objects.create(grocery=self.grocery1, amount='100.00', date='2025-01-01')  # type: ignore
+        with CaptureQueriesContext(connection) as queries:
+            latest = DailyIncome.objects.create(grocery=self.grocery1, amount='50.00', date='2025-01-02')  # type: ignore
+            Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='A2', price='2.00', grocery=self.grocery1)  # type: ignore
+        stats_sql = [query['sql'] for query in queries.captured_queries if 'api_grocerystats' in query['sql']]
+        self.assertEqual(len(stats_sql), 2)
+        self.assertFalse([sql for sql in stats_sql if 'COUNT(' in sql or 'SUM(' in sql])
+        stats = self.stats(self.grocery1)
+        self.assertEqual((stats.item_count, stats.catalogue_value), (2, Decimal('7.50')))
+        self.assertEqual((stats.income_count, stats.income_total, stats.last_income_date), (2, Decimal('150.00'), date(2025, 1, 2)))
+
+        # Changing or removing the latest income falls back to the one before
+        latest.amount = Decimal('70.00')
+        latest.save()
+        self.assertEqual(self.stats(self.grocery1).last_income_amount, Decimal('70.00'))
+        latest.soft_delete()
+        stats = self.stats(self.grocery1)
+        self.assertEqual((stats.income_count, stats.income_total), (1, Decimal('100.00')))
+        self.assertEqual((stats.last_income_date, stats.last_income_amount), (date(2025, 1, 1), Decimal('100.00')))
+        first.delete()
+        stats = self.stats(self.grocery1)
+        self.assertEqual((stats.income_count, stats.income_total, stats.last_income_date), (0, Decimal('0'), None))
+        out = StringIO()
+        call_command('reconcile_grocery_stats', '--dry-run', stdout=out)
+        self.assertIn('0 drifted', out.getvalue())
+
+    def test_list_reads_the_counters(self):
+        DailyIncome.objects.create(grocery=self.grocery1, amount='100.00', date='2025-01-01')  # type: ignore
+        DailyIncome.objects.create(grocery=self.grocery1, amount='50.50', date='2025-01-02')  # type: ignore
+        response = self.client.get(reverse('grocery-list'))
+        row = next(row for row in response.data['results'] if row['id'] == self.grocery1.id)  # type: ignore
+        self.assertEqual((row['item_count'], row['catalogue_value']), (1, '5.50'))
+        self.assertEqual((row['income_count'], row['average_income']), (2, '75.25'))
+        # Groceries without any writes yet read as empty
+        row = next(row for row in response.data['results'] if row['id'] == self.grocery2.id)  # type: ignore
+        self.assertEqual((row['item_count'], row['catalogue_value'], row['average_income'], row['latest_income']), (0, '0.00', None, None))
+
+    def test_reconcile_repairs_drift(self):
+        GroceryStats.objects.filter(grocery=self.grocery1).update(item_count=42)  # type: ignore
+        Grocery.objects.bulk_create([Grocery(name='Khobar Branch', location='Khobar')])  # type: ignore
+
+        out = StringIO()
+        call_command('reconcile_grocery_stats', '--dry-run', stdout=out)
+        # grocery2 never had a write, the new grocery skipped the signals
+        self.assertIn('2 missing, 1 drifted (dry run)', out.getvalue())
+        self.assertEqual(self.stats(self.grocery1).item_count, 42)
+
+        call_command('reconcile_grocery_stats', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self.stats(self.grocery1).item_count, 1)
+        self.assertEqual(GroceryStats.objects.count(), Grocery.objects.count())  # type: ignore
+        out = StringIO()
+        call_command('reconcile_grocery_stats', stdout=out)
+        self.assertIn('0 missing, 0 drifted', out.getvalue())
+
+
+def _flaky_job(fail=False):
+    if fail:
+        raise RuntimeError('boom')
+    return {'ok': True}
+
+
+@mock.patch.dict(JOBS, {'test_job': _flaky_job})
+class JobQueueTests(BaseTestCase):
+    """
+    Tests for the database job queue, its worker loop and the status endpoints.
+    """
+    def test_worker_runs_jobs_by_priority(self):
+        low = enqueue('test_job')
+        high = enqueue('test_job', priority=5)
+        self.assertEqual(claim_job().pk, high.pk)  # type: ignore
+        self.assertEqual(work(burst=True), 1)
+        low.refresh_from_db()
+        high.refresh_from_db()
+        self.assertEqual((low.status, low.result, low.attempts), (Job.SUCCEEDED, {'ok': True}, 1))
+        # Claimed above but never run: it waits until it goes stale
+        self.assertEqual(high.status, Job.RUNNING)
+
+    def test_failures_back_off_then_fail(self):
+        failing = enqueue('test_job', {'fail': True}, max_attempts=2)
+        work(burst=True)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts, failing.last_error), (Job.QUEUED, 1, 'RuntimeError: boom'))
+        self.assertGreater(failing.available_at, timezone.now())
+        # Not due yet
+        self.assertEqual(work(burst=True), 0)
+
+        Job.objects.update(available_at=timezone.now())  # type: ignore
+        work(burst=True)
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(failing.finished_at)
+
+    def test_payloads_must_fit_the_job_arguments(self):
+        with self.assertRaises(ValueError):
+            enqueue('test_job', {'fial': True})
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        response = self.client.post(reverse('job-list'), {'name': 'reconcile_grocery_stats', 'payload': {'size': 10}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.assertIn('payload', response.data)  # type: ignore
+        self.assertFalse(Job.objects.exists())  # type: ignore
+
+        # Queued before the function's arguments changed: retrying cannot help
+        stale = Job.objects.create(name='test_job', payload={'fial': True}, max_attempts=5)  # type: ignore
+        work(burst=True)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.attempts), (Job.FAILED, 1))
+        self.assertTrue(stale.last_error.startswith('TypeError:'))
+
+    def test_stale_running_jobs_are_requeued(self):
+        enqueue('test_job')
+        claimed = claim_job()
+        Job.objects.update(started_at=timezone.now() - timedelta(hours=1))  # type: ignore
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(work(burst=True), 1)
+        claimed.refresh_from_db()  # type: ignore
+        self.assertEqual((claimed.status, claimed.attempts), (Job.SUCCEEDED, 2))  # type: ignore
+
+    def test_status_endpoints(self):
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        response = self.client.post(reverse('job-list'), {'name': 'reconcile_grocery_stats', 'priority': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)  # type: ignore
+        self.assertEqual(response.data['status'], Job.QUEUED)  # type: ignore
+        location = response['Location']
+
+        response = self.client.post(reverse('job-list'), {'name': 'rm -rf'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+
+        call_command('run_workers', '--burst', '--concurrency', '1', stdout=StringIO())
+        response = self.client.get(location)
+        self.assertEqual(response.data['status'], Job.SUCCEEDED)  # type: ignore
+        self.assertEqual(response.data['result']['groceries'], 2)  # type: ignore
+
+        # Suppliers cannot queue jobs and only see their own
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.post(reverse('job-list'), {'name': 'reconcile_grocery_stats'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+        self.assertEqual(self.client.get(location).status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+        self.assertEqual(self.client.get(reverse('job-list')).data['results'], [])  # type: ignore
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED needs PostgreSQL.')
+@mock.patch.dict(JOBS, {'test_job': _flaky_job})
+class ConcurrentJobClaimTests(APITransactionTestCase):
+    """
+    Workers claiming side by side must never take the same job.
+    """
+    def test_each_job_is_claimed_once(self):
+        for _ in range(200):
+            enqueue('test_job')
+
+        def claim_all(_):
+            claimed = []
+            try:
+                while (job_row := claim_job()) is not None:
+                    claimed.append(job_row.pk)
+            finally:
+                connections.close_all()
+            return claimed
+
+        with ThreadPoolExecutor(8) as pool:
+            claimed = [pk for batch in pool.map(claim_all, range(8)) for pk in batch]
+        self.assertEqual(len(claimed), 200)
+        self.assertEqual(len(set(claimed)), 200)
+
+
+class CascadeSoftDeleteTests(BaseTestCase):
+    """
+    Tests for the cascading soft-delete and restore of groceries (api/cascade.py).
+    """
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        self.bread = Item.objects.create(name='Bread', item_type='Bakery', location_in_grocery='A2', price='2.00', grocery=self.grocery1)  # type: ignore
+        for day in (1, 2, 3):
+            DailyIncome.objects.create(grocery=self.grocery1, amount='10.00', date=date(2025, 1, day))  # type: ignore
+
+    def run_queued(self, response):
+        """Runs the job a 202 response queued and returns its result."""
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)  # type: ignore
+        work(burst=True)
+        job = self.client.get(response['Location']).data  # type: ignore
+        self.assertEqual(job['status'], Job.SUCCEEDED)
+        return job['result']
+
+    def test_delete_hides_the_branch_and_restore_brings_it_back(self):
+        # Deleted on their own before the grocery: a restore leaves them deleted
+        self.bread.soft_delete()
+        DailyIncome.objects.get(date=date(2025, 1, 3)).soft_delete()  # type: ignore
+
+        response = self.client.delete(reverse('grocery-detail', args=[self.grocery1.pk]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)  # type: ignore
+        self.assertFalse(Item.objects.filter(grocery=self.grocery1).exists())  # type: ignore
+        self.assertFalse(DailyIncome.objects.filter(grocery=self.grocery1).exists())  # type: ignore
+        self.assertFalse(IncomeRollup.objects.filter(grocery=self.grocery1).exists())  # type: ignore
+        self.assertEqual(GroceryStats.objects.get(grocery=self.grocery1).item_count, 0)  # type: ignore
+        self.assertTrue(GraphOutbox.objects.filter(grocery_id=self.grocery1.pk).exists())  # type: ignore
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        self.assertEqual(self.client.get(reverse('item-list')).data['results'], [])  # type: ignore
+
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        response = self.client.post(reverse('grocery-restore', args=[self.grocery1.pk]))
+        # Queued, not run in the request
+        self.assertFalse(Grocery.objects.filter(pk=self.grocery1.pk).exists())  # type: ignore
+        self.assertEqual(self.run_queued(response), {'items': 1, 'incomes': 2, 'groceries': 1})
+        self.assertEqual(list(Item.objects.filter(grocery=self.grocery1)), [self.item1])  # type: ignore
+        self.assertEqual(DailyIncome.objects.filter(grocery=self.grocery1).count(), 2)  # type: ignore
+        self.assertEqual(GroceryStats.objects.get(grocery=self.grocery1).income_count, 2)  # type: ignore
+        self.assertTrue(IncomeRollup.objects.filter(grocery=self.grocery1).exists())  # type: ignore
+        # Restoring a live grocery changes nothing
+        response = self.client.post(reverse('grocery-restore', args=[self.grocery1.pk]))
+        self.assertEqual(self.run_queued(response)['groceries'], 0)
+        self.assertEqual(self.client.post(reverse('grocery-restore', args=[0])).status_code, status.HTTP_404_NOT_FOUND)  # type: ignore
+
+    def test_restore_brings_back_archived_incomes(self):
+        first = DailyIncome.objects.get(date=date(2025, 1, 1))  # type: ignore
+        self.client.delete(reverse('grocery-detail', args=[self.grocery1.pk]))
+        # Archive the hidden incomes, then enter one of their days again
+        self.assertEqual(archive_deleted_incomes(deleted_before=timezone.now()), 3)
+        DailyIncome.objects.create(grocery=self.grocery1, amount='99.00', date=date(2025, 1, 2))  # type: ignore
+
+        response = self.client.post(reverse('grocery-restore', args=[self.grocery1.pk]))
+        self.assertEqual(self.run_queued(response), {'items': 2, 'incomes': 2, 'groceries': 1})
+        # The re-entered day keeps its new income and its archived one stays archived
+        self.assertEqual(
+            sorted(DailyIncome.objects.filter(grocery=self.grocery1).values_list('date', 'amount')),  # type: ignore
+            [(date(2025, 1, day), Decimal(amount)) for day, amount in ((1, '10.00'), (2, '99.00'), (3, '10.00'))],
+        )
+        restored = DailyIncome.objects.get(date=date(2025, 1, 1))  # type: ignore
+        self.assertEqual((restored.pk, restored.created_at), (first.pk, first.created_at))
+        self.assertEqual(list(ArchivedDailyIncome.objects.values_list('date', flat=True)), [date(2025, 1, 2)])  # type: ignore
+        self.assertEqual(GroceryStats.objects.get(grocery=self.grocery1).income_count, 3)  # type: ignore
+        self.assertTrue(IncomeRollup.objects.filter(grocery=self.grocery1, period_start=date(2025, 1, 1)).exists())  # type: ignore
+
+    def test_queries_do_not_grow_with_the_branch(self):
+        def delete_and_restore(grocery):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.delete(reverse('grocery-detail', args=[grocery.pk]))
+                self.client.post(reverse('grocery-restore', args=[grocery.pk]))
+                work(burst=True)
+            return len(queries)
+
+        small = delete_and_restore(self.grocery1)
+        Item.objects.bulk_create([  # type: ignore
+            Item(name=f'Item {n}', item_type='Misc', location_in_grocery='B1', price='1.00', grocery=self.grocery1) for n in range(50)
+        ])
+        DailyIncome.objects.bulk_create([  # type: ignore
+            DailyIncome(grocery=self.grocery1, amount='5.00', date=date(2024, 1, 1) + timedelta(days=n)) for n in range(50)
+        ])
+        self.assertEqual(delete_and_restore(self.grocery1), small)
+        self.assertEqual(Item.objects.filter(grocery=self.grocery1).count(), 52)  # type: ignore
+
+    def test_bulk_endpoints(self):
+        url = reverse('grocery-bulk-destroy')
+        response = self.client.delete(url, {'ids': [self.grocery1.pk, self.grocery2.pk]}, format='json')
+        self.assertEqual(self.run_queued(response), {'items': 2, 'incomes': 3, 'groceries': 2})
+        self.assertFalse(Grocery.objects.exists())  # type: ignore
+
+        # A day entered again while the grocery was deleted keeps the new row
+        DailyIncome.objects.create(grocery=self.grocery1, amount='99.00', date=date(2025, 1, 1))  # type: ignore
+        response = self.client.post(reverse('grocery-bulk-restore'), {'ids': [self.grocery1.pk, self.grocery2.pk]}, format='json')
+        self.assertEqual(self.run_queued(response), {'items': 2, 'incomes': 2, 'groceries': 2})
+        self.assertEqual(DailyIncome.objects.get(grocery=self.grocery1, date=date(2025, 1, 1)).amount, Decimal('99.00'))  # type: ignore
+
+        response = self.client.delete(url, {'ids': ['x']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # type: ignore
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        response = self.client.delete(url, {'ids': [self.grocery1.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+        response = self.client.post(reverse('grocery-restore', args=[self.grocery1.pk]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)  # type: ignore
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command('benchmark_api', cascade_items=30, stdout=output)
+        self.assertIn('soft-delete', output.getvalue())
+        self.assertIn('restore', output.getvalue())
+        self.assertFalse(Grocery.all_objects.filter(name='Cascade benchmark').exists())  # type: ignore
+
+
+@override_settings(THROTTLE_BUDGETS={'admin': 0, 'supplier': 31, 'anon': 2})
+class ThrottlingTests(BaseTestCase):
+    """
+    Tests for the cost-weighted rate limits (api/throttling.py).
+    """
+    def test_costs_are_charged_against_the_budget(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        # 25 (list with one expanded relation) + 5 (plain list) fit in 31, another 5 does not
+        self.assertEqual(self.client.get(reverse('grocery-list') + '?expand=items').status_code, status.HTTP_200_OK)  # type: ignore
+        self.assertEqual(self.client.get(reverse('grocery-list')).status_code, status.HTTP_200_OK)  # type: ignore
+        response = self.client.get(reverse('grocery-list'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)  # type: ignore
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        # The rejected charge is given back: a cheaper request still fits
+        self.assertEqual(self.client.get(reverse('item-detail', args=[self.item1.pk])).status_code, status.HTTP_200_OK)  # type: ignore
+
+        # Budgets are per caller, and admins are unlimited here
+        self.client.force_authenticate(user=self.supplier2)  # type: ignore
+        self.assertEqual(self.client.get(reverse('grocery-list')).status_code, status.HTTP_200_OK)  # type: ignore
+        self.client.force_authenticate(user=self.admin_user)  # type: ignore
+        for _ in range(10):
+            self.assertEqual(self.client.get(reverse('grocery-list') + '?expand=items,incomes').status_code, status.HTTP_200_OK)  # type: ignore
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('api_throttle_requests_total{role="supplier",outcome="throttled"} 1', body)
+        self.assertIn('api_throttle_cost_total{role="supplier",outcome="allowed"} 36', body)
+
+    def test_counter_expiring_before_the_give_back_is_ignored(self):
+        self.client.force_authenticate(user=self.supplier1)  # type: ignore
+        self.assertEqual(self.client.get(reverse('grocery-list') + '?expand=items').status_code, status.HTTP_200_OK)  # type: ignore
+        store = caches['throttle']
+        with mock.patch.object(store, 'decr', side_effect=ValueError('expired')) as decr:
+            response = self.client.get(reverse('grocery-list') + '?expand=items')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)  # type: ignore
+        decr.assert_called_once()
+
+    def test_anonymous_callers_are_limited_by_address(self):
+        url, credentials = reverse('token_obtain_pair'), {'username': 'supplier1', 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, credentials).status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+        self.assertEqual(self.client.post(url, credentials).status_code, status.HTTP_429_TOO_MANY_REQUESTS)  # type: ignore
+        self.assertEqual(self.client.post(url, credentials, REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_401_UNAUTHORIZED)  # type: ignore
+
+    def test_async_views_share_the_budget(self):
+        token = str(RefreshToken.for_user(self.supplier1).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')  # type: ignore
+        for _ in range(6):
+            self.assertEqual(self.client.get(reverse('async-grocery-list')).status_code, status.HTTP_200_OK)  # type: ignore
+        response = self.client.get(reverse('async-grocery-list'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)  # type: ignore
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(reverse('grocery-list')).status_code, status.HTTP_429_TOO_MANY_REQUESTS)  # type: ignore
@@ -0,0 +1,118 @@
+"""
+Cost-weighted rate limiting.
+
+Every request is charged a cost against a budget per caller (user, or client
+IP when anonymous) and THROTTLE_WINDOW_SECONDS window. The budget depends on
+the caller's role (THROTTLE_BUDGETS) and the cost on what the request makes
+the database do: an item retrieve costs 1, a grocery list with its nested
+items and incomes far more. Views set per-action costs in `throttle_costs`,
+plain API views a single `throttle_cost`, and a `get_throttle_cost(request)`
+method overrides both.
+
+Counters live in the THROTTLE_CACHE cache and only change through atomic
+incr/decr, so with a shared backend (Redis, memcached) the budget holds
+across processes.
+Rejected requests get 429 with Retry-After set to the end of the window.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+# Costs of the actions the mixins add to several viewsets
+ACTION_COSTS = {
+    'list': 2,
+    'changes': 5,
+    'export': 50,
+    'bulk': 20,
+    'bulk_upsert': 20,
+}
+OUTCOMES = ('allowed', 'throttled')
+
+
+def get_store():
+    return caches[settings.THROTTLE_CACHE]
+
+
+def get_role(user):
+    if not user or not user.is_authenticated:
+        return 'anon'
+    return 'admin' if user.is_staff else 'supplier'
+
+
+def action_cost(view):
+    """The cost of `view`'s action from `throttle_costs`, ACTION_COSTS or `throttle_cost`."""
+    action = getattr(view, 'action', None)
+    costs = getattr(view, 'throttle_costs', {})
+    if action in costs:
+        return costs[action]
+    return ACTION_COSTS.get(action, getattr(view, 'throttle_cost', 1))
+
+
+def get_request_cost(request, view):
+    get_cost = getattr(view, 'get_throttle_cost', None)
+    return get_cost(request) if get_cost is not None else action_cost(view)
+
+
+def _add(store, key, amount, timeout):
+    try:
+        return store.incr(key, amount)
+    except ValueError:
+        # Missing or just expired
+        store.add(key, 0, timeout=timeout)
+        return store.incr(key, amount)
+
+
+def _give_back(store, key, amount):
+    try:
+        store.decr(key, amount)
+    except ValueError:
+        # The window ended in between and its counter with it
+        pass
+
+
+def _stats_key(role, outcome, unit):
+    return f'api:throttle:stats:{role}:{outcome}:{unit}'
+
+
+def get_throttle_stats():
+    """{(role, outcome): (requests, cost)} since the counters were last cleared."""
+    keys = [(role, outcome) for role in settings.THROTTLE_BUDGETS for outcome in OUTCOMES]
+    values = get_store().get_many([_stats_key(role, outcome, unit) for role, outcome in keys for unit in ('requests', 'cost')])
+    return {
+        (role, outcome): (values.get(_stats_key(role, outcome, 'requests'), 0), values.get(_stats_key(role, outcome, 'cost'), 0))
+        for role, outcome in keys
+    }
+
+
+class CostBudgetThrottle(BaseThrottle):
+    """
+    Rejects a request once its cost would take the caller past their role's
+    budget for the current window. A budget of 0 disables the limit.
+    """
+    def allow_request(self, request, view):
+        role = get_role(request.user)
+        budget = settings.THROTTLE_BUDGETS.get(role, 0)
+        if budget <= 0:
+            return True
+
+        ident = request.user.pk if role != 'anon' else self.get_ident(request)
+        cost = get_request_cost(request, view)
+        window = settings.THROTTLE_WINDOW_SECONDS
+        now = time.time()
+        start = int(now // window) * window
+        store = get_store()
+        key = f'api:throttle:{role}:{ident}:{start}'
+        allowed = _add(store, key, cost, window) <= budget
+        if not allowed:
+            # Give the charge back, so a cheaper request may still fit
+            _give_back(store, key, cost)
+            self.retry_after = start + window - now
+        outcome = 'allowed' if allowed else 'throttled'
+        _add(store, _stats_key(role, outcome, 'requests'), 1, None)
+        _add(store, _stats_key(role, outcome, 'cost'), cost, None)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
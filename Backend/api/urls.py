@@ -1,13 +1,44 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import GroceryViewSet, ItemViewSet, CreateSupplierView, DailyIncomeViewSet
+from .async_views import AsyncReadView, ChangeStreamView
+from .views import (
+    GroceryViewSet, ItemViewSet, CreateSupplierView, DailyIncomeViewSet, ImportView, IncomeAnalyticsView, CacheStatsView,
+    GraphQueryView, RelatedGroceriesView, JobViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'groceries', GroceryViewSet, basename='grocery')
 router.register(r'items', ItemViewSet, basename='item')
 router.register(r'daily-incomes', DailyIncomeViewSet, basename='dailyincome')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('create-supplier/', CreateSupplierView.as_view(), name='create-supplier'),
+    path('imports/<str:kind>/', ImportView.as_view(), name='import'),
+    path('analytics/incomes/', IncomeAnalyticsView.as_view(), name='income-analytics'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path(
+        'graph/suppliers/<int:pk>/groceries/',
+        GraphQueryView.as_view(query='managed_groceries', param='supplier_id'), name='graph-supplier-groceries',
+    ),
+    path(
+        'graph/groceries/<int:pk>/shared-suppliers/',
+        GraphQueryView.as_view(query='suppliers_sharing_item_types', param='grocery_id'), name='graph-shared-suppliers',
+    ),
+    path('graph/groceries/<int:pk>/related/', RelatedGroceriesView.as_view(), name='graph-related-groceries'),
+    # Async read-only versions of the list/retrieve routes
+    path('async/groceries/', AsyncReadView.as_view(viewset_class=GroceryViewSet), name='async-grocery-list'),
+    path('async/groceries/<int:pk>/', AsyncReadView.as_view(viewset_class=GroceryViewSet), name='async-grocery-detail'),
+    path('async/items/', AsyncReadView.as_view(viewset_class=ItemViewSet), name='async-item-list'),
+    path('async/items/<int:pk>/', AsyncReadView.as_view(viewset_class=ItemViewSet), name='async-item-detail'),
+    path('async/daily-incomes/', AsyncReadView.as_view(viewset_class=DailyIncomeViewSet), name='async-dailyincome-list'),
+    path('async/daily-incomes/<int:pk>/', AsyncReadView.as_view(viewset_class=DailyIncomeViewSet), name='async-dailyincome-detail'),
+    # Server-sent events with the rows of the changes/ feeds
+    path('async/groceries/changes/stream/', ChangeStreamView.as_view(viewset_class=GroceryViewSet), name='grocery-change-stream'),
+    path('async/items/changes/stream/', ChangeStreamView.as_view(viewset_class=ItemViewSet), name='item-change-stream'),
+    path(
+        'async/daily-incomes/changes/stream/', ChangeStreamView.as_view(viewset_class=DailyIncomeViewSet),
+        name='dailyincome-change-stream',
+    ),
 ]
\ No newline at end of file
@@ -1,11 +1,45 @@
-from rest_framework import viewsets, generics, status
+import uuid
+from decimal import Decimal
+from io import BytesIO
+
+from rest_framework import mixins, viewsets, generics, status
+from rest_framework.decorators import action
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth.models import Group
-from .models import User, Grocery, Item, DailyIncome
-from .serializers import UserSerializer, AdminUserSerializer, GrocerySerializer, ItemSerializer, DailyIncomeSerializer
-from .permissions import IsAdminOrIsOwner
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, HttpResponseForbidden
+from django.db.models import F, Prefetch, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+from .models import User, Grocery, Item, DailyIncome, IncomeRollup, Job
+from .serializers import (
+    UserSerializer, AdminUserSerializer, GroceryChangeSerializer, GroceryIdsSerializer, GrocerySerializer, ItemSerializer, ItemBulkSerializer,
+    DailyIncomeSerializer, IncomeAnalyticsSerializer, JobSerializer, get_expanded_fields,
+)
+from .permissions import IsAdminOrIsOwner, get_grocery_scope, get_supplier_grocery_id
+from .bulk import BulkWriteMixin, DailyIncomeBulkMixin, change_key, write_daily_incomes
+from .idempotency import IdempotentCreateMixin
+from .jobs import enqueue
+from .importers import KINDS as IMPORT_KINDS, run_import
+from .exports import ExportMixin
+from .changes import ChangeFeedMixin
+from .caching import CachedResponseMixin, get_cache_stats
+from .instrumentation import registry as metrics_registry
+from .fastpath import FastReadMixin
+from .database import pool_stats
+from .filters import FullTextSearchFilter, QueryParamFilterBackend, StableOrderingFilter
+from .analytics import TRUNCATE as ANALYTICS_PERIODS, income_analytics
+from .graph import MAX_RELATED_DEPTH, MAX_RELATED_RESULTS, query_graph
+from .outbox import count_dead_rows
+from .pagination import IdCursorPagination, DailyIncomeCursorPagination, IncomeAnalyticsCursorPagination
+from .signals import bulk_changed
+from .throttling import action_cost, get_throttle_stats
 
 
 # --- User Creation Views ---
@@ -35,15 +69,62 @@ class CreateAdminView(generics.CreateAPIView):
 
 # --- Main Application ViewSets ---
 
-class GroceryViewSet(viewsets.ModelViewSet):
+class GroceryViewSet(CachedResponseMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     serializer_class = GrocerySerializer
+    change_serializer_class = GroceryChangeSerializer
+    owner_lookup = 'responsible_person'
     permission_classes = [IsAuthenticated, IsAdminOrIsOwner]
+    pagination_class = IdCursorPagination
+    cache_namespace = 'groceries'
+    # Rate limit costs (api/throttling.py); every relation ?expand= adds to a list
+    throttle_costs = {'list': 5, 'retrieve': 5, 'bulk_destroy': 20, 'bulk_restore': 20}
+    expand_throttle_cost = 20
 
     def get_queryset(self):
         # Admin sees all groceries, supplier sees only their assigned grocery
         if self.request.user.is_staff:
-            return Grocery.objects.filter(is_deleted=False) # type: ignore
-        return Grocery.objects.filter(responsible_person=self.request.user, is_deleted=False) # type: ignore
+            queryset = Grocery.objects.all() # type: ignore
+        else:
+            queryset = Grocery.objects.filter(responsible_person=self.request.user) # type: ignore
+
+        # Summary columns so the list does not need the nested arrays, read
+        # from GroceryStats (api/stats.py) with one join instead of counting
+        queryset = queryset.annotate(
+            item_count=Coalesce('stats__item_count', 0),
+            catalogue_value=Coalesce('stats__catalogue_value', Value(Decimal('0'))),
+            income_count=Coalesce('stats__income_count', 0),
+            income_total=Coalesce('stats__income_total', Value(Decimal('0'))),
+            latest_income_date=F('stats__last_income_date'),
+            latest_income_amount=F('stats__last_income_amount'),
+        )
+
+        # One extra query per expanded relation, whatever the number of groceries
+        expand = get_expanded_fields(self.request, GrocerySerializer, self.get_default_expand())
+        if 'items' in expand:
+            queryset = queryset.prefetch_related(
+                Prefetch('items', queryset=Item.objects.order_by('-id')) # type: ignore
+            )
+        if 'incomes' in expand:
+            queryset = queryset.prefetch_related(
+                Prefetch('incomes', queryset=DailyIncome.objects.order_by('-date', '-id')) # type: ignore
+            )
+        return queryset
+
+    def get_default_expand(self):
+        # The list returns lightweight rows unless ?expand= asks for the nested arrays;
+        # a delete must not load the branch it is about to hide
+        return () if self.action in ('list', 'destroy') else GrocerySerializer.Meta.expandable_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['default_expand'] = self.get_default_expand()
+        return context
+
+    def get_throttle_cost(self, request):
+        cost = action_cost(self)
+        if self.action == 'list':
+            cost += self.expand_throttle_cost * len(get_expanded_fields(request, GrocerySerializer, ()))
+        return cost
 
     def perform_create(self, serializer):
         # Only admins can create groceries
@@ -56,19 +137,56 @@ class GroceryViewSet(viewsets.ModelViewSet):
         serializer.save()
 
     def perform_destroy(self, instance):
-        # Soft delete
-        instance.is_deleted = True
-        instance.save()
+        # Cascades to the grocery's items and incomes (api/cascade.py)
+        instance.soft_delete()
+
+    # Restores and bulk deletes run as jobs (api/tasks.py): the response is
+    # 202 with the job, whose result holds the counts once a worker ran it
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    def restore(self, request, pk=None):
+        # Deleted groceries are outside get_queryset, look the row up directly
+        grocery = generics.get_object_or_404(Grocery.all_objects, pk=pk) # type: ignore
+        return job_accepted(request, enqueue('restore_groceries', {'grocery_ids': [grocery.pk]}, user=request.user))
 
-class ItemViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['delete'], url_path='bulk', permission_classes=[IsAdminUser])
+    def bulk_destroy(self, request):
+        serializer = GroceryIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payload = {'grocery_ids': serializer.validated_data['ids']}
+        return job_accepted(request, enqueue('soft_delete_groceries', payload, user=request.user))
+
+    @action(detail=False, methods=['post'], url_path='bulk-restore', permission_classes=[IsAdminUser])
+    def bulk_restore(self, request):
+        serializer = GroceryIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payload = {'grocery_ids': serializer.validated_data['ids']}
+        return job_accepted(request, enqueue('restore_groceries', payload, user=request.user))
+
+class ItemViewSet(CachedResponseMixin, FastReadMixin, ExportMixin, BulkWriteMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     serializer_class = ItemSerializer
+    change_serializer_class = ItemSerializer
+    bulk_serializer_class = ItemBulkSerializer
     permission_classes = [IsAuthenticated, IsAdminOrIsOwner]
+    pagination_class = IdCursorPagination
+    export_columns = ('id', 'name', 'item_type', 'location_in_grocery', 'price', 'grocery', 'created_at', 'updated_at')
+    cache_namespace = 'items'
+    filter_backends = [QueryParamFilterBackend, FullTextSearchFilter, StableOrderingFilter]
+    query_filters = {
+        'grocery': ('grocery_id__in', 'int'),
+        'item_type': ('item_type__in', 'str'),
+        'price_min': ('price__gte', 'decimal'),
+        'price_max': ('price__lte', 'decimal'),
+    }
+    search_fields = ('name', 'item_type', 'location_in_grocery')
+    ordering_fields = ('id', 'name', 'item_type', 'price', 'created_at', 'updated_at')
+    ordering = ('-id',)
 
     def get_queryset(self):
         # Admin sees all items, supplier sees only items from their grocery
+        # The grocery is joined because object permissions check its owner
         if self.request.user.is_staff:
-            return Item.objects.filter(is_deleted=False) # type: ignore
-        return Item.objects.filter(grocery__responsible_person=self.request.user, is_deleted=False) # type: ignore
+            return Item.objects.select_related('grocery') # type: ignore
+        return Item.objects.filter(grocery__responsible_person=self.request.user).select_related('grocery') # type: ignore
 
     def perform_create(self, serializer):
         # Suppliers can only add items to their own grocery
@@ -76,21 +194,16 @@ class ItemViewSet(viewsets.ModelViewSet):
         
         # If user is not admin, ensure they're adding to their own grocery
         if not user.is_staff:
-            # Get the grocery for this supplier
-            try:
-                supplier_grocery = Grocery.objects.get(responsible_person=user, is_deleted=False) # type: ignore
-            except Grocery.DoesNotExist: # type: ignore
-                raise PermissionDenied("You are not assigned to any grocery.")
-            
-            # If grocery is specified in request, verify it's their grocery
-            requested_grocery = serializer.validated_data.get('grocery')
-            if requested_grocery and requested_grocery != supplier_grocery:
+            # If grocery is specified in request, verify it's one of theirs
+            requested_grocery = serializer.validated_data.pop('grocery', None)
+            if requested_grocery and requested_grocery.pk not in get_grocery_scope(self.request):
                 raise PermissionDenied("You can only add items to your assigned grocery.")
-            
+
             # Set the grocery to their assigned one if not specified
-            if not requested_grocery:
-                serializer.validated_data['grocery'] = supplier_grocery
-        
+            grocery_id = requested_grocery.pk if requested_grocery else get_supplier_grocery_id(self.request)
+            serializer.save(grocery_id=grocery_id)
+            return
+
         serializer.save()
         
     def perform_update(self, serializer):
@@ -98,44 +211,280 @@ class ItemViewSet(viewsets.ModelViewSet):
         serializer.save()
         
     def perform_destroy(self, instance):
-        instance.is_deleted = True
-        instance.save()
+        instance.soft_delete()
 
-class DailyIncomeViewSet(viewsets.ModelViewSet):
+class DailyIncomeViewSet(IdempotentCreateMixin, FastReadMixin, ExportMixin, DailyIncomeBulkMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     serializer_class = DailyIncomeSerializer
+    change_serializer_class = DailyIncomeSerializer
+    bulk_serializer_class = DailyIncomeSerializer
     permission_classes = [IsAuthenticated, IsAdminOrIsOwner]
+    pagination_class = DailyIncomeCursorPagination
+    export_columns = ('id', 'date', 'amount', 'grocery', 'created_at', 'updated_at')
+    export_date_field = 'date'
+    export_ordering = ('date', 'id')
+    filter_backends = [QueryParamFilterBackend, StableOrderingFilter]
+    query_filters = {
+        'grocery': ('grocery_id__in', 'int'),
+        'date_from': ('date__gte', 'date'),
+        'date_to': ('date__lte', 'date'),
+        'amount_min': ('amount__gte', 'decimal'),
+        'amount_max': ('amount__lte', 'decimal'),
+    }
+    ordering_fields = ('id', 'date', 'amount', 'created_at', 'updated_at')
+    ordering = ('-date', '-id')
 
     def get_queryset(self):
         # Admin sees all incomes, supplier sees only their grocery's incomes
         if self.request.user.is_staff:
-            return DailyIncome.objects.filter(is_deleted=False) # type: ignore
-        return DailyIncome.objects.filter(grocery__responsible_person=self.request.user, is_deleted=False) # type: ignore
+            return DailyIncome.objects.select_related('grocery') # type: ignore
+        return DailyIncome.objects.filter(grocery__responsible_person=self.request.user).select_related('grocery') # type: ignore
 
     def perform_create(self, serializer):
-        user = self.request.user
-        date = serializer.validated_data['date']
-        
         # Admins can specify any grocery, suppliers are restricted to their own
-        if user.is_staff:
-            # Admin can create income for any grocery
+        if self.request.user.is_staff:
             serializer.save()
-        else:
-            # Supplier can only create income for their assigned grocery
-            try:
-                supplier_grocery = Grocery.objects.get(responsible_person=user, is_deleted=False) # type: ignore
-            except Grocery.DoesNotExist: # type: ignore
-                raise PermissionDenied("You are not assigned to any grocery.")
-            
-            # Check if income for this date already exists
-            if DailyIncome.objects.filter(grocery=supplier_grocery, date=date, is_deleted=False).exists(): # type: ignore
-                raise PermissionDenied("Income for this date already exists.")
-            
-            serializer.save(grocery=supplier_grocery)
-            
+            return
+
+        # One INSERT ... ON CONFLICT DO NOTHING: concurrent submissions of the
+        # same day cannot both pass a check and then race on the unique index
+        income = DailyIncome(grocery_id=get_supplier_grocery_id(self.request), **serializer.validated_data)
+        if not write_daily_incomes([income]):
+            raise PermissionDenied("Income for this date already exists.")
+        bulk_changed.send(sender=DailyIncome, keys={change_key(income)})
+        serializer.instance = income
+
     def perform_update(self, serializer):
         # Update the updated_at field
         serializer.save()
 
     def perform_destroy(self, instance):
-        instance.is_deleted = True
-        instance.save()
\ No newline at end of file
+        instance.soft_delete()
+
+# --- Imports ---
+
+class ImportView(APIView):
+    """
+    Streams a CSV (text/csv) or NDJSON (application/x-ndjson) request body into
+    items or incomes. The body is read line by line and never buffered whole.
+    Pass ?checkpoint=<key> to make the upload resumable: re-sending the same
+    file with the same key skips the rows already imported. Bodies over
+    IMPORT_INLINE_MAX_BYTES are stored and imported by a job instead; the
+    response is then 202 with the job, whose result is the import summary.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_cost = 50
+    content_types = {
+        'text/csv': 'csv',
+        'application/x-ndjson': 'ndjson',
+        'application/ndjson': 'ndjson',
+    }
+
+    def post(self, request, kind):
+        if kind not in IMPORT_KINDS:
+            return Response({'detail': f'Unknown import kind "{kind}".'}, status=status.HTTP_404_NOT_FOUND)
+        fmt = self.content_types.get(request.content_type.split(';')[0].strip())
+        if fmt is None:
+            return Response(
+                {'detail': 'Send the file as text/csv or application/x-ndjson.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+
+        user = request.user
+        grocery = None
+        grocery_id = request.query_params.get('grocery')
+        if not user.is_staff:
+            # Suppliers can only import into their own grocery
+            if not grocery_id:
+                grocery_id = get_supplier_grocery_id(request)
+            elif not grocery_id.isdigit() or int(grocery_id) not in get_grocery_scope(request):
+                raise PermissionDenied("You can only import into your assigned grocery.")
+        if grocery_id:
+            grocery = Grocery.objects.filter(pk=grocery_id).first() if str(grocery_id).isdigit() else None # type: ignore
+            if grocery is None:
+                return Response({'detail': 'Grocery not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Checkpoints are namespaced per user so clients cannot resume each other's imports
+        key = f'api:{user.pk}:{request.query_params.get("checkpoint") or uuid.uuid4().hex}'
+        size = request.META.get('CONTENT_LENGTH') or ''
+        if not size.isdigit() or int(size) > settings.IMPORT_INLINE_MAX_BYTES:
+            # Too large to import within the request: spool it for a job
+            name = default_storage.save(f'imports/{uuid.uuid4().hex}.{fmt}', File(request.stream or BytesIO()))
+            payload = {'name': name, 'kind': kind, 'fmt': fmt, 'checkpoint_key': key, 'grocery_id': grocery.pk if grocery else None}
+            return job_accepted(request, enqueue('import_upload', payload, user=user))
+        try:
+            result = run_import(request.stream or [], kind, fmt, key, grocery)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+
+# --- Analytics ---
+
+class IncomeAnalyticsView(generics.GenericAPIView):
+    """
+    Income totals, averages, moving averages and period-over-period growth per
+    grocery, read from the IncomeRollup table.
+    Query parameters: period (week|month|year), window, grocery, date_from, date_to.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = IncomeAnalyticsCursorPagination
+    throttle_cost = 5
+    max_window = 52
+
+    def get(self, request):
+        params = request.query_params
+        period = params.get('period', 'month')
+        if period not in ANALYTICS_PERIODS:
+            raise ValidationError({'period': [f'Choose one of: {", ".join(ANALYTICS_PERIODS)}.']})
+        window = params.get('window', '3')
+        if not window.isdigit() or not 1 <= int(window) <= self.max_window:
+            raise ValidationError({'window': [f'Enter a number between 1 and {self.max_window}.']})
+        dates = {}
+        for name in ('date_from', 'date_to'):
+            if params.get(name):
+                dates[name] = parse_date(params[name])
+                if dates[name] is None:
+                    raise ValidationError({name: ['Enter a valid date (YYYY-MM-DD).']})
+
+        # Admin sees every grocery, supplier sees only their own
+        rollups = IncomeRollup.objects.filter(grocery__is_deleted=False) # type: ignore
+        if not request.user.is_staff:
+            rollups = rollups.filter(grocery__responsible_person=request.user)
+        grocery = params.get('grocery')
+        if grocery:
+            if not grocery.isdigit():
+                raise ValidationError({'grocery': ['A valid integer is required.']})
+            rollups = rollups.filter(grocery_id=int(grocery))
+
+        page = self.paginate_queryset(income_analytics(rollups, period, int(window), **dates))
+        return self.get_paginated_response(IncomeAnalyticsSerializer(page, many=True).data)
+
+
+# --- Graph ---
+
+class GraphQueryView(APIView):
+    """
+    A read over the Neo4j mirror of groceries, suppliers and item types
+    (api/graph.py), as of the last applied outbox batch. `query` names the
+    backend read and the URL's pk is passed as `param`.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_cost = 5
+    query = None
+    param = None
+
+    def get_query_params(self, request, pk):
+        return {self.param: pk}
+
+    def get(self, request, pk):
+        return Response({'results': query_graph(self.query, **self.get_query_params(request, pk))})
+
+
+class RelatedGroceriesView(GraphQueryView):
+    """
+    Groceries up to ?depth= steps away, one step being a shared supplier or
+    item type, nearest first and at most ?limit= of them.
+    """
+    query = 'related_groceries'
+    param = 'grocery_id'
+
+    def get_query_params(self, request, pk):
+        depth = request.query_params.get('depth', '1')
+        if not depth.isdigit() or not 1 <= int(depth) <= MAX_RELATED_DEPTH:
+            raise ValidationError({'depth': [f'Enter a number between 1 and {MAX_RELATED_DEPTH}.']})
+        limit = request.query_params.get('limit', str(MAX_RELATED_RESULTS))
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_RELATED_RESULTS:
+            raise ValidationError({'limit': [f'Enter a number between 1 and {MAX_RELATED_RESULTS}.']})
+        return {'grocery_id': pk, 'depth': int(depth), 'limit': int(limit)}
+
+
+# --- Cache ---
+
+class CacheStatsView(APIView):
+    """
+    Hit and miss counters of the response cache (api/caching.py).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats())
+
+
+# --- Background jobs ---
+
+def job_accepted(request, job):
+    # Accepted: the work happens later, poll the Location for its status
+    headers = {'Location': reverse('job-detail', kwargs={'pk': job.pk}, request=request)}
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED, headers=headers)
+
+
+class JobViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background jobs (api/jobs.py). Admins see and queue every job,
+    other users see the jobs queued on their behalf. Filter with ?status=.
+    """
+    serializer_class = JobSerializer
+    pagination_class = IdCursorPagination
+
+    def get_permissions(self):
+        if self.action == 'create':
+            return [IsAdminUser()]
+        return [IsAuthenticated()]
+
+    def get_queryset(self):
+        queryset = Job.objects.all() # type: ignore
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        job_status = self.request.query_params.get('status')
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return job_accepted(request, enqueue(user=request.user, **serializer.validated_data))
+
+
+# --- Metrics ---
+
+def metrics(request):
+    """
+    Prometheus text endpoint. Set METRICS_TOKEN to require
+    ``Authorization: Bearer <token>`` from the scraper.
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    stats = get_cache_stats()
+    extra = [
+        ('api_response_cache_hits_total', 'counter', 'Responses served from the response cache.', stats['hits']),
+        ('api_response_cache_misses_total', 'counter', 'Responses rendered because the cache had no entry.', stats['misses']),
+    ]
+    throttle = sorted(get_throttle_stats().items())
+    extra += [
+        ('api_throttle_requests_total', 'counter', 'Requests checked by the rate limiter, by role and outcome.',
+         [(f'role="{role}",outcome="{outcome}"', requests) for (role, outcome), (requests, _) in throttle]),
+        ('api_throttle_cost_total', 'counter', 'Cost units of the requests checked by the rate limiter, by role and outcome.',
+         [(f'role="{role}",outcome="{outcome}"', cost) for (role, outcome), (_, cost) in throttle]),
+    ]
+    extra.append(('api_graph_outbox_dead_rows', 'gauge', 'Outbox rows that ran out of Neo4j sync attempts.', count_dead_rows()))
+    pools = pool_stats()
+    if pools:
+        def series(key, scale=None):
+            return [
+                (f'database="{alias}"', pool.get(key, 0) / scale if scale else pool.get(key, 0))
+                for alias, pool in sorted(pools.items())
+            ]
+        extra += [
+            ('api_db_pool_size', 'gauge', 'Connections currently managed by the pool.', series('pool_size')),
+            ('api_db_pool_available', 'gauge', 'Idle connections in the pool.', series('pool_available')),
+            ('api_db_pool_max_size', 'gauge', 'Largest size the pool may grow to.', series('pool_max')),
+            ('api_db_pool_requests_waiting', 'gauge', 'Requests waiting for a connection.', series('requests_waiting')),
+            ('api_db_pool_requests_total', 'counter', 'Connections handed out by the pool.', series('requests_num')),
+            ('api_db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a connection.', series('requests_wait_ms', 1000)),
+            ('api_db_pool_errors_total', 'counter', 'Requests that timed out or failed to get a connection.', series('requests_errors')),
+            ('api_db_pool_connection_errors_total', 'counter', 'Failed attempts to open a connection.', series('connections_errors')),
+        ]
+    body = metrics_registry.render(extra=extra)
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
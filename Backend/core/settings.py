@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 
@@ -46,6 +47,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the timings cover every other middleware too
+    'api.middleware.RequestMetricsMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -79,16 +83,53 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# Connections come from a psycopg pool per process (DB_POOL_MAX_SIZE times the
+# number of workers must stay below max_connections). With DB_POOL=false they
+# are kept open for DB_CONN_MAX_AGE seconds instead.
+DB_POOL = os.getenv('DB_POOL', 'true').lower() == 'true'
+
+
+def _postgres(host, port):
+    database = {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('DB_NAME', 'grocertrack'),
         'USER': os.getenv('DB_USER', 'grocertrack_user'),
         'PASSWORD': os.getenv('DB_PASSWORD', 'grocertrack_password'),
-        'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', '5432'),
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': not DB_POOL,
+        'OPTIONS': {},
     }
+    if DB_POOL:
+        database['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+        }
+    return database
+
+
+def _replicas():
+    """Aliases of the read replicas in DB_REPLICA_HOSTS (host[:port], comma separated)."""
+    replicas = {}
+    for index, address in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+        host, _, port = address.strip().partition(':')
+        replicas[f'replica_{index}'] = {**_postgres(host, port or '5432'), 'TEST': {'MIRROR': 'default'}}
+    return replicas
+
+
+DATABASES = {
+    'default': _postgres(os.getenv('DB_HOST', 'db'), os.getenv('DB_PORT', '5432')),
+    **_replicas(),
 }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.database.ReplicaRouter']
+# Seconds a client keeps reading from the primary after a write, so it sees its own changes
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
 
 # Neo4j Configuration
 try:
@@ -102,6 +143,11 @@ except Exception as e:
     print(f"Neo4j configuration error: {e}")
     pass  # Handle configuration errors gracefully
 
+# Backend used by `manage.py process_graph_outbox` (api.graph.InMemoryGraphBackend needs no server)
+GRAPH_BACKEND = os.getenv('GRAPH_BACKEND', 'api.graph.Neo4jGraphBackend')
+# Graph query results kept per process until the next applied outbox batch
+GRAPH_QUERY_CACHE_SIZE = int(os.getenv('GRAPH_QUERY_CACHE_SIZE', '1024'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -147,12 +193,89 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 AUTH_USER_MODEL = 'api.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'api.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.fastpath.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.CostBudgetThrottle',
+    ),
 }
 
+# Seconds a token's user and grocery scope stay cached (api/authentication.py)
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', '60'))
+
+# List endpoints read rows with .values() and a precompiled encoder (api/fastpath.py)
+FAST_READ_PATH = os.getenv('FAST_READ_PATH', 'true').lower() == 'true'
+
+# Response cache (api/caching.py). Local memory by default; point CACHE_BACKEND
+# and CACHE_LOCATION at a shared backend (e.g. Redis) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', '300'))
+
+# Rate limiting (api/throttling.py): every caller may spend their role's budget
+# of request costs per window; 0 disables the limit for that role. Counters
+# need a cache shared by all processes (e.g. Redis) to hold across them.
+CACHES['throttle'] = {
+    'BACKEND': os.getenv('THROTTLE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+    'LOCATION': os.getenv('THROTTLE_CACHE_LOCATION', 'throttle'),
+}
+THROTTLE_CACHE = 'throttle'
+THROTTLE_WINDOW_SECONDS = int(os.getenv('THROTTLE_WINDOW_SECONDS', '60'))
+THROTTLE_BUDGETS = {
+    'admin': int(os.getenv('THROTTLE_ADMIN_BUDGET', '6000')),
+    'supplier': int(os.getenv('THROTTLE_SUPPLIER_BUDGET', '1200')),
+    'anon': int(os.getenv('THROTTLE_ANON_BUDGET', '100')),
+}
+
+# Prometheus scrapes of /metrics must send this bearer token when it is set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Bulk endpoints (api/bulk.py)
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', '50000'))
+BULK_BATCH_SIZE = int(os.getenv('BULK_BATCH_SIZE', '1000'))
+
+# Change feeds (api/changes.py): rows are only returned once this many seconds
+# old, which must cover the longest write transaction and the replica lag
+CHANGE_FEED_LAG_SECONDS = float(os.getenv('CHANGE_FEED_LAG_SECONDS', '2'))
+CHANGE_FEED_PAGE_SIZE = int(os.getenv('CHANGE_FEED_PAGE_SIZE', '500'))
+CHANGE_FEED_MAX_PAGE_SIZE = int(os.getenv('CHANGE_FEED_MAX_PAGE_SIZE', '5000'))
+# Server-sent change streams poll every CHANGE_STREAM_INTERVAL seconds and end
+# after CHANGE_STREAM_SECONDS, when clients reconnect from their last event
+CHANGE_STREAM_INTERVAL = float(os.getenv('CHANGE_STREAM_INTERVAL', '2'))
+CHANGE_STREAM_SECONDS = int(os.getenv('CHANGE_STREAM_SECONDS', '300'))
+
+# Stored responses of creates sent with an Idempotency-Key (api/idempotency.py),
+# purged by `manage.py purge_idempotency_keys` once older than this
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# Background jobs (api/jobs.py), run by `manage.py run_workers`. A job running
+# longer than JOB_STALE_SECONDS is assumed to have lost its worker and is retried.
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', '2'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '900'))
+JOB_MAX_BACKOFF_SECONDS = int(os.getenv('JOB_MAX_BACKOFF_SECONDS', '600'))
+
+# Streaming imports (api/importers.py): rows committed per transaction. Bodies
+# larger than IMPORT_INLINE_MAX_BYTES (or of unknown size) are spooled to
+# MEDIA_ROOT and imported by a job, so the worker must share that directory.
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '2000'))
+IMPORT_INLINE_MAX_BYTES = int(os.getenv('IMPORT_INLINE_MAX_BYTES', str(1024 * 1024)))
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', str(BASE_DIR / 'media'))
+
+# Streaming exports (api/exports.py): rows fetched per server-side cursor round-trip
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
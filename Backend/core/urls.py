@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from api.views import metrics
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -10,4 +11,5 @@ urlpatterns = [
     path('api/', include('api.urls')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics, name='metrics'),
 ]
\ No newline at end of file
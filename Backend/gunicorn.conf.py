@@ -0,0 +1,23 @@
+"""
+Production server: gunicorn managing uvicorn workers that serve core.asgi.
+
+    gunicorn -c gunicorn.conf.py
+
+Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'core.asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+# An event loop per worker handles concurrent requests, one per core is enough
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'